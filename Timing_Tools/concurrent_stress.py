@@ -0,0 +1,84 @@
+"""
+Multi-threaded stress test of ConcurrentRedBlackTree.
+Writers apply batches of adds and removes while readers run lookups. Afterwards the tree is checked
+with is_red_black() and the read throughput is reported for an increasing number of reader threads.
+Read throughput only scales on a free-threaded build of CPython (e.g. 3.13t).
+Usage: python concurrent_stress.py [number of elements, defaults to 10^5]
+"""
+
+from random import Random
+from threading import Thread, Event
+from time import perf_counter
+import sys
+
+from Tree.ConcurrentRedBlackTree import ConcurrentRedBlackTree
+
+
+def reader(tree, n, seed, stop, results):
+    """
+    Looks up random values until stop is set and appends the number of lookups to results.
+    """
+    rng = Random(seed)
+    lookups = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            tree.contains(rng.randrange(2 * n))
+        lookups += 1000
+    results.append(lookups)
+
+
+def writer(tree, n, seed, stop, batch_size=1000):
+    """
+    Adds and then removes batches of random values until stop is set.
+    """
+    rng = Random(seed)
+    while not stop.is_set():
+        batch = [rng.randrange(2 * n) for _ in range(batch_size)]
+        tree.add_many(batch)
+        tree.remove_many(batch)
+
+
+def measure_reads(tree, n, readers, writers, duration):
+    """
+    Runs the readers and writers for duration seconds.
+    Returns:
+        The number of lookups per second over all readers.
+    """
+    stop = Event()
+    results = []
+    threads = [Thread(target=reader, args=(tree, n, seed, stop, results)) for seed in range(readers)]
+    threads += [Thread(target=writer, args=(tree, n, 1000 + seed, stop)) for seed in range(writers)]
+
+    start_time = perf_counter()
+    for thread in threads:
+        thread.start()
+    while perf_counter() - start_time < duration:
+        stop.wait(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return sum(results) / (perf_counter() - start_time)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**5
+    gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil_enabled else 'disabled'}, n = {n}")
+
+    tree = ConcurrentRedBlackTree(range(0, 2 * n, 2))
+    for writers in [0, 1, 2]:
+        base = None
+        for readers in [1, 2, 4, 8]:
+            throughput = measure_reads(tree, n, readers, writers, duration=2)
+            base = base or throughput
+            print(f"{writers} writers, {readers} readers: {throughput:12.0f} lookups/s ({throughput / base:.2f}x)")
+
+            assert tree.is_red_black(), "tree is corrupted"
+            assert len(tree) == n, "writers lost updates"
+
+    print("tree is a valid red-black tree")
+
+
+if __name__ == "__main__":
+    main()
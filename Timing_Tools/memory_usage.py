@@ -0,0 +1,51 @@
+"""
+Measure the memory footprint of the different tree implementations.
+Reports the number of bytes the tree needs per stored key, not counting the keys themselves.
+"""
+
+from random import sample, seed
+import tracemalloc
+
+from Tree.ArrayRedBlackTree import ArrayRedBlackTree
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+from Tree.MultiUnbalancedTree import MultiUnbalancedTree
+from Tree.SortedBlockTree import SortedBlockTree
+
+
+IMPLEMENTATIONS = {
+    "Unbalanced": MultiUnbalancedTree,
+    "Red-black": MultiRedBlackTree,
+    "Array red-black": ArrayRedBlackTree,
+    "Sorted blocks": SortedBlockTree,
+}
+
+
+def measure_bytes_per_key(tree_implementation, keys):
+    """
+    Measures the memory allocated while inserting keys into an empty tree.
+    Parameters:
+        tree_implementation: The tree class to measure.
+        keys: The keys to insert. They are created before the measurement starts.
+    Returns:
+        The number of bytes allocated per key.
+    """
+    tracemalloc.start()
+    tree = tree_implementation()
+    for key in keys:
+        tree.add(key)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return allocated / len(keys)
+
+
+def main():
+    seed(0)
+    for n in [10**i for i in range(3, 7)]:
+        keys = sample(range(n * 10), n)
+        for name, implementation in IMPLEMENTATIONS.items():
+            print(f"n = {n:>8} {name:>16}: {measure_bytes_per_key(implementation, keys):8.1f} bytes/key")
+
+
+if __name__ == "__main__":
+    main()
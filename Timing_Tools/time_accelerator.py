@@ -0,0 +1,69 @@
+"""
+Compare the throughput of the pure Python red-black core with the C accelerator.
+Build the accelerator first with: python setup.py build_ext --inplace
+Usage: python time_accelerator.py [number of values, defaults to 10^6]
+"""
+
+from random import Random
+from time import perf_counter
+import sys
+
+from Tree import MultiRedBlackTree as module
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+from Tree.RedBlackTree import RedBlackTree
+
+
+def add(tree, values):
+    for value in values:
+        tree.add(value)
+
+
+def contains(tree, values):
+    for value in values:
+        value in tree
+
+
+def remove(tree, values):
+    for value in values:
+        tree.remove(value)
+
+
+def measure(tree_class, values, lookups):
+    """
+    Returns the operations per second of adding, looking up and removing the values.
+    """
+    tree = tree_class()
+    throughput = {}
+    for name, function, arguments in [("add", add, values), ("contains", contains, lookups), ("remove", remove, values)]:
+        start_time = perf_counter()
+        function(tree, arguments)
+        throughput[name] = len(arguments) / (perf_counter() - start_time)
+    return throughput
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    if not module.use_accelerator():
+        print("The C accelerator is not built, run: python setup.py build_ext --inplace")
+        return
+
+    rng = Random(0)
+    values = list(range(n))
+    rng.shuffle(values)
+    lookups = [rng.randrange(2 * n) for _ in range(n)]
+    print(f"n = {n}, operations per second")
+
+    for tree_class in [MultiRedBlackTree, RedBlackTree]:
+        module.use_accelerator(False)
+        python = measure(tree_class, values, lookups)
+        module.use_accelerator(True)
+        accelerated = measure(tree_class, values, lookups)
+        for name in python:
+            print(
+                f"{tree_class.__name__:>17} {name:>8}: python {python[name]:>10,.0f}, "
+                f"accelerated {accelerated[name]:>10,.0f} ({accelerated[name] / python[name]:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure the time it takes to import each tree module in a fresh interpreter, and enforce a budget.
+It also checks that importing a tree pulls in nothing outside the standard library and the Tree package.
+Exits with status 1 if a module is over the budget or imports a third-party module.
+Usage: python time_import.py [--budget-ms 20] [--repeats 5]
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import subprocess
+import sys
+
+# the fresh interpreters find the Tree package in the working directory, whether it is installed or not
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "MultiUnbalancedTree",
+    "UnbalancedTree",
+    "MultiRedBlackTree",
+    "RedBlackTree",
+    "RedBlackTreeMap",
+    "ArrayRedBlackTree",
+    "SortedBlockTree",
+    "PersistentRedBlackTree",
+    "ConcurrentRedBlackTree",
+    "MappedTree",
+    "InstrumentedTree",
+]
+
+# runs in a fresh interpreter: imports the module and prints the import time and the new top-level modules
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start_time = time.perf_counter_ns()
+import Tree.{module}
+elapsed = time.perf_counter_ns() - start_time
+imported = {{name.split(".")[0] for name in set(sys.modules) - before}}
+print(json.dumps({{"ns": elapsed, "modules": sorted(imported)}}))
+"""
+
+
+def probe(module):
+    """
+    Imports a tree module in a fresh interpreter.
+    Returns:
+        The import time in nanoseconds and the top-level names of the modules it imported.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output)
+    return result["ns"], result["modules"]
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Measure and enforce the import time of the tree modules.")
+    parser.add_argument("--budget-ms", type=float, default=20, help="largest allowed import time of a module")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per module, the fastest counts")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        runs = [probe(module) for _ in range(args.repeats)]
+        elapsed = min(ns for ns, _ in runs) / 1e6
+        # the build configuration read through sysconfig is part of the standard library, but not named in the list
+        third_party = sorted(
+            {name for _, modules in runs for name in modules if not name.startswith("_sysconfigdata_")}
+            - set(sys.stdlib_module_names)
+            - {"Tree"}
+        )
+        status = "ok"
+        if elapsed > args.budget_ms:
+            status = f"over the budget of {args.budget_ms:g} ms"
+        if third_party:
+            status = f"imports {', '.join(third_party)}"
+        failed = failed or status != "ok"
+        print(f"{module:>23}: {elapsed:6.2f} ms  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare the in-order iteration over a red-black tree through nested recursive generators
+with the iterator that follows the successor links of the nodes.
+Usage: python time_iteration.py [number of elements, defaults to 10^7]
+"""
+
+from time import perf_counter
+import sys
+
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+
+
+def recursive_inorder(tree):
+    """
+    Yields the elements of the tree through one nested generator per level,
+    the way the trees used to be iterated.
+    """
+
+    def inorder(node):
+        if node is tree.NIL:
+            return
+        yield from inorder(node.left)
+        for _ in range(node.count):
+            yield node.value
+        yield from inorder(node.right)
+
+    return inorder(tree._root)
+
+
+def measure_iteration(iterable):
+    """
+    Returns the time it takes to exhaust an iterable.
+    """
+    start_time = perf_counter()
+    for _ in iterable:
+        pass
+    return perf_counter() - start_time
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**7
+    tree = MultiRedBlackTree.from_sorted(range(n))
+
+    recursive_time = measure_iteration(recursive_inorder(tree))
+    iterator_time = measure_iteration(tree)
+    reversed_time = measure_iteration(reversed(tree))
+
+    print(f"n = {n}")
+    print(f"recursive generators: {recursive_time:.2f}s")
+    print(f"successor iterator:   {iterator_time:.2f}s ({recursive_time / iterator_time:.1f}x)")
+    print(f"reversed iterator:    {reversed_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare the red-black tree used as a priority queue with heapq.
+The tree pops the cached minimum node with pop_min, the heap with heappop. Popping with remove(tree.min()),
+which searches for the node of the minimum from the root, is shown for comparison.
+The workloads are, where filling the queue with the n values first is not timed:
+    - sort: push n values, then pop them all;
+    - hold: fill the queue, then pop one value and push a larger one n times, like a timer queue;
+    - double-ended: fill the queue, then pop the minimum and the maximum alternately until it is empty (tree only).
+Usage: python time_priority_queue.py [number of values, defaults to 10^5] [--pure-python]
+"""
+
+from heapq import heappop, heappush
+from random import Random
+from time import perf_counter
+import sys
+
+from Tree import MultiRedBlackTree as module
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+
+
+class HeapQueue:
+    """
+    A list kept as a binary heap with heapq, with the methods of the tree used by the workloads.
+    """
+
+    def __init__(self):
+        self.heap = []
+
+    def add(self, value):
+        heappush(self.heap, value)
+
+    def pop_min(self):
+        return heappop(self.heap)
+
+
+class SearchingTree(MultiRedBlackTree):
+    """
+    A tree popping the extremes by removing the value of min() or max(), which searches for its node from the root.
+    """
+
+    def pop_min(self):
+        value = self.min()
+        self.remove(value)
+        return value
+
+    def pop_max(self):
+        value = self.max()
+        self.remove(value)
+        return value
+
+
+def fill(queue, values, rng):
+    for value in values:
+        queue.add(value)
+
+
+def sort(queue, values, rng):
+    for value in values:
+        queue.add(value)
+    for _ in values:
+        queue.pop_min()
+    return 2 * len(values)
+
+
+def hold(queue, values, rng):
+    random = rng.random
+    for _ in values:
+        queue.add(queue.pop_min() + random())
+    return 2 * len(values)
+
+
+def double_ended(queue, values, rng):
+    for _ in range(len(values) // 2):
+        queue.pop_min()
+        queue.pop_max()
+    return len(values) // 2 * 2
+
+
+# workload name -> (untimed setup, timed run returning the number of operations)
+WORKLOADS = {"sort": (None, sort), "hold": (fill, hold), "double-ended": (fill, double_ended)}
+
+QUEUES = {"heapq": HeapQueue, "tree pop_min/max": MultiRedBlackTree, "tree remove(min/max)": SearchingTree}
+
+
+def measure(queue_class, setup, run, values):
+    """
+    Returns the operations per second of a workload, counting every push and every pop.
+    """
+    queue = queue_class()
+    if setup is not None:
+        setup(queue, values, Random(1))
+    start_time = perf_counter()
+    operations = run(queue, values, Random(1))
+    return operations / (perf_counter() - start_time)
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != "--pure-python"]
+    n = int(arguments[0]) if arguments else 10**5
+    accelerated = module.use_accelerator("--pure-python" not in sys.argv)
+
+    rng = Random(0)
+    values = [rng.random() for _ in range(n)]
+    print(f"n = {n}, {'accelerated' if accelerated else 'pure Python'} tree, operations per second")
+
+    for name, (setup, run) in WORKLOADS.items():
+        for queue_name, queue_class in QUEUES.items():
+            if not hasattr(queue_class, "pop_max") and run is double_ended:
+                continue
+            throughput = measure(queue_class, setup, run, values)
+            print(f"{name:>12} {queue_name:>20}: {throughput:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the time it takes to restore a tree: rebuilding it from its values, loading it with pickle,
+loading the binary file written by save() and mapping that file with load(mmap=True).
+Usage: python time_serialization.py [number of elements, defaults to 10^6]
+"""
+
+from random import Random
+from time import perf_counter
+import pickle
+import sys
+import os
+import tempfile
+
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+
+
+def measure(function, *args):
+    """
+    Returns the result of function(*args) and the time it took.
+    """
+    start_time = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start_time
+
+
+def lookups(tree, values):
+    """
+    Looks up all values in the tree.
+    """
+    for value in values:
+        tree.contains(value)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    rng = Random(0)
+    values = [rng.randrange(4 * n) for _ in range(n)]
+    queries = [rng.randrange(4 * n) for _ in range(1000)]
+    tree = MultiRedBlackTree(values)
+    print(f"n = {n}")
+
+    _, build_time = measure(MultiRedBlackTree, values)
+    print(f"constructor from values:   {build_time:.2f}s")
+
+    try:
+        data, dump_time = measure(pickle.dumps, tree, pickle.HIGHEST_PROTOCOL)
+        _, load_time = measure(pickle.loads, data)
+        print(f"pickle dumps / loads:      {dump_time:.2f}s / {load_time:.2f}s, {len(data) / 2**20:.1f} MiB")
+    except RecursionError:
+        print("pickle dumps / loads:      RecursionError")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tree.rbt")
+        _, save_time = measure(tree.save, path)
+        _, load_time = measure(MultiRedBlackTree.load, path)
+        print(f"save / load:               {save_time:.2f}s / {load_time:.2f}s, {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        mapped, map_time = measure(MultiRedBlackTree.load, path, True)
+        _, lookup_time = measure(lookups, mapped, queries)
+        _, materialize_time = measure(mapped.materialize)
+        mapped.close()
+        print(f"load(mmap=True):           {map_time * 1000:.2f}ms")
+        print(f"1000 lookups on the map:   {lookup_time * 1000:.2f}ms")
+        print(f"materialize:               {materialize_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,174 +1,309 @@
 """
-Compare the performance of different implementations of the set data structure.
-Simple binary tree vs red-black tree.
+Benchmark suite comparing the implementations of the set data structure:
+simple binary tree vs red-black tree vs array red-black tree vs list of sorted blocks.
+
+Every workload is generated from a seed (see workloads.py) before anything is measured, and the same operations
+are run on every implementation. For each workload, size and implementation it reports:
+    - the throughput in operations per second, the median of several timed repeats after warmup runs;
+    - the p50 and p99 latency of a single operation, from a separate run timing each operation;
+    - the peak memory allocated while running the workload, from a run under tracemalloc;
+    - with --stats, the comparisons, descent depths, rotations and fixup cases, from a run of an instrumented tree.
+The results are printed as a table and written as JSON, to diff them between versions.
+
+Usage: python time_set.py [--sizes 1000 10000] [--workloads random zipfian] [--output results.json]
+       python time_set.py --workload-file random.bin --implementations red-black
+Run with --help for all options.
 """
 
-from time import time
-from random import random, randint, choice
-from math import log10
-import sys
-import os
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from itertools import islice
+from statistics import median
+from time import perf_counter_ns
+import json
+import platform
+import tracemalloc
+
+from Tree import MultiRedBlackTree as red_black_module
+from Tree.ArrayRedBlackTree import ArrayRedBlackTree
+from Tree.InstrumentedTree import instrumented
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+from Tree.MultiUnbalancedTree import MultiUnbalancedTree
+from Tree.SortedBlockTree import SortedBlockTree
+from workloads import WORKLOADS, generate_workload, load_workload
+
+IMPLEMENTATIONS = {
+    "unbalanced": MultiUnbalancedTree,
+    "red-black": MultiRedBlackTree,
+    "array-red-black": ArrayRedBlackTree,
+    "sorted-blocks": SortedBlockTree,
+}
+
+# the unbalanced tree degenerates into a linked list on these workloads, quadratic in the size
+DEGENERATE_WORKLOADS = {"unbalanced": {"sorted", "reverse"}}
+
+
+def bind_operations(tree, ops):
+    """
+    Turns a sequence of operations into calls of the tree's bound methods,
+    so that looking up the methods is not part of the measurement.
+    Parameters:
+        tree: The tree to run the operations on.
+        ops: Sequence of operations to perform on the tree.
+            Each operation is a tuple of the form (operation, value).
+            operation is either "add", "remove", "contains" or "range".
+            value is the value to add, remove or look up, or the (lo, hi) bounds of a range query.
+    Returns:
+        A list of (function, argument) pairs.
+    """
 
-# ugly hack to allow importing from parent directory, since in 50 years python still doesn't have a proper import system outside of modules
-# Get the current script's directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Get the parent directory by going one level up
-parent_dir = os.path.dirname(current_dir)
-# Add the parent directory to sys.path
-sys.path.append(parent_dir)
-sys.path.append(os.path.join(parent_dir, "Tree"))
+    def range_query(bounds):
+        tree.lower_bound(bounds[0])
+        tree.upper_bound(bounds[1])
 
-from MultiRedBlackTree import MultiRedBlackTree
-from MultiUnbalancedTree import MultiUnbalancedTree
+    methods = {
+        "add": tree.add,
+        "remove": tree.remove,
+        "contains": tree.__contains__,
+        "range": range_query,
+    }
+    try:
+        return [(methods[op], value) for op, value in ops]
+    except KeyError as error:
+        raise ValueError(f"Unknown operation {error.args[0]}") from None
 
 
 def measure_sequence_of_ops(tree, ops):
     """
     Measures the time it takes to perform a sequence of operations on the tree.
     Parameters:
-        tree_implementation: The tree implementation to use.
-        ops: Sequence of operations to perform on the tree.
-            Each operation is a tuple of the form (operation, value).
-            operation is either "add", "remove" or "contains".
-            value is the value to add or remove.
+        tree: The tree to run the operations on.
+        ops: Sequence of operations to perform on the tree, see bind_operations.
     Returns:
-        The time it took to perform all operations.
+        The time it took to perform all operations, in nanoseconds.
     """
-    start_time = time()
-    for op, value in ops:
-        if op == "add":
-            tree.add(value)
-        elif op == "remove":
-            tree.remove(value)
-        elif op == "contains":
-            tree.contains(value)
-        else:
-            raise ValueError(f"Unknown operation {op}")
-
-    return time() - start_time
+    calls = bind_operations(tree, ops)
+    start_time = perf_counter_ns()
+    for function, argument in calls:
+        function(argument)
+    return perf_counter_ns() - start_time
 
 
-def generate_op_random_sequence(n, min_val, max_val, add_prob, remove_prob):
+def measure_latencies(tree, ops):
     """
-    Generates a sequence of operations to perform on a tree.
-
-    It generates n operations, where each operation is either an add, remove or contains, with the given probabilities.
-    The probabilty of generating a contains operation is 1 - add_prob - remove_prob.
-
-    The function ensures that the sequence of operations is valid, i.e. if a remove is generated, the value is in the tree.
+    Measures the time each operation of a sequence takes.
     Parameters:
-        n: The number of operations to generate.
-        min_val: The minimum value to use.
-        max_val: The maximum value to use.
-        add_prob: The probability of generating an add operation.
-        remove_prob: The probability of generating a remove operation.
+        tree: The tree to run the operations on.
+        ops: Sequence of operations to perform on the tree, see bind_operations.
+    Returns:
+        The sorted list of the times of the operations, in nanoseconds.
     """
-    assert add_prob + remove_prob <= 1
-
-    values_in_tree = set()
-
-    def generate_op():
-        nonlocal values_in_tree
-
-        if len(values_in_tree) == 0:
-            # If the tree is empty, we can only add
-            return "add", randint(min_val, max_val)
-
-        # Generate a random operation
-        op = random()
-
-        if op < add_prob:
-            # Add
-            value = randint(min_val, max_val)
-            values_in_tree.add(value)
-            return "add", value
-
-        if op < add_prob + remove_prob:
-            return "remove", choice(list(values_in_tree))  # not the most efficient way to do this
-
-        # Contains
-        return "contains", randint(min_val, max_val)
-
-    return [generate_op() for _ in range(n)]
-
-
-def generate_add_sequence(n):
+    calls = bind_operations(tree, ops)
+    latencies = []
+    append = latencies.append
+    clock = perf_counter_ns
+    for function, argument in calls:
+        start_time = clock()
+        function(argument)
+        append(clock() - start_time)
+    latencies.sort()
+    return latencies
+
+
+def measure_peak_memory(tree_class, ops):
     """
-    Generates a sequence of n add operations, with sequential values.
+    Measures the peak memory allocated while building a tree and running a sequence of operations on it.
+    Parameters:
+        tree_class: The tree implementation to use.
+        ops: Sequence of operations to perform on the tree, see bind_operations.
+    Returns:
+        The peak memory, in bytes.
     """
-    return [("add", i) for i in range(n)]
-
-
-import matplotlib.pyplot as plt
-
-
-def main():
-    # Random sequence of operations with fully random values
-    # export the plot to a pdf file
-    plt.figure()
-    plt.xlabel("Number of operations")
-    plt.ylabel("Time taken (s)")
-    plt.title("Comparison of set implementations")
-    plt.xscale("log")
-
-    times_unbalanced = []
-    times_red_black = []
-    for n in [10**i for i in range(1, 8)]:  # 10, 100, 1000, ...
-        print(f"n = {n}")
-        ops = generate_op_random_sequence(n, 0, n * n, 0.8, 0.1)
-
-        times_unbalanced.append(
-            (
-                n,
-                measure_sequence_of_ops(MultiUnbalancedTree(), ops),
-            )
-        )
-
-        times_red_black.append(
-            (
-                n,
-                measure_sequence_of_ops(MultiRedBlackTree(), ops),
-            )
-        )
-
-    plt.plot(*zip(*times_unbalanced), label="Unbalanced")
-    plt.plot(*zip(*times_red_black), label="Red-black")
-    plt.legend()
-
-    plt.savefig("random_sequence.pdf")
-
-    # Random sequence of operations with values in a range
-    plt.figure()
-    plt.xlabel("Number of operations")
-    plt.ylabel("Time taken (s)")
-    plt.title("Comparison of set implementations")
-    plt.xscale("log")
-
-    times_unbalanced = []
-    times_red_black = []
-    for n in [10**i for i in range(1, 6)]:
-        print(f"n = {n}")
-        ops = generate_add_sequence(n)
+    tracemalloc.start()
+    try:
+        tree = tree_class()
+        for function, argument in bind_operations(tree, ops):
+            function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure_stream(tree, ops, chunk_size=1 << 16):
+    """
+    Measures the time it takes to perform a stream of operations on the tree,
+    binding and timing them a chunk at a time so that the whole stream is never in memory.
+    Parameters:
+        tree: The tree to run the operations on.
+        ops: An iterable of operations to perform on the tree, see bind_operations.
+        chunk_size: The number of operations bound at once.
+    Returns:
+        The number of operations and the time it took to perform them, in nanoseconds.
+    """
+    ops = iter(ops)
+    count = 0
+    elapsed = 0
+    while chunk := list(islice(ops, chunk_size)):
+        calls = bind_operations(tree, chunk)
+        start_time = perf_counter_ns()
+        for function, argument in calls:
+            function(argument)
+        elapsed += perf_counter_ns() - start_time
+        count += len(chunk)
+    return count, elapsed
+
+
+def measure_stats(tree_class, ops):
+    """
+    Counts the comparisons, descent depths, rotations and fixup cases of a sequence of operations,
+    on an instrumented tree that is slower than the plain one and so runs apart from the timed runs.
+    Raises TypeError if the implementation has no instrumented version.
+    Parameters:
+        tree_class: The tree implementation to use, MultiRedBlackTree or MultiUnbalancedTree or a subclass.
+        ops: Sequence of operations to perform on the tree, see bind_operations.
+    Returns:
+        The dict of the counters, see InstrumentedTree.Stats.as_dict.
+    """
+    tree = instrumented(tree_class)()
+    for function, argument in bind_operations(tree, ops):
+        function(argument)
+    return tree.stats()
 
-        times_unbalanced.append(
-            (
-                n,
-                measure_sequence_of_ops(MultiUnbalancedTree(), ops),
-            )
-        )
 
-        times_red_black.append(
-            (
-                n,
-                measure_sequence_of_ops(MultiRedBlackTree(), ops),
-            )
-        )
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of a sorted list lies, by the nearest-rank method.
+    """
+    index = max(0, min(len(sorted_values) - 1, int(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
 
-    plt.plot(*zip(*times_unbalanced), label="Unbalanced")
-    plt.plot(*zip(*times_red_black), label="Red-black")
-    plt.legend()
 
-    plt.savefig("increasing_sequence.pdf")
+def benchmark(tree_class, ops, repeats, warmup, stats=False):
+    """
+    Runs a sequence of operations on new trees of a class and collects the measurements.
+    Parameters:
+        tree_class: The tree implementation to use.
+        ops: Sequence of operations to perform on the tree, see bind_operations.
+        repeats: The number of timed runs.
+        warmup: The number of runs before the timed ones.
+        stats: Whether to add the counters of an instrumented tree, for the trees that can be instrumented.
+    Returns:
+        A dict with the throughput of each timed run, their median, the p50 and p99 latencies and the peak memory,
+        and the counters under "stats" if requested.
+    """
+    for _ in range(warmup):
+        measure_sequence_of_ops(tree_class(), ops)
+
+    runs = [len(ops) * 1e9 / max(1, measure_sequence_of_ops(tree_class(), ops)) for _ in range(repeats)]
+    latencies = measure_latencies(tree_class(), ops)
+    result = {
+        "ops_per_sec": median(runs),
+        "ops_per_sec_runs": runs,
+        "p50_ns": percentile(latencies, 0.50),
+        "p99_ns": percentile(latencies, 0.99),
+        "peak_memory_bytes": measure_peak_memory(tree_class, ops),
+    }
+    if stats:
+        try:
+            result["stats"] = measure_stats(tree_class, ops)
+        except TypeError:  # the implementation has no instrumented version
+            pass
+    return result
+
+
+def parse_arguments(argv):
+    parser = ArgumentParser(description="Benchmark the set implementations on seeded workloads.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="numbers of operations")
+    parser.add_argument(
+        "--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS), help="workloads to run"
+    )
+    parser.add_argument(
+        "--implementations",
+        nargs="+",
+        choices=list(IMPLEMENTATIONS),
+        default=list(IMPLEMENTATIONS),
+        help="implementations to compare",
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per measurement")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the workloads")
+    parser.add_argument(
+        "--degenerate-limit",
+        type=int,
+        default=2000,
+        help="largest size to run the unbalanced tree on sorted and reverse workloads",
+    )
+    parser.add_argument("--pure-python", action="store_true", help="do not use the C accelerator of the red-black tree")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="add the comparisons, rotations and fixup cases of the tree implementations to the results",
+    )
+    parser.add_argument(
+        "--workload-file",
+        help="stream the operations of a file written by workloads.py instead, measuring only the throughput",
+    )
+    parser.add_argument("--output", default="time_set.json", help="path of the JSON results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    accelerated = red_black_module.use_accelerator(not args.pure_python)
+
+    results = []
+    if args.workload_file:
+        # a single streamed run per implementation, the workload may not fit in memory
+        print(f"{args.workload_file}:")
+        for name in args.implementations:
+            count, elapsed = measure_stream(IMPLEMENTATIONS[name](), load_workload(args.workload_file))
+            result = {"workload": args.workload_file, "n": count, "implementation": name}
+            result["ops_per_sec"] = count * 1e9 / max(1, elapsed)
+            print(f"{name:>16}: {result['ops_per_sec']:>12,.0f} ops/s")
+            results.append(result)
+        args.workloads = []
+
+    for workload in args.workloads:
+        for n in args.sizes:
+            ops = generate_workload(workload, n, args.seed)
+            print(f"{workload} (n = {n}): {WORKLOADS[workload]}")
+            for name in args.implementations:
+                result = {"workload": workload, "n": n, "implementation": name}
+                if workload in DEGENERATE_WORKLOADS.get(name, ()) and n > args.degenerate_limit:
+                    result["skipped"] = f"degenerate workload above --degenerate-limit {args.degenerate_limit}"
+                    print(f"{name:>16}: skipped")
+                else:
+                    result.update(benchmark(IMPLEMENTATIONS[name], ops, args.repeats, args.warmup, args.stats))
+                    print(
+                        f"{name:>16}: {result['ops_per_sec']:>12,.0f} ops/s, p50 {result['p50_ns']:>7,} ns, "
+                        f"p99 {result['p99_ns']:>8,} ns, peak {result['peak_memory_bytes'] / 2**20:>8.2f} MiB"
+                    )
+                    if "stats" in result:
+                        stats = result["stats"]
+                        print(
+                            f"{'':>16}  {stats['comparisons']:,} comparisons, "
+                            f"{sum(stats['rotations'].values()):,} rotations, "
+                            f"{stats['insert_fixup']['iterations'] + stats['delete_fixup']['iterations']:,} fixup steps"
+                        )
+                results.append(result)
+
+    report = {
+        "metadata": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "accelerator": accelerated,
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
 
 
 if __name__ == "__main__":
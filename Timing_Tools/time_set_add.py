@@ -0,0 +1,57 @@
+"""
+Compare adding values to the set trees in a single descent with the former way,
+a membership test followed by the insertion of the multiset tree.
+Usage: python time_set_add.py [number of additions, defaults to 10^6]
+"""
+
+from random import Random
+from time import perf_counter
+import sys
+
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+from Tree.MultiUnbalancedTree import MultiUnbalancedTree
+from Tree.RedBlackTree import RedBlackTree
+from Tree.UnbalancedTree import UnbalancedTree
+
+
+def two_descents(tree, multiset_class, values):
+    """
+    Adds the values the way the set trees used to: a search, then a second descent to insert.
+    """
+    for value in values:
+        if value not in tree:
+            multiset_class.add(tree, value)
+
+
+def single_descent(tree, values):
+    """
+    Adds the values with the set tree's own add.
+    """
+    for value in values:
+        tree.add(value)
+
+
+def measure(function, *args):
+    """
+    Returns the time function(*args) takes.
+    """
+    start_time = perf_counter()
+    function(*args)
+    return perf_counter() - start_time
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    rng = Random(0)
+    # about half of the additions hit a value that is already in the set
+    values = [rng.randrange(n) for _ in range(n)]
+    print(f"n = {n}")
+
+    for set_class, multiset_class in [(RedBlackTree, MultiRedBlackTree), (UnbalancedTree, MultiUnbalancedTree)]:
+        before = measure(two_descents, set_class(), multiset_class, values)
+        after = measure(single_descent, set_class(), values)
+        print(f"{set_class.__name__:>14}: two descents {before:.2f}s, single descent {after:.2f}s ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Seeded workloads for the benchmarks: sequences of (operation, value) pairs to run on a tree.
+
+Workloads are generated lazily, one operation at a time, in O(1) per operation:
+the values currently in the tree are kept in an array with one entry per occurrence,
+and a random one is removed by swapping it with the last entry.
+A workload can be streamed straight into a benchmark or saved to a binary file first,
+so that runs of 10^7-10^8 operations neither keep the whole sequence in memory nor pay for generating it.
+
+Usage: python workloads.py <workload> <number of operations> <path> [--seed 0]
+"""
+
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, islice
+from random import Random
+import struct
+
+WORKLOADS = {
+    "sorted": "adds in ascending order",
+    "reverse": "adds in descending order",
+    "random": "80% add, 10% remove, 10% contains of uniform values",
+    "zipfian": "50% add, 20% remove, 30% contains of Zipf-distributed values",
+    "duplicates": "70% add, 20% remove, 10% contains of n / 100 distinct values",
+    "range": "n / 2 adds, then 90% range queries and 10% adds",
+}
+
+OPERATIONS = ("add", "remove", "contains", "range")
+
+# one operation in a workload file: the index of the operation in OPERATIONS and two values,
+# the second one is only used by range queries
+RECORD = struct.Struct("=Bqq")
+MAGIC = b"RBTW"
+VERSION = 1
+
+# the Zipf sampler keeps a table of this many ranks at most
+ZIPF_UNIVERSE = 10**6
+
+
+class RemovablePool:
+    """
+    The values in a tree, with one entry per occurrence.
+    Adding a value and removing a random entry both take O(1).
+    """
+
+    def __init__(self, typecode="q"):
+        """
+        Creates an empty pool.
+        Parameters:
+            typecode: The array typecode of the values, or None to store any Python objects in a list.
+                Defaults to 64-bit integers.
+        """
+        self._values = [] if typecode is None else array(typecode)
+
+    def __len__(self):
+        """
+        Returns the number of entries.
+        """
+        return len(self._values)
+
+    def add(self, value):
+        """
+        Adds one occurrence of a value.
+        Parameters:
+            value: The value to add.
+        """
+        self._values.append(value)
+
+    def pop_random(self, rng):
+        """
+        Removes a uniformly random occurrence and returns its value.
+        Values added several times are proportionally more likely to be picked.
+        Parameters:
+            rng: The random number generator.
+        """
+        values = self._values
+        index = rng.randrange(len(values))
+        value = values[index]
+        values[index] = values[-1]
+        values.pop()
+        return value
+
+
+def stream_op_random_sequence(n, draw_value, add_prob, remove_prob, rng, typecode="q"):
+    """
+    Yields a sequence of operations to perform on a tree.
+
+    It generates n operations, where each operation is either an add, remove or contains, with the given probabilities.
+    The probabilty of generating a contains operation is 1 - add_prob - remove_prob.
+
+    Every removal takes out one occurrence of a value that is in the tree at that point,
+    so the sequence is valid for multisets as well as for the values added more than once.
+    Parameters:
+        n: The number of operations to generate.
+        draw_value: A function returning a random value to add or look up.
+        add_prob: The probability of generating an add operation.
+        remove_prob: The probability of generating a remove operation.
+        rng: The random number generator.
+        typecode: The array typecode of the values, see RemovablePool.
+    """
+    assert add_prob + remove_prob <= 1
+
+    values_in_tree = RemovablePool(typecode)
+    random = rng.random
+    for _ in range(n):
+        op = random()
+        if op < add_prob or not values_in_tree:
+            # Add, the only operation on an empty tree
+            value = draw_value()
+            values_in_tree.add(value)
+            yield "add", value
+        elif op < add_prob + remove_prob:
+            yield "remove", values_in_tree.pop_random(rng)
+        else:
+            yield "contains", draw_value()
+
+
+def generate_op_random_sequence(n, draw_value, add_prob, remove_prob, rng, typecode="q"):
+    """
+    Returns the sequence of operations of stream_op_random_sequence as a list.
+    """
+    return list(stream_op_random_sequence(n, draw_value, add_prob, remove_prob, rng, typecode))
+
+
+def generate_add_sequence(n):
+    """
+    Generates a sequence of n add operations, with sequential values.
+    """
+    return [("add", i) for i in range(n)]
+
+
+def zipf_sampler(universe, exponent, rng):
+    """
+    Returns a function drawing values from range(universe) with a Zipf distribution:
+    the k-th most frequent value is drawn with a probability proportional to 1 / k ** exponent.
+    The most frequent values are spread over the range, not the smallest ones.
+    Only the ZIPF_UNIVERSE most frequent values are ever drawn, to bound the size of the table.
+    """
+    ranks = min(universe, ZIPF_UNIVERSE)
+    cumulative = list(accumulate(1 / rank**exponent for rank in range(1, ranks + 1)))
+    values = rng.sample(range(universe), ranks)
+    total = cumulative[-1]
+    random = rng.random
+    return lambda: values[bisect_left(cumulative, random() * total)]
+
+
+def iter_workload(name, n, seed):
+    """
+    Yields the operations of a workload.
+    The same name, number of operations and seed always give the same operations.
+    Parameters:
+        name: The name of the workload, a key of WORKLOADS.
+        n: The number of operations.
+        seed: The seed of the random number generator.
+    """
+    rng = Random(f"{name}-{n}-{seed}")
+    if name == "sorted":
+        return (("add", i) for i in range(n))
+    if name == "reverse":
+        return (("add", i) for i in range(n - 1, -1, -1))
+    if name == "random":
+        return stream_op_random_sequence(n, lambda: rng.randint(0, n * n), 0.8, 0.1, rng)
+    if name == "zipfian":
+        return stream_op_random_sequence(n, zipf_sampler(n, 1.1, rng), 0.5, 0.2, rng)
+    if name == "duplicates":
+        # few distinct values, most additions increase a counter
+        distinct = max(1, n // 100)
+        return stream_op_random_sequence(n, lambda: rng.randrange(distinct), 0.7, 0.2, rng)
+    if name == "range":
+        return _range_queries(n, rng)
+    raise ValueError(f"Unknown workload {name}")
+
+
+def _range_queries(n, rng):
+    """
+    Fills the tree with half of the operations, then mostly queries ranges of about 1% of the values.
+    """
+    fill = n // 2
+    for _ in range(fill):
+        yield "add", rng.randrange(n * 10)
+    for _ in range(n - fill):
+        if rng.random() < 0.9:
+            lo = rng.randrange(n * 10)
+            yield "range", (lo, lo + n // 10)
+        else:
+            yield "add", rng.randrange(n * 10)
+
+
+def generate_workload(name, n, seed):
+    """
+    Returns the operations of a workload as a list, see iter_workload.
+    """
+    return list(iter_workload(name, n, seed))
+
+
+def save_workload(path, ops):
+    """
+    Writes a sequence of operations with integer values to a binary file, streaming it.
+    Parameters:
+        path: The path of the file.
+        ops: An iterable of (operation, value) pairs, value is a (lo, hi) pair for range queries.
+    Returns:
+        The number of operations written.
+    """
+    ops = iter(ops)
+    codes = {op: code for code, op in enumerate(OPERATIONS)}
+    pack = RECORD.pack
+    count = 0
+    with open(path, "wb") as file:
+        file.write(MAGIC + bytes([VERSION]))
+        for chunk in iter(lambda: list(islice(ops, 1 << 16)), []):
+            records = []
+            for op, value in chunk:
+                if op == "range":
+                    records.append(pack(codes[op], *value))
+                else:
+                    records.append(pack(codes[op], value, 0))
+            file.write(b"".join(records))
+            count += len(chunk)
+    return count
+
+
+def load_workload(path, chunk_size=1 << 16):
+    """
+    Yields the operations of a file written by save_workload, reading it in chunks.
+    Raises ValueError if the file is not a workload file.
+    Parameters:
+        path: The path of the file.
+        chunk_size: The number of operations read at once.
+    """
+    with open(path, "rb") as file:
+        header = file.read(len(MAGIC) + 1)
+        if header[: len(MAGIC)] != MAGIC or header[len(MAGIC) :] != bytes([VERSION]):
+            raise ValueError(f"{path} is not a workload file")
+        while chunk := file.read(chunk_size * RECORD.size):
+            if len(chunk) % RECORD.size:
+                raise ValueError(f"{path} is truncated")
+            for code, value, hi in RECORD.iter_unpack(chunk):
+                op = OPERATIONS[code]
+                yield (op, (value, hi)) if op == "range" else (op, value)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Generate a seeded workload and save it to a binary file.")
+    parser.add_argument("workload", choices=list(WORKLOADS))
+    parser.add_argument("n", type=int, help="number of operations")
+    parser.add_argument("path", help="path of the workload file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the workload")
+    args = parser.parse_args(argv)
+
+    count = save_workload(args.path, iter_workload(args.workload, args.n, args.seed))
+    print(f"{count} operations of {args.workload} written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
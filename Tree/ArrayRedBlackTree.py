@@ -0,0 +1,668 @@
+"""
+Multiset implementation of a red-black tree stored in parallel arrays.
+The algorithms are the same as in MultiRedBlackTree, but a node is an index
+into typed arrays instead of a Python object, which removes the per-node
+allocation for int and float keys.
+Index 0 is the NIL sentinel. Slots of deleted nodes are kept in a free list and reused.
+"""
+
+from array import array
+from .MultiUnbalancedTree import MultiUnbalancedTree
+
+# index of the sentinel node
+NIL = 0
+
+# node colors, stored in a bytearray
+RED = 0
+BLACK = 1
+
+
+class _ArrayNodeAccess:
+    """
+    Reads the nodes of an ArrayRedBlackTree for export, with the methods of export.NodeAccess.
+    The NIL index is returned as None, since the export compares nodes by identity.
+    """
+
+    nil = None
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    def root(self):
+        root = self._tree._root
+        return None if root == NIL else root
+
+    def left(self, node):
+        child = self._tree._left[node]
+        return None if child == NIL else child
+
+    def right(self, node):
+        child = self._tree._right[node]
+        return None if child == NIL else child
+
+    def key(self, node):
+        return self._tree._values[node]
+
+    def value(self, node):
+        return self._tree._values[node]
+
+    def count(self, node):
+        return self._tree._counts[node]
+
+    def color(self, node):
+        return "black" if self._tree._colors[node] == BLACK else "red"
+
+    def below(self, node):
+        # the nodes do not keep the size of their subtree
+        return None
+
+
+class ArrayRedBlackTree(MultiUnbalancedTree):
+    def __init__(self, elems=[], typecode="q"):
+        """
+        Creates a new red-black tree.
+        If an iterable is passed, the tree is initialized with its values.
+        Parameters:
+            elems: An iterable. Defaults to an empty tree.
+            typecode: The array typecode of the values, "q" for ints and "d" for floats.
+        """
+        self._values = array(typecode, [0])
+        self._counts = array("q", [0])
+        self._left = array("q", [NIL])
+        self._right = array("q", [NIL])
+        self._parent = array("q", [NIL])
+        self._colors = bytearray([BLACK])
+        self._free = []  # slots of deleted nodes
+
+        self.NIL = NIL
+        self._root = NIL
+        self._size = 0  # number of distinct elements
+        self._length = 0  # number of elements
+        self._min_element = None
+        self._max_element = None
+        self._key = None  # the values are ordered by themselves
+
+        self._initialize(elems)
+
+    @classmethod
+    def from_sorted(cls, iterable, typecode="q"):
+        """
+        Creates a new tree from an iterable sorted in ascending order in O(n).
+        Equal values are collapsed into the counter of a single node.
+        Raises ValueError if the iterable is not sorted.
+        Parameters:
+            iterable: The sorted iterable to initialize the tree with.
+            typecode: The array typecode of the values, "q" for ints and "d" for floats.
+        """
+        values = list(iterable)
+        if not cls._is_sorted(values):
+            raise ValueError("Values are not sorted.")
+
+        tree = cls(typecode=typecode)
+        tree._build_from_sorted(values)
+        return tree
+
+    def _build_from_sorted(self, values):
+        """
+        Builds a valid red-black tree from a sorted list in O(n), replacing the contents of the empty tree.
+        The i-th distinct value is stored in slot i + 1.
+        Parameters:
+            values: The sorted list.
+        """
+        runs = list(self._sorted_runs(values))
+        if not runs:
+            return
+
+        n = len(runs)
+        self._values.extend(value for value, _ in runs)
+        self._counts.extend(count for _, count in runs)
+        self._left.extend(array("q", bytes(8 * n)))
+        self._right.extend(array("q", bytes(8 * n)))
+        self._parent.extend(array("q", bytes(8 * n)))
+        self._colors.extend(bytes([BLACK]) * n)
+
+        left, right, parent, colors = self._left, self._right, self._parent, self._colors
+        deepest = n.bit_length() - 1
+
+        def build(lo, hi, depth, parent_node):
+            # builds the subtree holding runs[lo:hi]
+            if lo >= hi:
+                return NIL
+            mid = (lo + hi) // 2
+            node = mid + 1
+            parent[node] = parent_node
+            if depth == deepest:
+                colors[node] = RED
+            left[node] = build(lo, mid, depth + 1, node)
+            right[node] = build(mid + 1, hi, depth + 1, node)
+            return node
+
+        self._root = build(0, n, 0, NIL)
+        colors[self._root] = BLACK
+        self._size = n
+        self._length = sum(self._counts)
+        self._min_element = runs[0][0]
+        self._max_element = runs[-1][0]
+
+    def _new_node(self, value):
+        """
+        Allocates a red node holding value, reusing a free slot if there is one.
+        Returns:
+            The index of the new node.
+        """
+        if self._free:
+            node = self._free[-1]
+            self._values[node] = value
+            self._free.pop()
+            self._counts[node] = 1
+            self._left[node] = NIL
+            self._right[node] = NIL
+            self._parent[node] = NIL
+            self._colors[node] = RED
+            return node
+
+        self._values.append(value)
+        self._counts.append(1)
+        self._left.append(NIL)
+        self._right.append(NIL)
+        self._parent.append(NIL)
+        self._colors.append(RED)
+        return len(self._colors) - 1
+
+    def _left_rotate(self, node):
+        """
+        Performs a left rotation on the given node.
+        Parameters:
+            node: The node to rotate.
+        """
+        if node == NIL:
+            return
+
+        left, right, parent = self._left, self._right, self._parent
+
+        pivot = right[node]
+        right[node] = left[pivot]
+        if left[pivot] != NIL:
+            parent[left[pivot]] = node
+        parent[pivot] = parent[node]
+        if parent[node] == NIL:
+            self._root = pivot
+        elif node == left[parent[node]]:
+            left[parent[node]] = pivot
+        else:
+            right[parent[node]] = pivot
+        left[pivot] = node
+        parent[node] = pivot
+
+    def _right_rotate(self, node):
+        """
+        Performs a right rotation on the given node.
+        Parameters:
+            node: The node to rotate.
+        """
+        if node == NIL:
+            return
+
+        left, right, parent = self._left, self._right, self._parent
+
+        pivot = left[node]
+        left[node] = right[pivot]
+        if right[pivot] != NIL:
+            parent[right[pivot]] = node
+        parent[pivot] = parent[node]
+        if parent[node] == NIL:
+            self._root = pivot
+        elif node == right[parent[node]]:
+            right[parent[node]] = pivot
+        else:
+            left[parent[node]] = pivot
+        right[pivot] = node
+        parent[node] = pivot
+
+    def _rb_insert_fixup(self, node):
+        """
+        Fixes the red-black tree properties after an insertion.
+        Parameters:
+            node: The node that was inserted.
+        """
+        left, right, parent, colors = self._left, self._right, self._parent, self._colors
+
+        while colors[parent[node]] == RED:
+            grandparent = parent[parent[node]]
+            if parent[node] == left[grandparent]:
+                uncle = right[grandparent]
+                if colors[uncle] == RED:
+                    # case 1: uncle is red
+                    colors[parent[node]] = BLACK
+                    colors[uncle] = BLACK
+                    colors[grandparent] = RED
+                    node = grandparent
+                else:
+                    if node == right[parent[node]]:
+                        # case 2: uncle is black and node is a right child
+                        node = parent[node]
+                        self._left_rotate(node)
+                    # case 3: uncle is black and node is a left child
+                    colors[parent[node]] = BLACK
+                    colors[parent[parent[node]]] = RED
+                    self._right_rotate(parent[parent[node]])
+            else:
+                # same as above, but with left and right exchanged
+                uncle = left[grandparent]
+                if colors[uncle] == RED:
+                    colors[parent[node]] = BLACK
+                    colors[uncle] = BLACK
+                    colors[grandparent] = RED
+                    node = grandparent
+                else:
+                    if node == left[parent[node]]:
+                        node = parent[node]
+                        self._right_rotate(node)
+                    colors[parent[node]] = BLACK
+                    colors[parent[parent[node]]] = RED
+                    self._left_rotate(parent[parent[node]])
+
+        colors[self._root] = BLACK
+
+    def _add(self, value):
+        """
+        Adds a value to the tree.
+        If the value already exists, the counter is increased.
+        Parameters:
+            value: The value to add.
+        Returns:
+            True if a new node was created, False if the value was already in the tree.
+        """
+        values, left, right = self._values, self._left, self._right
+
+        node = self._root
+        parent = NIL
+
+        # find the place to insert the new node
+        while node != NIL:
+            parent = node
+            if values[node] == value:
+                self._counts[node] += 1
+                self._length += 1
+                return False
+
+            if values[node] > value:
+                node = left[node]
+            else:
+                node = right[node]
+
+        # if reached here, the value is not in the tree
+        new_node = self._new_node(value)  # raises TypeError for values not fitting the typecode
+        self._length += 1
+        self._size += 1
+        self._parent[new_node] = parent
+
+        if parent == NIL:
+            # the tree was empty
+            self._root = new_node
+            self._min_element = value
+            self._max_element = value
+        elif value < values[parent]:
+            left[parent] = new_node
+        else:
+            right[parent] = new_node
+
+        self._min_element = min(self._min_element, value)
+        self._max_element = max(self._max_element, value)
+
+        self._rb_insert_fixup(new_node)
+        return True
+
+    def _rb_transplant(self, node1, node2):
+        """
+        Replaces the subtree rooted at node1 with the subtree rooted at node2.
+        Parameters:
+            node1: The node to replace.
+            node2: The node to replace with.
+        """
+        parent = self._parent[node1]
+        if parent == NIL:
+            self._root = node2
+        elif node1 == self._left[parent]:
+            self._left[parent] = node2
+        else:
+            self._right[parent] = node2
+
+        self._parent[node2] = parent
+
+    def _rb_delete_fixup(self, node):
+        """
+        Fixes the red-black tree properties after a deletion.
+        Parameters:
+            node: The node that replaced the deleted node.
+        """
+        left, right, parent, colors = self._left, self._right, self._parent, self._colors
+
+        while node != self._root and colors[node] == BLACK:
+            if node == left[parent[node]]:
+                sibling = right[parent[node]]
+                if colors[sibling] == RED:
+                    # case 1: sibling is red
+                    colors[sibling] = BLACK
+                    colors[parent[node]] = RED
+                    self._left_rotate(parent[node])
+                    sibling = right[parent[node]]
+                if colors[left[sibling]] == BLACK and colors[right[sibling]] == BLACK:
+                    # case 2: sibling is black and both its children are black
+                    colors[sibling] = RED
+                    node = parent[node]
+                else:
+                    if colors[right[sibling]] == BLACK:
+                        # case 3: sibling is black, its left child is red and its right child is black
+                        colors[left[sibling]] = BLACK
+                        colors[sibling] = RED
+                        self._right_rotate(sibling)
+                        sibling = right[parent[node]]
+                    # case 4: sibling is black and its right child is red
+                    colors[sibling] = colors[parent[node]]
+                    colors[parent[node]] = BLACK
+                    colors[right[sibling]] = BLACK
+                    self._left_rotate(parent[node])
+                    node = self._root
+            else:
+                # same as above, but with left and right exchanged
+                sibling = left[parent[node]]
+                if colors[sibling] == RED:
+                    colors[sibling] = BLACK
+                    colors[parent[node]] = RED
+                    self._right_rotate(parent[node])
+                    sibling = left[parent[node]]
+                if colors[right[sibling]] == BLACK and colors[left[sibling]] == BLACK:
+                    colors[sibling] = RED
+                    node = parent[node]
+                else:
+                    if colors[left[sibling]] == BLACK:
+                        colors[right[sibling]] = BLACK
+                        colors[sibling] = RED
+                        self._left_rotate(sibling)
+                        sibling = left[parent[node]]
+                    colors[sibling] = colors[parent[node]]
+                    colors[parent[node]] = BLACK
+                    colors[left[sibling]] = BLACK
+                    self._right_rotate(parent[node])
+                    node = self._root
+
+        colors[node] = BLACK
+
+    def _tree_minimum(self, node):
+        """
+        Returns the minimum node in the subtree rooted at node.
+        Parameters:
+            node: The root of the subtree.
+        """
+        left = self._left
+        while left[node] != NIL:
+            node = left[node]
+        return node
+
+    def _tree_maximum(self, node):
+        """
+        Returns the maximum node in the subtree rooted at node.
+        Parameters:
+            node: The root of the subtree.
+        """
+        right = self._right
+        while right[node] != NIL:
+            node = right[node]
+        return node
+
+    def _remove_node(self, node_to_delete):
+        """
+        Removes a node from the tree and puts its slot on the free list.
+        Parameters:
+            node_to_delete: The node to remove.
+        """
+        left, right, parent, colors = self._left, self._right, self._parent, self._colors
+
+        self._size -= 1
+        self._free.append(node_to_delete)
+        removed_value = self._values[node_to_delete]
+
+        if self._size == 0:
+            self._root = NIL
+            self._min_element = None
+            self._max_element = None
+            return
+
+        original_color = colors[node_to_delete]
+        if left[node_to_delete] == NIL:
+            # node has no left child
+            child = right[node_to_delete]
+            self._rb_transplant(node_to_delete, child)
+        elif right[node_to_delete] == NIL:
+            # node has no right child
+            child = left[node_to_delete]
+            self._rb_transplant(node_to_delete, child)
+        else:
+            # node has two children
+            node = self._tree_minimum(right[node_to_delete])
+            original_color = colors[node]
+            child = right[node]
+            if parent[node] == node_to_delete:
+                parent[child] = node
+            else:
+                self._rb_transplant(node, child)
+                right[node] = right[node_to_delete]
+                parent[right[node]] = node
+            self._rb_transplant(node_to_delete, node)
+            left[node] = left[node_to_delete]
+            parent[left[node]] = node
+            colors[node] = colors[node_to_delete]
+
+        if original_color == BLACK:
+            self._rb_delete_fixup(child)
+
+        if self._min_element == removed_value:
+            self._min_element = self._values[self._tree_minimum(self._root)]
+        if self._max_element == removed_value:
+            self._max_element = self._values[self._tree_maximum(self._root)]
+
+    def _remove(self, value):
+        """
+        Removes a value from the tree.
+        If the value has a counter greater than 1, the counter is decreased.
+        Raises ValueError if the value is not in the tree.
+        Parameters:
+            value: The value to remove.
+        """
+        node = self._find(value)
+        if node is None:
+            raise ValueError("Value not found in tree")
+
+        self._length -= 1
+        if self._counts[node] > 1:
+            self._counts[node] -= 1
+        else:
+            self._remove_node(node)
+
+    def _find(self, value):
+        """
+        Returns the index of the node with the given value or None if not found.
+        Parameters:
+            value: The value to search for.
+        """
+        values, left, right = self._values, self._left, self._right
+
+        node = self._root
+        while node != NIL:
+            if values[node] == value:
+                return node
+            if values[node] > value:
+                node = left[node]
+            else:
+                node = right[node]
+        return None
+
+    def count(self, value):
+        """
+        Returns the number of occurrences of a value in the tree.
+        Parameters:
+            value: The value to count.
+        """
+        node = self._find(value)
+        if node is None:
+            return 0
+        return self._counts[node]
+
+    def __iter__(self):
+        """
+        Returns a generator that iterates over the tree in order.
+        """
+        values, counts, left, right, parent = self._values, self._counts, self._left, self._right, self._parent
+
+        node = self._tree_minimum(self._root)
+        while node != NIL:
+            value = values[node]
+            for _ in range(counts[node]):
+                yield value
+
+            # move to the in-order successor
+            if right[node] != NIL:
+                node = right[node]
+                while left[node] != NIL:
+                    node = left[node]
+            else:
+                while parent[node] != NIL and node == right[parent[node]]:
+                    node = parent[node]
+                node = parent[node]
+
+    def __reversed__(self):
+        """
+        Returns a generator that iterates over the tree in descending order.
+        """
+        values, counts, left, right, parent = self._values, self._counts, self._left, self._right, self._parent
+
+        node = self._tree_maximum(self._root)
+        while node != NIL:
+            value = values[node]
+            for _ in range(counts[node]):
+                yield value
+
+            # move to the in-order predecessor
+            if left[node] != NIL:
+                node = left[node]
+                while right[node] != NIL:
+                    node = right[node]
+            else:
+                while parent[node] != NIL and node == left[parent[node]]:
+                    node = parent[node]
+                node = parent[node]
+
+    def lower_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        values, left, right = self._values, self._left, self._right
+
+        node = self._root
+        result = None
+        while node != NIL:
+            if values[node] == value:
+                return values[node]
+            elif values[node] < value:
+                node = right[node]
+            else:
+                result = values[node]
+                node = left[node]
+        return result
+
+    def upper_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        values, left, right = self._values, self._left, self._right
+
+        node = self._root
+        result = None
+        while node != NIL:
+            if values[node] <= value:
+                node = right[node]
+            else:
+                result = values[node]
+                node = left[node]
+        return result
+
+    def _node_access(self):
+        """
+        Returns the accessor reading the nodes for export, which are indices instead of node objects.
+        """
+        return _ArrayNodeAccess(self)
+
+    def lower_bound_key(self, key):
+        """
+        Returns the first value whose key is greater than or equal to key.
+        The tree has no key function, the values are their own keys.
+        Parameters:
+            key: The key to check.
+        """
+        return self.lower_bound(key)
+
+    def upper_bound_key(self, key):
+        """
+        Returns the first value whose key is greater than key.
+        The tree has no key function, the values are their own keys.
+        Parameters:
+            key: The key to check.
+        """
+        return self.upper_bound(key)
+
+    def is_red_black(self):
+        """
+        Checks if the tree is a valid red-black tree.
+        Returns:
+            True if the tree is a valid red-black tree, False otherwise.
+        """
+        left, right, colors = self._left, self._right, self._colors
+
+        if colors[self._root] != BLACK:
+            return False
+
+        # iterative post-order walk computing black heights
+        black_height = {NIL: 0}
+        stack = [self._root] if self._root != NIL else []
+        while stack:
+            node = stack[-1]
+            if left[node] not in black_height:
+                stack.append(left[node])
+                continue
+            if right[node] not in black_height:
+                stack.append(right[node])
+                continue
+            stack.pop()
+
+            if colors[node] == RED and (colors[left[node]] == RED or colors[right[node]] == RED):
+                return False
+            if black_height[left[node]] != black_height[right[node]]:
+                return False
+            black_height[node] = black_height[left[node]] + colors[node]
+
+        return True
+
+    def _count_size(self, node):
+        """
+        Returns the number of elements in the subtree rooted at node.
+        Parameters:
+            node: The root of the subtree.
+        """
+        counts, left, right = self._counts, self._left, self._right
+
+        total = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node != NIL:
+                total += counts[node]
+                stack.append(left[node])
+                stack.append(right[node])
+        return total
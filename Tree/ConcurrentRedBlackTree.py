@@ -0,0 +1,330 @@
+"""
+Thread-safe wrapper around a MultiRedBlackTree.
+Any number of threads can read the tree at the same time, while writers are serialized
+and get exclusive access. Waiting writers take precedence over new readers.
+"""
+
+from contextlib import contextmanager
+from threading import Condition, Lock, get_ident
+from .MultiRedBlackTree import MultiRedBlackTree
+
+
+class ReadWriteLock:
+    def __init__(self):
+        """
+        Creates a new lock, allowing either many readers or one writer.
+        The write lock is reentrant: the thread holding it may take it again, or take the read lock,
+        and must release it as many times. A thread holding only a read lock must not take the write lock.
+        """
+        self._condition = Condition(Lock())
+        self._readers = 0  # number of read locks held, including those of the writer
+        self._writer = None  # the identifier of the thread holding the write lock
+        self._writes = 0  # number of times the writer holds the write lock
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        """
+        Blocks until no writer holds or waits for the lock, then takes a read lock.
+        The thread holding the write lock gets the read lock at once.
+        """
+        with self._condition:
+            if self._writer != get_ident():
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """
+        Releases a read lock.
+        """
+        with self._condition:
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        """
+        Blocks until no other thread holds the lock, then takes the write lock.
+        The thread holding the write lock takes it again at once.
+        """
+        me = get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writes += 1
+                return
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        """
+        Releases the write lock, which other threads can take once it is released as many times as it was taken.
+        """
+        with self._condition:
+            self._writes -= 1
+            if self._writes == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """
+        Context manager holding a read lock.
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Context manager holding the write lock.
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class ConcurrentRedBlackTree:
+    def __init__(self, elems=[]):
+        """
+        Creates a new thread-safe red-black tree.
+        If an iterable is passed, the tree is initialized with its values.
+        Parameters:
+            elems: An iterable. Defaults to an empty tree.
+        """
+        self._tree = MultiRedBlackTree(elems)
+        self._lock = ReadWriteLock()
+
+    def add(self, value):
+        """
+        Adds a value to the tree.
+        Parameters:
+            value: The value to add.
+        """
+        with self._lock.write():
+            self._tree.add(value)
+
+    def remove(self, value):
+        """
+        Removes a value from the tree.
+        Raises ValueError if the value is not in the tree.
+        Parameters:
+            value: The value to remove.
+        """
+        with self._lock.write():
+            self._tree.remove(value)
+
+    def add_many(self, iterable):
+        """
+        Adds all values of an iterable, taking the write lock once for the whole batch.
+        Parameters:
+            iterable: The values to add.
+        """
+        batch = list(iterable)
+        with self._lock.write():
+            self._tree.add_many(batch)
+
+    def remove_many(self, iterable):
+        """
+        Removes all values of an iterable, taking the write lock once for the whole batch.
+        Raises ValueError if a value is not in the tree as many times as in the batch.
+        Parameters:
+            iterable: The values to remove.
+        """
+        batch = list(iterable)
+        with self._lock.write():
+            self._tree.remove_many(batch)
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager holding the write lock and giving access to the underlying tree,
+        so that several operations are applied atomically:
+
+            with tree.batch() as inner:
+                inner.remove(old)
+                inner.add(new)
+
+        The underlying tree must not be used after the block ends. The methods of this tree can be called
+        in the block too, the thread running it holds the write lock and takes it again at once.
+        """
+        with self._lock.write():
+            yield self._tree
+
+    def __contains__(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        with self._lock.read():
+            return value in self._tree
+
+    def contains(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        with self._lock.read():
+            return self._tree.contains(value)
+
+    def count(self, value):
+        """
+        Returns the number of occurrences of a value in the tree.
+        Parameters:
+            value: The value to count.
+        """
+        with self._lock.read():
+            return self._tree.count(value)
+
+    def lower_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        with self._lock.read():
+            return self._tree.lower_bound(value)
+
+    def upper_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        with self._lock.read():
+            return self._tree.upper_bound(value)
+
+    def min(self):
+        """
+        Returns the minimum element in the tree.
+        """
+        with self._lock.read():
+            return self._tree.min()
+
+    def max(self):
+        """
+        Returns the maximum element in the tree.
+        """
+        with self._lock.read():
+            return self._tree.max()
+
+    def pop_min(self):
+        """
+        Removes and returns one occurrence of the minimum, as a single atomic operation.
+        Raises IndexError if the tree is empty.
+        """
+        with self._lock.write():
+            return self._tree.pop_min()
+
+    def pop_max(self):
+        """
+        Removes and returns one occurrence of the maximum, as a single atomic operation.
+        Raises IndexError if the tree is empty.
+        """
+        with self._lock.write():
+            return self._tree.pop_max()
+
+    def peek_min(self):
+        """
+        Returns the minimum without removing it.
+        Raises IndexError if the tree is empty.
+        """
+        with self._lock.read():
+            return self._tree.peek_min()
+
+    def peek_max(self):
+        """
+        Returns the maximum without removing it.
+        Raises IndexError if the tree is empty.
+        """
+        with self._lock.read():
+            return self._tree.peek_max()
+
+    def rank(self, value):
+        """
+        Returns the number of elements in the tree that are smaller than the given value.
+        Parameters:
+            value: The value to compare to.
+        """
+        with self._lock.read():
+            return self._tree.rank(value)
+
+    def select(self, index):
+        """
+        Returns the element at the given position of the sorted order.
+        Parameters:
+            index: The position of the element.
+        """
+        with self._lock.read():
+            return self._tree.select(index)
+
+    def count_range(self, lo, hi):
+        """
+        Returns the number of elements x in the tree with lo <= x < hi.
+        Parameters:
+            lo: The inclusive lower bound.
+            hi: The exclusive upper bound.
+        """
+        with self._lock.read():
+            return self._tree.count_range(lo, hi)
+
+    def snapshot(self, lo=None, hi=None):
+        """
+        Returns a sorted list of the elements between lo and hi, copied under a single read lock.
+        Parameters:
+            lo: The inclusive lower bound, None for no bound.
+            hi: The exclusive upper bound, None for no bound.
+        """
+        with self._lock.read():
+            return list(self._tree.irange(lo, hi))
+
+    def __iter__(self):
+        """
+        Returns an iterator over a snapshot of the tree, so writers are not blocked while iterating.
+        """
+        return iter(self.snapshot())
+
+    def __len__(self):
+        """
+        Returns the number of elements in the tree.
+        """
+        with self._lock.read():
+            return len(self._tree)
+
+    def validate(self):
+        """
+        Checks all invariants of the underlying tree, raising InvariantError for the first violation.
+        """
+        with self._lock.read():
+            self._tree.validate()
+
+    def is_red_black(self):
+        """
+        Checks if the underlying tree is a valid red-black tree.
+        """
+        with self._lock.read():
+            return self._tree.is_red_black()
+
+    def __str__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(self.snapshot())
+
+    def __repr__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(self.snapshot())
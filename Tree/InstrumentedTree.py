@@ -0,0 +1,280 @@
+"""
+Instrumented versions of the trees, counting what the operations cost:
+    - comparisons of keys, in total and per operation;
+    - the depth of the descent of each operation;
+    - node allocations;
+    - left and right rotations, and the iterations of the insert and delete fixups split by case.
+The counters live only in these subclasses. The pure Python fixups of the plain red-black trees still read the
+class flag _counts_fixups once per call and test it for each case, to skip the hook the subclasses count with.
+The red-black subclass always runs the pure Python methods, never the C accelerator, so that every rotation is seen.
+
+Keys are counted by wrapping the key of every node in a CountingKey, which compares like the key it holds.
+Results are returned by stats() as a dict of plain numbers, ready to be written to JSON.
+"""
+
+from functools import partial
+
+from .ArrayRedBlackTree import ArrayRedBlackTree
+from .MultiRedBlackTree import PURE_PYTHON_METHODS, MultiRedBlackTree
+from .MultiUnbalancedTree import MultiUnbalancedTree
+
+INSERT_CASES = 3
+DELETE_CASES = 4
+
+
+class Stats:
+    """
+    The counters of one instrumented tree.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Sets all counters to zero.
+        """
+        self.comparisons = 0
+        self.allocations = 0
+        self.rotations = {"left": 0, "right": 0}
+        self.insert_fixup = [0] * (INSERT_CASES + 1)  # iterations, then the count of each case
+        self.delete_fixup = [0] * (DELETE_CASES + 1)
+        self.operations = {}  # name -> [calls, comparisons, total depth, maximum depth]
+
+    def record(self, name, comparisons, depth):
+        """
+        Adds an operation, with the comparisons it made and the depth of its descent.
+        """
+        operation = self.operations.setdefault(name, [0, 0, 0, 0])
+        operation[0] += 1
+        operation[1] += comparisons
+        operation[2] += depth
+        operation[3] = max(operation[3], depth)
+
+    def as_dict(self):
+        """
+        Returns the counters as a dict of numbers, with averages per operation.
+        """
+        operations = {}
+        for name, (calls, comparisons, depth, max_depth) in self.operations.items():
+            operations[name] = {
+                "calls": calls,
+                "comparisons": comparisons,
+                "comparisons_per_call": comparisons / calls,
+                "mean_depth": depth / calls,
+                "max_depth": max_depth,
+            }
+        return {
+            "comparisons": self.comparisons,
+            "allocations": self.allocations,
+            "operations": operations,
+            "rotations": dict(self.rotations),
+            "insert_fixup": _fixup_dict(self.insert_fixup),
+            "delete_fixup": _fixup_dict(self.delete_fixup),
+        }
+
+
+def _fixup_dict(counters):
+    """
+    Returns the counters of a fixup as a dict of its iterations and of each case.
+    """
+    result = {"iterations": counters[0]}
+    for case, count in enumerate(counters[1:], 1):
+        result[f"case_{case}"] = count
+    return result
+
+
+class CountingKey:
+    """
+    A key that counts every comparison with it in the stats of its tree.
+    It compares and hashes like the key it wraps, which may be compared with either plain keys or other CountingKeys.
+    """
+
+    __slots__ = ("key", "stats")
+
+    def __init__(self, key, stats):
+        self.key = key
+        self.stats = stats
+
+    def __eq__(self, other):
+        self.stats.comparisons += 1
+        return self.key == (other.key if type(other) is CountingKey else other)
+
+    def __ne__(self, other):
+        self.stats.comparisons += 1
+        return self.key != (other.key if type(other) is CountingKey else other)
+
+    def __lt__(self, other):
+        self.stats.comparisons += 1
+        return self.key < (other.key if type(other) is CountingKey else other)
+
+    def __le__(self, other):
+        self.stats.comparisons += 1
+        return self.key <= (other.key if type(other) is CountingKey else other)
+
+    def __gt__(self, other):
+        self.stats.comparisons += 1
+        return self.key > (other.key if type(other) is CountingKey else other)
+
+    def __ge__(self, other):
+        self.stats.comparisons += 1
+        return self.key >= (other.key if type(other) is CountingKey else other)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return repr(self.key)
+
+
+class Instrumentation:
+    """
+    Mixin counting the comparisons, descent depths and allocations of a tree.
+    It goes before the tree class in the bases of an instrumented class.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # the counting node class is shared by the instrumented class, the tree only binds its stats to it
+        self._stats = Stats()
+        self.Node = partial(type(self).Node, stats=self._stats)
+        super().__init__(*args, **kwargs)
+        self._stats.reset()
+
+    def __reduce__(self):
+        # pickles as the plain tree, rebuilt from the values since the nodes hold counting keys
+        return self._instrumented_class.from_sorted, (list(self), self._key)
+
+    def stats(self):
+        """
+        Returns the counters as a dict, see Stats.as_dict.
+        """
+        return self._stats.as_dict()
+
+    def reset_stats(self):
+        """
+        Sets all counters to zero.
+        """
+        self._stats.reset()
+
+    def _descent_depth(self, value):
+        """
+        Returns the number of nodes on the path from the root to the node with the value's key,
+        or to the leaf where the search for it ends. Its own comparisons are not counted.
+        """
+        key = self._key_of(value)
+        nil = getattr(self, "NIL", None)
+        node = self._root
+        depth = 0
+        while node is not nil:
+            depth += 1
+            # nodes spliced in from a plain tree by join or the set operations hold plain keys
+            node_key = node.key.key if type(node.key) is CountingKey else node.key
+            if node_key == key:
+                break
+            node = node.left if key < node_key else node.right
+        return depth
+
+    def add(self, value):
+        stats = self._stats
+        # the depth of the descent the insert makes, before the rotations move the node
+        depth = self._descent_depth(value)
+        comparisons = stats.comparisons
+        result = super().add(value)
+        stats.record("add", stats.comparisons - comparisons, depth)
+        return result
+
+    def remove(self, value):
+        stats = self._stats
+        depth = self._descent_depth(value)
+        comparisons = stats.comparisons
+        super().remove(value)
+        stats.record("remove", stats.comparisons - comparisons, depth)
+
+    def __contains__(self, value):
+        stats = self._stats
+        comparisons = stats.comparisons
+        result = super().__contains__(value)
+        stats.record("contains", stats.comparisons - comparisons, self._descent_depth(value))
+        return result
+
+    def contains(self, value):
+        return self.__contains__(value)
+
+
+class RedBlackInstrumentation(Instrumentation):
+    """
+    Mixin also counting the rotations and the fixup cases of a red-black tree,
+    through the hooks the rotations and the fixups of MultiRedBlackTree call.
+    """
+
+    _counts_fixups = True
+
+    def __reduce__(self):
+        # pickles as the plain tree, the state of MultiRedBlackTree holds the values and not the counting keys
+        _, arguments, state = super(Instrumentation, self).__reduce__()
+        return self._instrumented_class, arguments, state
+
+    def _left_rotate(self, node):
+        if node is not self.NIL:
+            self._stats.rotations["left"] += 1
+        super()._left_rotate(node)
+
+    def _right_rotate(self, node):
+        if node is not self.NIL:
+            self._stats.rotations["right"] += 1
+        super()._right_rotate(node)
+
+    def _fixup_case(self, fixup, case):
+        counters = self._stats.insert_fixup if fixup == "insert" else self._stats.delete_fixup
+        counters[case] += 1
+
+
+def _counting_node_class(node_class):
+    """
+    Returns the subclass of a node class whose nodes count their allocation and the comparisons of their key
+    in the stats passed as the stats keyword argument.
+    """
+
+    def __init__(node, *args, stats, **kwargs):
+        node_class.__init__(node, *args, **kwargs)
+        stats.allocations += 1
+        if type(node.key) is not CountingKey:
+            node.key = CountingKey(node.key, stats)
+
+    return type(node_class.__name__, (node_class,), {"__slots__": (), "__init__": __init__})
+
+
+def instrumented(tree_class):
+    """
+    Returns an instrumented subclass of a MultiRedBlackTree or MultiUnbalancedTree class,
+    for example of RedBlackTree or RedBlackTreeMap.
+    Raises TypeError for other classes, and for ArrayRedBlackTree which has no nodes.
+    Parameters:
+        tree_class: The class to instrument.
+    """
+    if issubclass(tree_class, ArrayRedBlackTree):
+        raise TypeError(f"Cannot instrument {tree_class.__name__}, it has no nodes")
+    if issubclass(tree_class, MultiRedBlackTree):
+        # the Python methods where the class uses the ones of MultiRedBlackTree, which may be the C accelerator
+        # that would not call the counting rotations and fixups
+        python_methods = {
+            name: method
+            for name, method in PURE_PYTHON_METHODS.items()
+            if getattr(tree_class, name) is getattr(MultiRedBlackTree, name)
+        }
+        python_class = type(f"Python{tree_class.__name__}", (tree_class,), python_methods)
+        bases = (RedBlackInstrumentation, python_class)
+    elif issubclass(tree_class, MultiUnbalancedTree):
+        bases = (Instrumentation, tree_class)
+    else:
+        raise TypeError(f"Cannot instrument {tree_class.__name__}")
+    namespace = {
+        "__doc__": f"{tree_class.__name__} counting what its operations cost, see stats().",
+        "_instrumented_class": tree_class,
+        "Node": _counting_node_class(tree_class.Node),
+    }
+    return type(f"Instrumented{tree_class.__name__}", bases, namespace)
+
+
+InstrumentedMultiUnbalancedTree = instrumented(MultiUnbalancedTree)
+InstrumentedMultiRedBlackTree = instrumented(MultiRedBlackTree)
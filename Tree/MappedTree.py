@@ -0,0 +1,197 @@
+"""
+Binary file format for trees of numeric values and a read-only view of such a file.
+A file holds a header, the distinct values in ascending order and their counters:
+
+    magic (4 bytes) | version (1 byte) | typecode (1 byte) | padding (2 bytes) | size (8 bytes) | length (8 bytes)
+    values: size items of the array typecode, padded to a multiple of 8 bytes
+    counters: size signed 64 bit integers
+
+All numbers are in the byte order of the machine that wrote the file.
+The sorted values are the implicit balanced layout of the tree: the middle value is the root
+and each half is a subtree. MappedTree maps the file into memory and answers lookups
+with binary searches on it, without reading the file up front or creating any nodes.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+import mmap
+import struct
+
+MAGIC = b"RBTF"
+VERSION = 1
+HEADER = struct.Struct("=4sBc2xqq")
+COUNT_TYPECODE = "q"
+
+
+def _padded(size):
+    """
+    Returns size rounded up to a multiple of 8.
+    """
+    return (size + 7) & ~7
+
+
+def write_tree(path, runs, typecode=None):
+    """
+    Writes (value, count) pairs in ascending order of values to a file.
+    Parameters:
+        path: The path of the file.
+        runs: The list of (value, count) pairs.
+        typecode: The array typecode of the values. Defaults to "q" for int values and "d" otherwise.
+    """
+    if typecode is None:
+        typecode = "q" if all(isinstance(value, int) for value, _ in runs) else "d"
+    values = array(typecode)
+    counts = array(COUNT_TYPECODE)
+    for value, count in runs:
+        values.append(value)
+        counts.append(count)
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, values.typecode.encode(), len(values), sum(counts)))
+        values.tofile(file)
+        file.write(bytes(_padded(len(values) * values.itemsize) - len(values) * values.itemsize))
+        counts.tofile(file)
+
+
+class MappedTree:
+    """
+    Read-only view of a tree file. Lookups run in O(log n) directly on the mapped file,
+    so they are available right after opening it, before any node is created.
+    """
+
+    def __init__(self, path, tree_class):
+        """
+        Maps a tree file into memory.
+        Raises ValueError if the file is not a tree file.
+        Parameters:
+            path: The path of the file.
+            tree_class: The tree class that materialize() creates.
+        """
+        self._tree_class = tree_class
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError("Not a tree file.")
+            magic, version, typecode, size, length = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("Not a tree file.")
+            if version != VERSION:
+                raise ValueError(f"Unsupported tree file version {version}.")
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._size = size  # number of distinct elements
+        self._length = length  # number of elements
+        typecode = typecode.decode()
+        values_start = HEADER.size
+        values_end = values_start + size * array(typecode).itemsize
+        counts_start = values_start + _padded(values_end - values_start)
+        if size < 0 or len(self._map) < counts_start + size * 8:
+            # a truncated file, the casts below would fail with less helpful errors
+            self._map.close()
+            raise ValueError(f"Truncated tree file, the header announces {size} values.")
+        buffer = memoryview(self._map)
+        self._values = buffer[values_start:values_end].cast(typecode)
+        self._counts = buffer[counts_start : counts_start + size * 8].cast(COUNT_TYPECODE)
+        buffer.release()
+
+    def close(self):
+        """
+        Unmaps the file. The view cannot be used afterwards.
+        """
+        self._values.release()
+        self._counts.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def materialize(self):
+        """
+        Builds a tree of the tree class from the file in O(n), without comparing any values.
+        """
+        tree = self._tree_class()
+        tree._build_from_runs(list(zip(self._values.tolist(), self._counts.tolist())))
+        return tree
+
+    def _index(self, value):
+        """
+        Returns the index of value in the sorted values, or -1 if not found.
+        """
+        index = bisect_left(self._values, value)
+        if index < self._size and self._values[index] == value:
+            return index
+        return -1
+
+    def __contains__(self, value):
+        """
+        Checks if the file contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self._index(value) != -1
+
+    def contains(self, value):
+        """
+        Checks if the file contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self._index(value) != -1
+
+    def count(self, value):
+        """
+        Returns the number of occurrences of a value.
+        Parameters:
+            value: The value to count.
+        """
+        index = self._index(value)
+        return 0 if index == -1 else self._counts[index]
+
+    def min(self):
+        """
+        Returns the minimum element, or None if the file is empty.
+        """
+        return self._values[0] if self._size else None
+
+    def max(self):
+        """
+        Returns the maximum element, or None if the file is empty.
+        """
+        return self._values[-1] if self._size else None
+
+    def lower_bound(self, value):
+        """
+        Returns the smallest value that is greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        index = bisect_left(self._values, value)
+        return self._values[index] if index < self._size else None
+
+    def upper_bound(self, value):
+        """
+        Returns the smallest value that is greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        index = bisect_right(self._values, value)
+        return self._values[index] if index < self._size else None
+
+    def __len__(self):
+        """
+        Returns the number of elements.
+        """
+        return self._length
+
+    def __iter__(self):
+        """
+        Yields the elements in ascending order.
+        """
+        for value, count in zip(self._values, self._counts):
+            for _ in range(count):
+                yield value
@@ -3,39 +3,247 @@ Multiset implementation of a red-black tree.
 Based on 'Introduction to Algorithms' by Cormen et al. 4th edition
 """
 
-from MultiUnbalancedTree import MultiUnbalancedTree
-from graphviz import Digraph
+from heapq import merge
+from importlib import import_module
+import sysconfig
+from .MultiUnbalancedTree import MultiUnbalancedTree
+from .MappedTree import MappedTree, write_tree
+
+# node colors, stored as a bool in each node
+RED = False
+BLACK = True
+
+
+class InvariantError(AssertionError):
+    """
+    Raised by MultiRedBlackTree.validate for the first broken invariant of a tree.
+    Attributes:
+        invariant: A description of the invariant that does not hold.
+        node: The node that breaks it, or None for an invariant of the whole tree.
+    """
+
+    def __init__(self, invariant, node=None):
+        where = "in the tree" if node is None else f"at the node with value {node.value!r}"
+        super().__init__(f"Invariant broken {where}: {invariant}")
+        self.invariant = invariant
+        self.node = node
 
 
 class MultiRedBlackTree(MultiUnbalancedTree):
+    RED = RED
+    BLACK = BLACK
+
     # internal node class
     class Node:
-        def __init__(self, value, color, count=1):
+        __slots__ = ("value", "count", "color", "left", "right", "parent", "size", "distinct", "key")
+
+        def __init__(self, value, color, count=1, key=None):
             self.value = value
+            self.key = value if key is None else key  # the value the node is ordered by
             self.count = count
+            self.size = count  # number of elements in the subtree
+            self.distinct = 1 if count else 0  # number of nodes in the subtree
             self.color = color
             self.left = self
             self.right = self
             self.parent = self
 
-    def __init__(self, elems=[]):
+    # the sentinel standing for all leaves, shared by all trees and never modified
+    NIL = Node(None, BLACK, 0)
+
+    class Iterator:
+        """
+        In-order iterator over the elements of a tree.
+        It follows the successor (or predecessor) links of the nodes,
+        which takes amortized O(1) per element and no recursion.
+        The tree must not be modified while iterating.
+        """
+
+        __slots__ = ("_nil", "_node", "_remaining", "_reverse")
+
+        def __init__(self, tree, reverse=False):
+            self._nil = tree.NIL
+            self._reverse = reverse
+            node = tree._root
+            if node is not self._nil:
+                node = tree._tree_maximum(node) if reverse else tree._tree_minimum(node)
+            self._node = node
+            self._remaining = node.count  # occurrences of the current value left to yield
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            if not self._remaining:
+                nil = self._nil
+                node = self._node
+                if node is nil:
+                    raise StopIteration
+
+                # step to the next node
+                if self._reverse:
+                    if node.left is not nil:
+                        node = node.left
+                        while node.right is not nil:
+                            node = node.right
+                    else:
+                        while node.parent is not nil and node is node.parent.left:
+                            node = node.parent
+                        node = node.parent
+                else:
+                    if node.right is not nil:
+                        node = node.right
+                        while node.left is not nil:
+                            node = node.left
+                    else:
+                        while node.parent is not nil and node is node.parent.right:
+                            node = node.parent
+                        node = node.parent
+
+                self._node = node
+                if node is nil:
+                    raise StopIteration
+                self._remaining = node.count
+
+            self._remaining -= 1
+            return self._node.value
+
+    class Cursor:
+        """
+        A position in a tree, pointing to the node of one distinct value.
+        Stepping to the neighboring values and removing through the cursor take amortized O(1),
+        without searching from the root.
+        A cursor moved past either end of the tree is invalid and evaluates to False.
+        Changing the tree other than through the cursor invalidates it.
+        """
+
+        __slots__ = ("_tree", "_node")
+
+        def __init__(self, tree, node):
+            self._tree = tree
+            self._node = node
+
+        @property
+        def value(self):
+            """
+            The value at the cursor, or None if the cursor is invalid.
+            """
+            return self._node.value
+
+        @property
+        def count(self):
+            """
+            The number of occurrences of the value at the cursor, or 0 if the cursor is invalid.
+            """
+            return self._node.count
+
+        def __bool__(self):
+            return self._node is not self._tree.NIL
+
+        def __repr__(self):
+            return f"Cursor({self._node.value!r})" if self else "Cursor()"
+
+        def next(self):
+            """
+            Moves the cursor to the next distinct value.
+            Returns:
+                The cursor itself.
+            """
+            if self:
+                self._node = self._tree._successor(self._node)
+            return self
+
+        def prev(self):
+            """
+            Moves the cursor to the previous distinct value.
+            Returns:
+                The cursor itself.
+            """
+            if self:
+                self._node = self._tree._predecessor(self._node)
+            return self
+
+        def remove(self):
+            """
+            Removes one occurrence of the value at the cursor.
+            If it was the last one, the cursor moves to the next value.
+            Raises ValueError if the cursor is invalid.
+            """
+            tree = self._tree
+            node = self._node
+            if node is tree.NIL:
+                raise ValueError("Cursor does not point to a value")
+
+            tree._length -= 1
+            if node.count > 1:
+                node.count -= 1
+                tree._update_sizes(node, -1)
+            else:
+                # the successor node is relinked, not copied, so it stays valid
+                self._node = tree._successor(node)
+                tree._remove_node(node)
+
+    def __init__(self, elems=[], key=None):
         """
         Creates a new red-black tree.
         If an iterable is passed, the tree is initialized with its values.
         Parameters:
             elems: An iterable. Defaults to an empty tree.
+            key: A function of one argument, like the key of sorted(). The tree is ordered by the keys
+                of the values, which are computed once per value and stored on the nodes.
+                Values with equal keys are kept in insertion order. Defaults to ordering by the values.
         """
-        self.RED = 0
-        self.BLACK = 1
-        self.NIL = self.Node(None, self.BLACK)
         self._root = self.NIL
+        self._key = key
         self._size = 0  # number of distinct elements
         self._length = 0  # number of elements
         self._min_element = None
         self._max_element = None
+        self._min_node = self.NIL  # the nodes of the extreme values, kept for pop_min and pop_max
+        self._max_node = self.NIL
+
+        self._initialize(elems)
+
+    def _build_from_sorted(self, values):
+        """
+        Builds a valid red-black tree from a sorted list in O(n), replacing the contents of the empty tree.
+        The tree is perfectly balanced, the nodes on the deepest level are red and all others are black.
+        Parameters:
+            values: The sorted list.
+        """
+        self._build_from_runs(list(self._sorted_runs(values)))
+
+    def _build_from_runs(self, runs):
+        """
+        Builds a valid red-black tree from (value, count) pairs in ascending order of values in O(n),
+        replacing the contents of the empty tree.
+        Parameters:
+            runs: The list of (value, count) pairs.
+        """
+        if not runs:
+            return
+
+        deepest = len(runs).bit_length() - 1
+
+        def build(lo, hi, depth, parent):
+            # builds the subtree holding runs[lo:hi]
+            if lo >= hi:
+                return self.NIL
+            mid = (lo + hi) // 2
+            value, count = runs[mid]
+            node = self.Node(value, RED if depth == deepest else BLACK, count, self._key_of(value))
+            node.parent = parent
+            node.left = build(lo, mid, depth + 1, node)
+            node.right = build(mid + 1, hi, depth + 1, node)
+            node.size += node.left.size + node.right.size
+            node.distinct += node.left.distinct + node.right.distinct
+            return node
 
-        for elem in elems:
-            self.add(elem)
+        self._root = build(0, len(runs), 0, self.NIL)
+        self._root.color = BLACK
+        self._size = len(runs)
+        self._length = sum(count for _, count in runs)
+        self._set_extremes(self._tree_minimum(self._root), self._tree_maximum(self._root))
 
     def _left_rotate(self, node):
         """
@@ -59,6 +267,10 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node.parent.right = right  # update the parent
         right.left = node  # put node on right's left
         node.parent = right  # update the parent
+        right.size = node.size  # right now roots the subtree node rooted
+        right.distinct = node.distinct
+        node.size = node.left.size + node.right.size + node.count
+        node.distinct = node.left.distinct + node.right.distinct + 1
 
     def _right_rotate(self, node):
         """
@@ -85,105 +297,194 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node.parent.left = left  # update the parent
         left.right = node  # put node on left's right
         node.parent = left  # update the parent
+        left.size = node.size  # left now roots the subtree node rooted
+        left.distinct = node.distinct
+        node.size = node.left.size + node.right.size + node.count
+        node.distinct = node.left.distinct + node.right.distinct + 1
+
+    # set by subclasses counting the work of the fixups, which then report it to _fixup_case
+    _counts_fixups = False
+
+    def _fixup_case(self, fixup, case):
+        """
+        Called by the fixups for every iteration and every case they apply, if _counts_fixups is set.
+        Parameters:
+            fixup: "insert" or "delete".
+            case: The number of the case, or 0 for a new iteration of the loop.
+        """
 
     def _rb_insert_fixup(self, node):
         """
         Fixes the red-black tree properties after an insertion.
         Parameters:
             node: The node that was inserted.
+        Returns:
+            True if the root had to be recolored black, i.e. the black height of the tree grew.
         """
 
-        while node.parent.color == self.RED:
+        counting = self._counts_fixups
+        while node.parent.color is RED:
+            if counting:
+                self._fixup_case("insert", 0)
             if node.parent is node.parent.parent.left:
                 # node's parent is a left child
                 uncle = node.parent.parent.right
-                if uncle is not self.NIL and uncle.color == self.RED:
+                if uncle is not self.NIL and uncle.color is RED:
                     # case 1: uncle is red
-                    node.parent.color = self.BLACK
-                    uncle.color = self.BLACK
-                    node.parent.parent.color = self.RED
+                    if counting:
+                        self._fixup_case("insert", 1)
+                    node.parent.color = BLACK
+                    uncle.color = BLACK
+                    node.parent.parent.color = RED
                     node = node.parent.parent
                 else:
                     if node is node.parent.right:
                         # case 2: uncle is black and node is a right child
+                        if counting:
+                            self._fixup_case("insert", 2)
                         node = node.parent
                         self._left_rotate(node)
                     # case 3: uncle is black and node is a left child
-                    node.parent.color = self.BLACK
-                    node.parent.parent.color = self.RED
+                    if counting:
+                        self._fixup_case("insert", 3)
+                    node.parent.color = BLACK
+                    node.parent.parent.color = RED
                     self._right_rotate(node.parent.parent)
             else:
                 # same as above, but with left and right exchanged
                 uncle = node.parent.parent.left
-                if uncle is not self.NIL and uncle.color == self.RED:
+                if uncle is not self.NIL and uncle.color is RED:
                     # case 1
-                    node.parent.color = self.BLACK
-                    uncle.color = self.BLACK
-                    node.parent.parent.color = self.RED
+                    if counting:
+                        self._fixup_case("insert", 1)
+                    node.parent.color = BLACK
+                    uncle.color = BLACK
+                    node.parent.parent.color = RED
                     node = node.parent.parent
                 else:
                     if node is node.parent.left:
                         # case 2
+                        if counting:
+                            self._fixup_case("insert", 2)
                         node = node.parent
                         self._right_rotate(node)
                     # case 3
-                    node.parent.color = self.BLACK
-                    node.parent.parent.color = self.RED
+                    if counting:
+                        self._fixup_case("insert", 3)
+                    node.parent.color = BLACK
+                    node.parent.parent.color = RED
                     self._left_rotate(node.parent.parent)
 
-        self._root.color = self.BLACK
+        grew = self._root.color is RED
+        self._root.color = BLACK
+        return grew
 
     def _add(self, value):
         """
-        Adds a value to the tree.
-        If the value already exists, the counter is increased.
+        Adds a value to the tree in a single descent.
+        If the value already exists, the counter is increased through _add_count.
         Parameters:
             value: The value to add.
+        Returns:
+            True if a new node was created, False if the value was already in the tree.
         """
 
-        self._length += 1
+        key = value
+        if self._key is not None:
+            # values with equal keys are separate nodes, look for the value among them first
+            key = self._key(value)
+            node, _ = self._find_in_run(value, key, self.NIL)
+            if node is not None:
+                self._add_count(node, 1)
+                return False
 
         node = self._root
         parent = self.NIL
+        unique = self._key is None
 
         # find the place to insert the new node
         while node is not self.NIL:
             parent = node
-            if node.value == value:
-                node.count += 1
-                return
+            if unique and node.key == key:
+                self._add_count(node, 1)
+                return False
 
-            if node.value > value:
+            if node.key > key:
                 node = node.left
             else:
                 node = node.right
 
         # if reached here, the value is not in the tree
+        self._insert_node(parent, value, 1, key)
+        return True
+
+    def _add_count(self, node, count):
+        """
+        Increases the counter of an existing node.
+        Parameters:
+            node: The node holding the value.
+            count: The number of occurrences to add.
+        """
+        node.count += count
+        self._length += count
+        self._update_sizes(node, count)
+
+    def _update_sizes(self, node, count, distinct=0):
+        """
+        Adds count to the subtree sizes of node and all its ancestors.
+        Parameters:
+            node: The lowest node whose subtree changed.
+            count: The change in the number of elements.
+            distinct: The change in the number of nodes.
+        """
+        while node is not self.NIL:
+            node.size += count
+            node.distinct += distinct
+            node = node.parent
+
+    def _insert_node(self, parent, value, count, key=None):
+        """
+        Inserts a new node below parent and restores the red-black properties.
+        Parameters:
+            parent: The node to attach the new node to, or NIL if the tree is empty.
+            value: The value of the new node.
+            count: The counter of the new node.
+            key: The key of the value. Defaults to the value.
+        Returns:
+            The new node.
+        """
         self._size += 1
-        new_node = self.Node(value, self.RED)
+        self._length += count
+        new_node = self.Node(value, RED, count, key)
         new_node.parent = parent
 
+        # a new leaf is the minimum (maximum) exactly if its parent was
         if parent is self.NIL:
             # the tree was empty
             self._root = new_node
-            self._min_element = value
-            self._max_element = value
-        elif new_node.value < parent.value:
+            self._set_extremes(new_node, new_node)
+        elif new_node.key < parent.key:
             parent.left = new_node
+            if parent is self._min_node:
+                self._min_node = new_node
+                self._min_element = value
         else:
             parent.right = new_node
+            if parent is self._max_node:
+                self._max_node = new_node
+                self._max_element = value
 
         new_node.left = self.NIL
         new_node.right = self.NIL
-
-        self._min_element = min(self._min_element, value)
-        self._max_element = max(self._max_element, value)
+        self._update_sizes(parent, count, 1)
 
         try:
             self._rb_insert_fixup(new_node)
         except AttributeError:
             pass
 
+        return new_node
+
     def _rb_transplant(self, node1, node2):
         """
         Replaces the subtree rooted at node1 with the subtree rooted at node2.
@@ -199,70 +500,95 @@ class MultiRedBlackTree(MultiUnbalancedTree):
         else:
             node1.parent.right = node2
 
-        node2.parent = node1.parent
+        if node2 is not self.NIL:
+            node2.parent = node1.parent
 
-    def _rb_delete_fixup(self, node):
+    def _rb_delete_fixup(self, node, parent):
         """
         Fixes the red-black tree properties after a deletion.
+        The parent is passed explicitly because node may be NIL, which is shared and never modified.
         Parameters:
-            node: The node that was deleted.
+            node: The node that replaced the deleted node.
+            parent: The parent of node.
         """
 
-        while node != self._root and node.color == self.BLACK:
-            if node is node.parent.left:
+        counting = self._counts_fixups
+        while node is not self._root and node.color is BLACK:
+            if counting:
+                self._fixup_case("delete", 0)
+            if node is parent.left:
                 # node is a left child
-                sibling = node.parent.right
-                if sibling.color == self.RED:
+                sibling = parent.right
+                if sibling.color is RED:
                     # case 1: sibling is red
-                    sibling.color = self.BLACK
-                    node.parent.color = self.RED
-                    self._left_rotate(node.parent)
-                    sibling = node.parent.right
-                if sibling.left.color == self.BLACK and sibling.right.color == self.BLACK:
+                    if counting:
+                        self._fixup_case("delete", 1)
+                    sibling.color = BLACK
+                    parent.color = RED
+                    self._left_rotate(parent)
+                    sibling = parent.right
+                if sibling.left.color is BLACK and sibling.right.color is BLACK:
                     # case 2: sibling is black and both its children are black
-                    sibling.color = self.RED
-                    node = node.parent
+                    if counting:
+                        self._fixup_case("delete", 2)
+                    sibling.color = RED
+                    node = parent
+                    parent = node.parent
                 else:
-                    if sibling.right.color == self.BLACK:
+                    if sibling.right.color is BLACK:
                         # case 3: sibling is black, its left child is red and its right child is black
-                        sibling.left.color = self.BLACK
-                        sibling.color = self.RED
+                        if counting:
+                            self._fixup_case("delete", 3)
+                        sibling.left.color = BLACK
+                        sibling.color = RED
                         self._right_rotate(sibling)
-                        sibling = node.parent.right
+                        sibling = parent.right
                     # case 4: sibling is black and its right child is red
-                    sibling.color = node.parent.color
-                    node.parent.color = self.BLACK
-                    sibling.right.color = self.BLACK
-                    self._left_rotate(node.parent)
+                    if counting:
+                        self._fixup_case("delete", 4)
+                    sibling.color = parent.color
+                    parent.color = BLACK
+                    sibling.right.color = BLACK
+                    self._left_rotate(parent)
                     node = self._root
             else:
                 # same as above, but with left and right exchanged
-                sibling = node.parent.left
-                if sibling.color == self.RED:
+                sibling = parent.left
+                if sibling.color is RED:
                     # case 1
-                    sibling.color = self.BLACK
-                    node.parent.color = self.RED
-                    self._right_rotate(node.parent)
-                    sibling = node.parent.left
-                if sibling.right.color == self.BLACK and sibling.left.color == self.BLACK:
+                    if counting:
+                        self._fixup_case("delete", 1)
+                    sibling.color = BLACK
+                    parent.color = RED
+                    self._right_rotate(parent)
+                    sibling = parent.left
+                if sibling.right.color is BLACK and sibling.left.color is BLACK:
                     # case 2
-                    sibling.color = self.RED
-                    node = node.parent
+                    if counting:
+                        self._fixup_case("delete", 2)
+                    sibling.color = RED
+                    node = parent
+                    parent = node.parent
                 else:
-                    if sibling.left.color == self.BLACK:
+                    if sibling.left.color is BLACK:
                         # case 3
-                        sibling.right.color = self.BLACK
-                        sibling.color = self.RED
+                        if counting:
+                            self._fixup_case("delete", 3)
+                        sibling.right.color = BLACK
+                        sibling.color = RED
                         self._left_rotate(sibling)
-                        sibling = node.parent.left
+                        sibling = parent.left
                     # case 4
-                    sibling.color = node.parent.color
-                    node.parent.color = self.BLACK
-                    sibling.left.color = self.BLACK
-                    self._right_rotate(node.parent)
+                    if counting:
+                        self._fixup_case("delete", 4)
+                    sibling.color = parent.color
+                    parent.color = BLACK
+                    sibling.left.color = BLACK
+                    self._right_rotate(parent)
                     node = self._root
 
-        node.color = self.BLACK
+        if node is not self.NIL:
+            node.color = BLACK
 
     def _tree_minimum(self, node):
         """
@@ -286,6 +612,36 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node = node.right
         return node
 
+    def _successor(self, node):
+        """
+        Returns the node following node in order, or NIL if node is the maximum.
+        Parameters:
+            node: A node of the tree.
+        """
+
+        if node.right is not self.NIL:
+            return self._tree_minimum(node.right)
+        parent = node.parent
+        while parent is not self.NIL and node is parent.right:
+            node = parent
+            parent = parent.parent
+        return parent
+
+    def _predecessor(self, node):
+        """
+        Returns the node preceding node in order, or NIL if node is the minimum.
+        Parameters:
+            node: A node of the tree.
+        """
+
+        if node.left is not self.NIL:
+            return self._tree_maximum(node.left)
+        parent = node.parent
+        while parent is not self.NIL and node is parent.left:
+            node = parent
+            parent = parent.parent
+        return parent
+
     def _remove_node(self, node_to_delete):
         """
         Removes a node from the tree.
@@ -293,32 +649,41 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node_to_delete: The node to remove.
         """
 
+        # the extreme nodes have at most one child and are unlinked, not moved,
+        # so their neighbours found now in O(1) are still the extremes afterwards
+        if node_to_delete is self._min_node:
+            self._min_node = successor = self._successor(node_to_delete)
+            self._min_element = successor.value
+        if node_to_delete is self._max_node:
+            self._max_node = predecessor = self._predecessor(node_to_delete)
+            self._max_element = predecessor.value
+
         self._size -= 1
 
         if self._size == 0:
             self._root = self.NIL
-            self._min_element = None
-            self._max_element = None
             return
 
-        node = node_to_delete
-        original_color = node.color
+        original_color = node_to_delete.color
         if node_to_delete.left is self.NIL:
             # node has no left child
             child = node_to_delete.right
+            child_parent = node_to_delete.parent
             self._rb_transplant(node_to_delete, node_to_delete.right)
         elif node_to_delete.right is self.NIL:
             # node has no right child
             child = node_to_delete.left
+            child_parent = node_to_delete.parent
             self._rb_transplant(node_to_delete, node_to_delete.left)
         else:
             # node has two children
             node = self._tree_minimum(node_to_delete.right)
             original_color = node.color
             child = node.right
-            if node.parent is node_to_delete and child is not self.NIL:
-                child.parent = node
+            if node.parent is node_to_delete:
+                child_parent = node
             else:
+                child_parent = node.parent
                 self._rb_transplant(node, node.right)
                 node.right = node_to_delete.right
                 node.right.parent = node
@@ -327,13 +692,15 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node.left.parent = node
             node.color = node_to_delete.color
 
-        if original_color == self.BLACK:
-            self._rb_delete_fixup(child)
+        # recompute the subtree sizes on the path from the lowest changed node
+        node = child_parent
+        while node is not self.NIL:
+            node.size = node.left.size + node.right.size + node.count
+            node.distinct = node.left.distinct + node.right.distinct + 1
+            node = node.parent
 
-        if self._min_element == node_to_delete.value:
-            self._min_element = self._tree_minimum(self._root).value
-        if self._max_element == node_to_delete.value:
-            self._max_element = self._tree_maximum(self._root).value
+        if original_color is BLACK:
+            self._rb_delete_fixup(child, child_parent)
 
     def remove(self, value):
         """
@@ -344,24 +711,724 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             value: The value to remove.
         """
 
+        node = self._find(value)
+        if node is None:
+            raise ValueError("Value not found in tree")
+
         self._length -= 1
-        node = self._root
+        if node.count > 1:
+            node.count -= 1
+            self._update_sizes(node, -1)
+            return
+        self._remove_node(node)
+
+    def _pop_node(self, node):
+        """
+        Removes one occurrence of the value of a node.
+        Raises IndexError if the node is NIL, that is if the tree is empty.
+        Parameters:
+            node: The node holding the value.
+        Returns:
+            The removed value.
+        """
+        if node is self.NIL:
+            raise IndexError("pop from an empty tree")
+        self._length -= 1
+        if node.count > 1:
+            node.count -= 1
+            self._update_sizes(node, -1)
+        else:
+            self._remove_node(node)
+        return node.value
+
+    def pop_min(self):
+        """
+        Removes and returns one occurrence of the minimum, without searching for it from the root.
+        The next minimum is found from the cached node of the removed one in O(1),
+        so the tree can be used as a double-ended priority queue.
+        Values with equal keys are popped in the order they were added.
+        Raises IndexError if the tree is empty.
+        Returns:
+            The minimum.
+        """
+        return self._pop_node(self._min_node)
+
+    def pop_max(self):
+        """
+        Removes and returns one occurrence of the maximum, see pop_min.
+        Values with equal keys are popped in the reverse order they were added.
+        Raises IndexError if the tree is empty.
+        Returns:
+            The maximum.
+        """
+        return self._pop_node(self._max_node)
+
+    def peek_min(self):
+        """
+        Returns the minimum in O(1) without removing it.
+        Unlike min, raises IndexError if the tree is empty, so that None can be a value.
+        """
+        if self._min_node is self.NIL:
+            raise IndexError("peek at an empty tree")
+        return self._min_node.value
+
+    def peek_max(self):
+        """
+        Returns the maximum in O(1) without removing it.
+        Unlike max, raises IndexError if the tree is empty, so that None can be a value.
+        """
+        if self._max_node is self.NIL:
+            raise IndexError("peek at an empty tree")
+        return self._max_node.value
+
+    def _clear(self):
+        """
+        Removes all values from the tree.
+        """
+
+        self._root = self.NIL
+        self._size = 0
+        self._length = 0
+        self._set_extremes(self.NIL, self.NIL)
+
+    def _finger_search(self, finger, value):
+        """
+        Searches for value starting from finger instead of the root.
+        The climb back up from finger is short when value is close to it.
+        Parameters:
+            finger: A node with a value smaller than value, or NIL to search from the root.
+            value: The value to search for.
+        Returns:
+            A (node, parent) pair. node is the node holding value, or NIL if value
+            is not in the tree, and parent is the node to attach a new node to.
+        """
+
+        node = finger
+        if node is self.NIL:
+            node = self._root
+        else:
+            # climb until the subtree of node contains the place of value
+            while node.parent is not self.NIL:
+                parent = node.parent
+                if node is parent.left and not parent.key < value:
+                    if parent.key == value:
+                        node = parent
+                    break
+                node = parent
 
-        # find the node to remove
+        parent = self.NIL
         while node is not self.NIL:
-            if node.value == value:
-                if node.count > 1:
-                    node.count -= 1
-                    return
-                self._remove_node(node)
-                return
+            if node.key == value:
+                return node, parent
 
-            if node.value > value:
+            parent = node
+            if node.key > value:
                 node = node.left
             else:
                 node = node.right
+
+        return node, parent
+
+    def add_many(self, iterable):
+        """
+        Adds all values of an iterable to the tree.
+        The batch is sorted and merged into the tree in one ordered pass,
+        where each search starts from the previously inserted node.
+        If the batch has more distinct values than the tree, the tree is rebuilt in O(n + m) instead.
+        Parameters:
+            iterable: The values to add.
+        """
+
+        batch = sorted(iterable, key=self._key)
+        if not batch:
+            return
+
+        if len(batch) >= self._size:
+            merged = list(merge(self, batch, key=self._key))
+            self._clear()
+            self._build_from_sorted(merged)
+            return
+
+        if self._key is not None:
+            # finger searches need unique keys
+            for value in batch:
+                self._add(value)
+            return
+
+        finger = self.NIL
+        for value, count in self._sorted_runs(batch):
+            node, parent = self._finger_search(finger, value)
+            if node is self.NIL:
+                finger = self._insert_node(parent, value, count)
+            else:
+                self._add_count(node, count)
+                finger = node
+
+    def remove_many(self, iterable):
+        """
+        Removes all values of an iterable from the tree.
+        The batch is sorted and removed in one ordered pass,
+        where each search starts from the previously visited node.
+        Raises ValueError if a value is not in the tree as many times as in the batch.
+        The smaller values of the batch have been removed at that point.
+        Parameters:
+            iterable: The values to remove.
+        """
+
+        if self._key is not None:
+            # finger searches need unique keys
+            for value in sorted(iterable, key=self._key):
+                self.remove(value)
+            return
+
+        finger = self.NIL
+        for value, count in self._sorted_runs(sorted(iterable)):
+            node, _ = self._finger_search(finger, value)
+            if node is self.NIL or node.count < count:
+                raise ValueError("Value not found in tree")
+
+            self._length -= count
+            if node.count > count:
+                node.count -= count
+                self._update_sizes(node, -count)
+                finger = node
+            else:
+                finger = self._predecessor(node)
+                self._remove_node(node)
+
+    # join-based algorithms, see Blelloch, Ferizovic and Sun, 'Just Join for Parallel Ordered Sets' (2016).
+    # They work on detached trees: roots that are black and have NIL as parent, passed around
+    # together with their black height. self._root is used as scratch space while they run.
+
+    def _black_height(self, node):
+        """
+        Returns the number of black nodes on a path from node down to a leaf, NIL excluded.
+        Parameters:
+            node: The root of the subtree.
+        """
+        height = 0
+        while node is not self.NIL:
+            if node.color is BLACK:
+                height += 1
+            node = node.left
+        return height
+
+    def _detach(self, node, height):
+        """
+        Turns the subtree rooted at node into a detached tree.
+        Parameters:
+            node: The root of the subtree.
+            height: The black height of the subtree.
+        Returns:
+            The root and the black height of the detached tree.
+        """
+        if node is self.NIL:
+            return node, 0
+        node.parent = self.NIL
+        if node.color is RED:
+            node.color = BLACK
+            height += 1
+        return node, height
+
+    def _join(self, left, left_height, node, right, right_height):
+        """
+        Joins two detached trees and a node, all values of left being smaller than
+        the value of node and all values of right being greater.
+        Runs in O(|left_height - right_height| + 1).
+        Parameters:
+            left: The root of the left tree.
+            left_height: The black height of the left tree.
+            node: The node to put between them, its links are overwritten.
+            right: The root of the right tree.
+            right_height: The black height of the right tree.
+        Returns:
+            The root and the black height of the joined tree.
+        """
+        NIL = self.NIL
+        node.parent = NIL
+        node.left = left
+        node.right = right
+        node.color = BLACK
+
+        if left_height == right_height:
+            # node becomes the root
+            height = left_height + 1
+        elif left_height > right_height:
+            # walk down the right spine of left to a black node as high as right
+            spine = left
+            height = left_height
+            while spine.color is RED or height != right_height:
+                if spine.color is BLACK:
+                    height -= 1
+                node.parent = spine
+                spine = spine.right
+            node.parent.right = node
+            node.left = spine
+            node.color = RED
+            self._root = left
+            height = left_height
         else:
-            raise ValueError("Value not found in tree")
+            # walk down the left spine of right to a black node as high as left
+            spine = right
+            height = right_height
+            while spine.color is RED or height != left_height:
+                if spine.color is BLACK:
+                    height -= 1
+                node.parent = spine
+                spine = spine.left
+            node.parent.left = node
+            node.right = spine
+            node.color = RED
+            self._root = right
+            height = right_height
+
+        if node.left is not NIL:
+            node.left.parent = node
+        if node.right is not NIL:
+            node.right.parent = node
+        node.size = node.left.size + node.right.size + node.count
+        node.distinct = node.left.distinct + node.right.distinct + 1
+
+        if node.parent is NIL:
+            return node, height
+
+        # the ancestors of node gained the other tree and node itself
+        other = right if left_height > right_height else left
+        self._update_sizes(node.parent, other.size + node.count, other.distinct + 1)
+        if self._rb_insert_fixup(node):
+            height += 1
+        return self._root, height
+
+    def _split(self, root, height, value):
+        """
+        Splits a detached tree into the values smaller and greater than value.
+        Runs in O(log n).
+        Parameters:
+            root: The root of the tree.
+            height: The black height of the tree.
+            value: The value to split at.
+        Returns:
+            A tuple (left, left_height, node, right, right_height), where node
+            is the node holding value, or NIL if value is not in the tree.
+        """
+        if root is self.NIL:
+            return root, 0, root, root, 0
+
+        left, left_height = self._detach(root.left, height - 1)
+        right, right_height = self._detach(root.right, height - 1)
+        if root.value == value:
+            return left, left_height, root, right, right_height
+
+        if root.value > value:
+            smaller, smaller_height, node, greater, greater_height = self._split(left, left_height, value)
+            greater, greater_height = self._join(greater, greater_height, root, right, right_height)
+        else:
+            smaller, smaller_height, node, greater, greater_height = self._split(right, right_height, value)
+            smaller, smaller_height = self._join(left, left_height, root, smaller, smaller_height)
+        return smaller, smaller_height, node, greater, greater_height
+
+    def _split_last(self, root, height):
+        """
+        Detaches the maximum node of a non-empty detached tree.
+        Parameters:
+            root: The root of the tree.
+            height: The black height of the tree.
+        Returns:
+            The root and black height of the remaining tree, and the maximum node.
+        """
+        left, left_height = self._detach(root.left, height - 1)
+        right, right_height = self._detach(root.right, height - 1)
+        if right is self.NIL:
+            return left, left_height, root
+
+        rest, rest_height, last = self._split_last(right, right_height)
+        rest, rest_height = self._join(left, left_height, root, rest, rest_height)
+        return rest, rest_height, last
+
+    def _join2(self, left, left_height, right, right_height):
+        """
+        Joins two detached trees, all values of left being smaller than all values of right.
+        Parameters:
+            left: The root of the left tree.
+            left_height: The black height of the left tree.
+            right: The root of the right tree.
+            right_height: The black height of the right tree.
+        Returns:
+            The root and the black height of the joined tree.
+        """
+        if left is self.NIL:
+            return right, right_height
+        left, left_height, last = self._split_last(left, left_height)
+        return self._join(left, left_height, last, right, right_height)
+
+    def _merge(self, tree1, height1, tree2, height2, combine, keep1, keep2):
+        """
+        Merges two detached trees, splitting tree2 at the values of tree1, which should be the smaller one.
+        Runs in O(m log(n/m + 1)) for trees of sizes m <= n.
+        Parameters:
+            tree1: The root of the first tree.
+            height1: The black height of the first tree.
+            tree2: The root of the second tree.
+            height2: The black height of the second tree.
+            combine: Function from the counters of a value in both trees (0 if absent) to its new counter.
+            keep1: Whether values only in tree1 are kept, i.e. combine(count, 0) == count.
+            keep2: Whether values only in tree2 are kept, i.e. combine(0, count) == count.
+        Returns:
+            The root and the black height of the merged tree.
+        """
+        NIL = self.NIL
+        if tree1 is NIL:
+            return (tree2, height2) if keep2 else (NIL, 0)
+        if tree2 is NIL:
+            return (tree1, height1) if keep1 else (NIL, 0)
+
+        left1, left1_height = self._detach(tree1.left, height1 - 1)
+        right1, right1_height = self._detach(tree1.right, height1 - 1)
+        left2, left2_height, node2, right2, right2_height = self._split(tree2, height2, tree1.value)
+
+        left, left_height = self._merge(left1, left1_height, left2, left2_height, combine, keep1, keep2)
+        right, right_height = self._merge(right1, right1_height, right2, right2_height, combine, keep1, keep2)
+
+        count = combine(tree1.count, node2.count)  # NIL has a counter of 0
+        if count > 0:
+            tree1.count = count
+            return self._join(left, left_height, tree1, right, right_height)
+        return self._join2(left, left_height, right, right_height)
+
+    def _set_root(self, root):
+        """
+        Makes a detached tree the contents of this tree and updates the counters.
+        Parameters:
+            root: The root of the tree.
+        """
+        self._root = root
+        self._size = root.distinct
+        self._length = root.size
+        if root is self.NIL:
+            self._set_extremes(self.NIL, self.NIL)
+        else:
+            self._set_extremes(self._tree_minimum(root), self._tree_maximum(root))
+
+    def _set_extremes(self, min_node, max_node):
+        """
+        Caches the nodes of the minimum and maximum and their values.
+        Parameters:
+            min_node: The node of the minimum, or NIL if the tree is empty.
+            max_node: The node of the maximum, or NIL if the tree is empty.
+        """
+        self._min_node = min_node
+        self._max_node = max_node
+        self._min_element = min_node.value  # the value of NIL is None
+        self._max_element = max_node.value
+
+    def _copy_node(self, node):
+        """
+        Returns an unlinked copy of a node.
+        Parameters:
+            node: The node to copy.
+        """
+        return self.Node(node.value, node.color, node.count, node.key)
+
+    def _clone_subtree(self, root):
+        """
+        Returns a copy of the subtree rooted at root, without recursion.
+        Parameters:
+            root: The root of the subtree.
+        """
+        NIL = self.NIL
+        if root is NIL:
+            return NIL
+
+        clone = self._copy_node(root)
+        clone.parent = NIL
+        stack = [(root, clone)]
+        while stack:
+            node, copy = stack.pop()
+            copy.size = node.size
+            copy.distinct = node.distinct
+            copy.left = NIL
+            copy.right = NIL
+            if node.left is not NIL:
+                copy.left = self._copy_node(node.left)
+                copy.left.parent = copy
+                stack.append((node.left, copy.left))
+            if node.right is not NIL:
+                copy.right = self._copy_node(node.right)
+                copy.right.parent = copy
+                stack.append((node.right, copy.right))
+        return clone
+
+    def copy(self):
+        """
+        Returns a copy of the tree in O(n), sharing the values but not the nodes.
+        """
+        tree = self.__class__()
+        tree._key = self._key
+        tree._set_root(self._clone_subtree(self._root))
+        return tree
+
+    def __copy__(self):
+        """
+        Returns a copy of the tree in O(n), sharing the values but not the nodes.
+        """
+        return self.copy()
+
+    def _runs(self):
+        """
+        Yields the (value, count) pairs of the nodes in ascending order of values.
+        """
+        node = self._tree_minimum(self._root)
+        while node is not self.NIL:
+            yield node.value, node.count
+            node = self._successor(node)
+
+    def __getstate__(self):
+        """
+        Returns the values and counters of the nodes in ascending order and the key function,
+        so pickle and deepcopy do not follow the links between the nodes.
+        """
+        values = []
+        counts = []
+        for value, count in self._runs():
+            values.append(value)
+            counts.append(count)
+        return values, counts, self._key
+
+    def __setstate__(self, state):
+        """
+        Rebuilds the tree from the state returned by __getstate__ in O(n).
+        Parameters:
+            state: The sorted values, their counters and the key function.
+        """
+        values, counts, self._key = state
+        self._clear()
+        self._build_from_runs(list(zip(values, counts)))
+
+    def __reduce__(self):
+        """
+        Pickles the tree as an empty tree of its class and the state returned by __getstate__.
+        """
+        return self.__class__, (), self.__getstate__()
+
+    def _union_count(self, count1, count2):
+        """
+        Returns the counter of a value in the union of two trees, the sum of both counters.
+        Parameters:
+            count1: The counter of the value in the first tree, 0 if absent.
+            count2: The counter of the value in the second tree, 0 if absent.
+        """
+        return count1 + count2
+
+    def _merge_update(self, other, combine, keep_self, keep_other):
+        """
+        Merges a copy of other into this tree. The smaller tree drives the merge.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+            combine: Function from the counters of a value in both trees (0 if absent) to its new counter.
+            keep_self: Whether values only in this tree are kept.
+            keep_other: Whether values only in other are kept.
+        """
+        if not isinstance(other, MultiRedBlackTree):
+            other = self.__class__(other)
+        if self._key is not None or other._key is not None:
+            raise TypeError("Set operations are not supported on trees with a key function.")
+
+        root = self._root
+        height = self._black_height(root)
+        other_root = self._clone_subtree(other._root)
+        other_height = self._black_height(other_root)
+
+        if other._size < self._size:
+            root, height = self._merge(
+                other_root,
+                other_height,
+                root,
+                height,
+                lambda other_count, count: combine(count, other_count),
+                keep_other,
+                keep_self,
+            )
+        else:
+            root, height = self._merge(root, height, other_root, other_height, combine, keep_self, keep_other)
+        self._set_root(root)
+
+    def update(self, other):
+        """
+        Adds all elements of other to the tree, the counters of common values are summed.
+        Runs in O(m log(n/m + 1)) plus O(m) to copy other, where m is the size of the smaller tree.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        self._merge_update(other, self._union_count, True, True)
+
+    def intersection_update(self, other):
+        """
+        Keeps only the values also in other, each with the smaller of both counters.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        self._merge_update(other, min, False, False)
+
+    def difference_update(self, other):
+        """
+        Removes the elements of other from the tree, as many times as they occur in other.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        self._merge_update(other, lambda count, other_count: max(count - other_count, 0), True, False)
+
+    def symmetric_difference_update(self, other):
+        """
+        Keeps each value as many times as its counters in both trees differ.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        self._merge_update(other, lambda count, other_count: abs(count - other_count), True, True)
+
+    def union(self, other):
+        """
+        Returns a new tree with the elements of both trees, the counters of common values are summed.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        tree = self.copy()
+        tree.update(other)
+        return tree
+
+    def intersection(self, other):
+        """
+        Returns a new tree with the values in both trees, each with the smaller of both counters.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        tree = self.copy()
+        tree.intersection_update(other)
+        return tree
+
+    def difference(self, other):
+        """
+        Returns a new tree with the elements of this tree that are not in other.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        tree = self.copy()
+        tree.difference_update(other)
+        return tree
+
+    def symmetric_difference(self, other):
+        """
+        Returns a new tree with each value as many times as its counters in both trees differ.
+        Parameters:
+            other: A MultiRedBlackTree or an iterable of values.
+        """
+        tree = self.copy()
+        tree.symmetric_difference_update(other)
+        return tree
+
+    def __or__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        return self.difference(other)
+
+    def __xor__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        return self.symmetric_difference(other)
+
+    def __ior__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        if not isinstance(other, MultiRedBlackTree):
+            return NotImplemented
+        self.symmetric_difference_update(other)
+        return self
+
+    def join(self, other):
+        """
+        Moves all elements of other into this tree in O(log n), leaving other empty.
+        All values of other must be greater than the maximum of this tree.
+        Parameters:
+            other: A MultiRedBlackTree.
+        """
+        if self._size and other._size and not self._tree_maximum(self._root).key < other._tree_minimum(other._root).key:
+            raise ValueError("All values of the joined tree must be greater than the maximum of the tree.")
+
+        root, _ = self._join2(self._root, self._black_height(self._root), other._root, other._black_height(other._root))
+        self._set_root(root)
+        other._clear()
+
+    def split(self, value):
+        """
+        Removes the elements greater than or equal to value from this tree in O(log n) and returns them as a new tree.
+        Parameters:
+            value: The value to split at.
+        """
+        if self._key is not None:
+            raise TypeError("split is not supported on trees with a key function.")
+
+        left, _, node, right, right_height = self._split(self._root, self._black_height(self._root), value)
+        if node is not self.NIL:
+            right, right_height = self._join(self.NIL, 0, node, right, right_height)
+
+        self._set_root(left)
+        tree = self.__class__()
+        tree._set_root(right)
+        return tree
+
+    def save(self, path, typecode=None):
+        """
+        Writes the tree to a binary file in O(n), see MappedTree for the format.
+        Only int and float values of trees without a key function can be saved.
+        Parameters:
+            path: The path of the file.
+            typecode: The array typecode of the values. Defaults to "q" for int values and "d" otherwise.
+        """
+        if self._key is not None:
+            raise TypeError("Trees with a key function cannot be saved.")
+        write_tree(path, list(self._runs()), typecode)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Reads a tree written by save().
+        The tree is built in O(n) from the sorted values, without comparing them.
+        Raises ValueError if the file is not a tree file.
+        Parameters:
+            path: The path of the file.
+            mmap: If True, returns a read-only MappedTree on the file instead, which answers lookups
+                in O(log n) right away and builds the tree with materialize(). Defaults to False.
+        """
+        mapped = MappedTree(path, cls)
+        if mmap:
+            return mapped
+        with mapped:
+            return mapped.materialize()
 
     def _draw_node(self, node, graph):
         """
@@ -370,7 +1437,7 @@ class MultiRedBlackTree(MultiUnbalancedTree):
             node: The node to add.
             graph: The graph to add the node to.
         """
-        if node.color == self.RED:
+        if node.color is RED:
             graph.node(str(node.value), f"{node.value}\n{node.count}", color="red")
         else:
             graph.node(str(node.value), f"{node.value}\n{node.count}", color="black")
@@ -378,62 +1445,144 @@ class MultiRedBlackTree(MultiUnbalancedTree):
     def draw(self, name="tree", view_nil=False):
         """
         Generates a pdf file with a visualization of the tree.
+        Needs graphviz, which is only imported here.
         Parameters:
             name: The name of the pdf file.
+            view_nil: Whether to draw the NIL leaves.
         """
-        graph = Digraph()
-
-        def draw_node(node):
-            self._draw_node(node, graph)
-            if node.left is not self.NIL:
-                draw_node(node.left)
-                graph.edge(str(node.value), str(node.left.value))
-            elif view_nil:
-                graph.node(str(node.value) + "l", "NIL", color="black")
-                graph.edge(str(node.value), str(node.value) + "l")
-            if node.right is not self.NIL:
-                draw_node(node.right)
-                graph.edge(str(node.value), str(node.right.value))
-            elif view_nil:
-                graph.node(str(node.value) + "r", "NIL", color="black")
-                graph.edge(str(node.value), str(node.value) + "r")
-
-        draw_node(self._root)
-        graph.render(name, view=True, cleanup=True)
+        from .visualization import draw
+
+        draw(self, name, view_nil)
+
+    def validate(self):
+        """
+        Checks all invariants of the tree in a single iterative pass, in O(n) time and O(height) memory:
+        the colors of the nodes and the red-black properties, the order of the keys, the parent links,
+        the counters and subtree sizes of the nodes, and the sizes and extreme nodes and values cached by the tree.
+        Raises InvariantError for the first violation found, naming the invariant and the node.
+        """
+        nil = self.NIL
+        if nil.color is not BLACK or nil.size != 0 or nil.distinct != 0:
+            raise InvariantError("the NIL sentinel is black and empty")
+
+        root = self._root
+        if root is not nil:
+            if root.color is not BLACK:
+                raise InvariantError("the root is black", root)
+            if root.parent is not nil:
+                raise InvariantError("the root has no parent", root)
+
+        unique = self._key is None
+        length = distinct = 0
+        first = previous = None
+        heights = []  # black heights of the finished subtrees, in post-order
+        stack = []
+        node = root
+        last = None
+        while stack or node is not nil:
+            if node is not nil:
+                # first visit, checks of the node and its links
+                color = node.color
+                if color is not BLACK and color is not RED:
+                    raise InvariantError("the color is RED or BLACK", node)
+                left, right = node.left, node.right
+                if left is not nil and left.parent is not node:
+                    raise InvariantError("the parent of a child is the node", left)
+                if right is not nil and right.parent is not node:
+                    raise InvariantError("the parent of a child is the node", right)
+                if color is RED and (left.color is RED or right.color is RED):
+                    raise InvariantError("a red node has no red child", node)
+                if node.count < 1:
+                    raise InvariantError("the counter is positive", node)
+                stack.append(node)
+                node = left
+                continue
+
+            top = stack[-1]
+            right = top.right
+            if right is nil or last is not right:
+                # in-order visit, the left subtree is done
+                if previous is not None and (previous.key > top.key or unique and previous.key == top.key):
+                    raise InvariantError("the keys are in order", top)
+                if first is None:
+                    first = top
+                previous = top
+                length += top.count
+                distinct += 1
+            if right is not nil and last is not right:
+                node = right
+                continue
+
+            # last visit, both subtrees are done
+            stack.pop()
+            last = top
+            right_height = heights.pop() if right is not nil else 0
+            left_height = heights.pop() if top.left is not nil else 0
+            if left_height != right_height:
+                raise InvariantError("both subtrees have the same black height", top)
+            heights.append(left_height + (top.color is BLACK))
+            if top.size != top.left.size + right.size + top.count:
+                raise InvariantError("the size is the number of elements in the subtree", top)
+            if top.distinct != top.left.distinct + right.distinct + 1:
+                raise InvariantError("distinct is the number of nodes in the subtree", top)
+
+        if self._size != distinct:
+            raise InvariantError(f"_size is the number of nodes, {distinct} instead of {self._size}")
+        if self._length != length:
+            raise InvariantError(f"_length is the number of elements, {length} instead of {self._length}")
+        if self._min_node is not (nil if first is None else first):
+            raise InvariantError("_min_node is the first node", self._min_node)
+        if self._max_node is not (nil if previous is None else previous):
+            raise InvariantError("_max_node is the last node", self._max_node)
+        min_element = None if first is None else first.value
+        max_element = None if previous is None else previous.value
+        if self._min_element != min_element:
+            raise InvariantError(f"_min_element is the first value, {min_element!r} instead of {self._min_element!r}")
+        if self._max_element != max_element:
+            raise InvariantError(f"_max_element is the last value, {max_element!r} instead of {self._max_element!r}")
 
     def is_red_black(self):
         """
-        Checks if the tree is a valid red-black tree.
+        Checks if the tree is a valid red-black tree, with all the invariants checked by validate.
         Returns:
             True if the tree is a valid red-black tree, False otherwise.
         """
+        try:
+            self.validate()
+        except InvariantError:
+            return False
+        return True
 
-        def check_colors(node):
-            if node is self.NIL:
-                return True
-            if node.color == self.RED:
-                if node.left is not self.NIL and node.left.color == self.RED:
-                    return False
-                if node.right is not self.NIL and node.right.color == self.RED:
-                    return False
-            return check_colors(node.left) and check_colors(node.right)
-
-        def check_black_height(node):
-            if node is self.NIL:
-                return 0
-            left_height = check_black_height(node.left)
-            right_height = check_black_height(node.right)
-            if left_height != right_height:
-                return -1
-            return left_height + (1 if node.color == self.BLACK else 0)
-
-        return check_colors(self._root) and check_black_height(self._root) != -1
+    def validate_every(self, period):
+        """
+        Debug mode: validates the tree after every period-th mutation through its public methods,
+        raising InvariantError from the mutation that broke it (or from one of the next period - 1).
+        The class of the tree is swapped for a validating subclass, so trees not in debug mode pay nothing.
+        Parameters:
+            period: The number of mutations between validations, 0 to leave debug mode.
+        """
+        base = getattr(self.__class__, "_validated_class", self.__class__)
+        if period <= 0:
+            self.__class__ = base
+            self.__dict__.pop("_validation_period", None)
+            self.__dict__.pop("_mutations", None)
+            return
+        self.__class__ = _validating_class(base)
+        self._validation_period = period
+        self._mutations = 0
+        self.validate()
 
     def __iter__(self):
         """
-        Returns a generator that iterates over the tree in order.
+        Returns an iterator over the tree in order.
         """
-        return super().__iter__(self.NIL)
+        return self.Iterator(self)
+
+    def __reversed__(self):
+        """
+        Returns an iterator over the tree in descending order.
+        """
+        return self.Iterator(self, reverse=True)
 
     def _find(self, value):
         """
@@ -442,6 +1591,41 @@ class MultiRedBlackTree(MultiUnbalancedTree):
         """
         return super()._find(value, self.NIL)
 
+    def find(self, value):
+        """
+        Returns a Cursor pointing to the given value, or None if the value is not in the tree.
+        Parameters:
+            value: The value to search for.
+        """
+        node = self._find(value)
+        if node is None:
+            return None
+        return self.Cursor(self, node)
+
+    def find_lower_bound(self, value):
+        """
+        Returns a Cursor pointing to the smallest value greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        node = self._first_node(self._key_of(value))
+        if node is self.NIL:
+            return None
+        return self.Cursor(self, node)
+
+    def find_upper_bound(self, value):
+        """
+        Returns a Cursor pointing to the smallest value greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        node = self._first_node(self._key_of(value), inclusive=False)
+        if node is self.NIL:
+            return None
+        return self.Cursor(self, node)
+
     def lower_bound(self, value):
         """
         Returns the smallest value in the tree that is greater than or equal to the given value.
@@ -449,7 +1633,7 @@ class MultiRedBlackTree(MultiUnbalancedTree):
         Parameters:
             value: The value to compare to.
         """
-        return super()._lower_bound(value, self.NIL)
+        return self._lower_bound(self._key_of(value), self.NIL)
 
     def upper_bound(self, value):
         """
@@ -458,7 +1642,120 @@ class MultiRedBlackTree(MultiUnbalancedTree):
         Parameters:
             value: The value to compare to.
         """
-        return super()._upper_bound(value, self.NIL)
+        return self._upper_bound(self._key_of(value), self.NIL)
+
+    def lower_bound_key(self, key):
+        """
+        Returns the first value in the tree whose key is greater than or equal to the given key.
+        If no such value exists, returns None.
+        Parameters:
+            key: The key to compare to.
+        """
+        return self._lower_bound(key, self.NIL)
+
+    def upper_bound_key(self, key):
+        """
+        Returns the first value in the tree whose key is greater than the given key.
+        If no such value exists, returns None.
+        Parameters:
+            key: The key to compare to.
+        """
+        return self._upper_bound(key, self.NIL)
+
+    def _first_node(self, key, inclusive=True):
+        """
+        Returns the first node with a key greater than or equal to the given key, or NIL.
+        Parameters:
+            key: The key to compare to.
+            inclusive: If False, the key of the node must be strictly greater.
+        """
+        node = self._root
+        result = self.NIL
+        while node is not self.NIL:
+            if node.key > key or (inclusive and node.key == key):
+                result = node
+                node = node.left
+            else:
+                node = node.right
+        return result
+
+    def _last_node(self, key, inclusive=True):
+        """
+        Returns the last node with a key smaller than or equal to the given key, or NIL.
+        Parameters:
+            key: The key to compare to.
+            inclusive: If False, the key of the node must be strictly smaller.
+        """
+        node = self._root
+        result = self.NIL
+        while node is not self.NIL:
+            if node.key < key or (inclusive and node.key == key):
+                result = node
+                node = node.right
+            else:
+                node = node.left
+        return result
+
+    def irange(self, lo=None, hi=None, inclusive=(True, False), reverse=False):
+        """
+        Returns a generator over the elements between lo and hi, in order.
+        It descends from the root once to find the first element and then follows the successor links,
+        so taking k elements costs O(log n + k).
+        With a key function, the values are compared by their keys.
+        Parameters:
+            lo: The lower bound, None for no bound.
+            hi: The upper bound, None for no bound.
+            inclusive: A pair of bools, whether lo and hi themselves are included.
+            reverse: If True, the elements are generated in descending order.
+        """
+        lo = None if lo is None else self._key_of(lo)
+        hi = None if hi is None else self._key_of(hi)
+        return self.irange_key(lo, hi, inclusive, reverse)
+
+    def irange_key(self, lo=None, hi=None, inclusive=(True, False), reverse=False):
+        """
+        Returns a generator over the elements whose keys are between lo and hi, in order.
+        Parameters:
+            lo: The lower bound of the keys, None for no bound.
+            hi: The upper bound of the keys, None for no bound.
+            inclusive: A pair of bools, whether lo and hi themselves are included.
+            reverse: If True, the elements are generated in descending order.
+        """
+        lo_inclusive, hi_inclusive = inclusive
+
+        def below_lo(key):
+            return lo is not None and (key < lo or (not lo_inclusive and key == lo))
+
+        def above_hi(key):
+            return hi is not None and (key > hi or (not hi_inclusive and key == hi))
+
+        def ascending():
+            node = self._tree_minimum(self._root) if lo is None else self._first_node(lo, lo_inclusive)
+            while node is not self.NIL and not above_hi(node.key):
+                for _ in range(node.count):
+                    yield node.value
+                node = self._successor(node)
+
+        def descending():
+            node = self._tree_maximum(self._root) if hi is None else self._last_node(hi, hi_inclusive)
+            while node is not self.NIL and not below_lo(node.key):
+                for _ in range(node.count):
+                    yield node.value
+                node = self._predecessor(node)
+
+        return descending() if reverse else ascending()
+
+    def __getitem__(self, key):
+        """
+        Returns a generator over the elements in a key range, tree[lo:hi] is the same as tree.irange(lo, hi).
+        Parameters:
+            key: A slice of values, with no step.
+        """
+        if not isinstance(key, slice):
+            raise TypeError("Trees can only be sliced by value, e.g. tree[lo:hi]")
+        if key.step is not None:
+            raise ValueError("Slices of a tree cannot have a step")
+        return self.irange(key.start, key.stop)
 
     def _count_size(self, node):
         """
@@ -466,6 +1763,201 @@ class MultiRedBlackTree(MultiUnbalancedTree):
         Parameters:
             node: The root of the subtree.
         """
-        if node is self.NIL:
+        return node.size
+
+    def rank(self, value):
+        """
+        Returns the number of elements in the tree that are smaller than the given value.
+        With a key function, the values are compared by their keys.
+        Parameters:
+            value: The value to compare to.
+        """
+        key = self._key_of(value)
+        node = self._root
+        rank = 0
+        while node is not self.NIL:
+            if node.key < key:
+                rank += node.left.size + node.count
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def select(self, index):
+        """
+        Returns the element at the given position of the sorted order, counting duplicates.
+        Negative indices count from the end. Raises IndexError if the index is out of range.
+        Parameters:
+            index: The position of the element.
+        """
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Index out of range")
+
+        node = self._root
+        while True:
+            if index < node.left.size:
+                node = node.left
+            elif index < node.left.size + node.count:
+                return node.value
+            else:
+                index -= node.left.size + node.count
+                node = node.right
+
+    def count_range(self, lo, hi):
+        """
+        Returns the number of elements x in the tree with lo <= x < hi.
+        Parameters:
+            lo: The inclusive lower bound.
+            hi: The exclusive upper bound.
+        """
+        if not lo < hi:
             return 0
-        return node.count + self._count_size(node.left) + self._count_size(node.right)
+        return self.rank(hi) - self.rank(lo)
+
+
+# the public methods that change a tree, validated after in debug mode
+MUTATORS = (
+    "add",
+    "remove",
+    "add_many",
+    "remove_many",
+    "pop_min",
+    "pop_max",
+    "update",
+    "intersection_update",
+    "difference_update",
+    "symmetric_difference_update",
+    "join",
+    "split",
+    "clear",
+    "__setitem__",
+    "__delitem__",
+    "setdefault",
+    "pop",
+    "popitem",
+)
+
+_validating_classes = {}
+
+
+def _count_mutation(tree):
+    """
+    Counts a mutation of a tree in debug mode, and validates the tree every _validation_period mutations.
+    """
+    tree._mutations += 1
+    if tree._mutations >= tree._validation_period:
+        tree._mutations = 0
+        tree.validate()
+
+
+def _validating_class(cls):
+    """
+    Returns the subclass of a tree class whose mutators validate the tree every _validation_period calls.
+    """
+    if cls in _validating_classes:
+        return _validating_classes[cls]
+
+    def validated(name):
+        method = getattr(cls, name)
+
+        def mutator(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            _count_mutation(self)
+            return result
+
+        mutator.__name__ = name
+        mutator.__doc__ = method.__doc__
+        return mutator
+
+    def __reduce__(self):
+        # pickles as the plain class, debug mode is not kept
+        _, arguments, state = cls.__reduce__(self)
+        return cls, arguments, state
+
+    class Cursor(cls.Cursor):
+        __slots__ = ()
+
+        def remove(self):
+            # removing through a cursor counts as a mutation like the public methods
+            super().remove()
+            _count_mutation(self._tree)
+
+    Cursor.remove.__doc__ = cls.Cursor.remove.__doc__
+
+    namespace = {name: validated(name) for name in MUTATORS if hasattr(cls, name)}
+    namespace.update(
+        __reduce__=__reduce__,
+        __slots__=(),
+        Cursor=Cursor,
+        _validated_class=cls,
+        _validation_period=1,
+        _mutations=0,
+    )
+    _validating_classes[cls] = type(f"Validating{cls.__name__}", (cls,), namespace)
+    return _validating_classes[cls]
+
+
+# the optional C implementation of the hot methods, built with: python setup.py build_ext --inplace
+# or when the package is installed
+# The accelerator walks the trees through borrowed references without any locking. On a free-threaded build
+# importing it would enable the GIL again and give up the scaling of ConcurrentRedBlackTree, so it is neither
+# imported nor used by default there, until its state and tree walks are made safe without the GIL.
+FREE_THREADED = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+_accelerator = None
+if not FREE_THREADED:
+    try:
+        from . import _accelerator
+    except ImportError:
+        pass
+
+# the pure Python methods the accelerator replaces, to switch back to them
+PURE_PYTHON_METHODS = {
+    name: MultiRedBlackTree.__dict__[name]
+    for name in (
+        "_find",
+        "_add",
+        "_insert_node",
+        "remove",
+        "_remove_node",
+        "pop_min",
+        "pop_max",
+        "_rb_insert_fixup",
+        "_rb_delete_fixup",
+    )
+}
+
+
+def use_accelerator(enabled=None):
+    """
+    Switches MultiRedBlackTree and its subclasses between the C accelerator and the pure Python methods.
+    The accelerator is used by default when it is built, except on free-threaded builds where it would enable
+    the GIL. Both work on the same nodes, so existing trees keep working after switching.
+    Trees with a key function always run the key-aware Python code, and so do subclasses whose Node class
+    has other slots than MultiRedBlackTree.Node, since the accelerator reads the slots at fixed offsets.
+    Parameters:
+        enabled: Whether to use the accelerator. Defaults to using it unless the build is free-threaded,
+            True imports it even there.
+    Returns:
+        True if the accelerator is now used, False if the pure Python methods are.
+    """
+    global _accelerator
+    if enabled is None:
+        enabled = not FREE_THREADED
+    if enabled and _accelerator is None and FREE_THREADED:
+        try:
+            _accelerator = import_module("._accelerator", __package__)
+        except ImportError:
+            pass
+
+    methods = PURE_PYTHON_METHODS
+    if enabled and _accelerator is not None:
+        methods = _accelerator.install(MultiRedBlackTree, PURE_PYTHON_METHODS)
+    for name, method in methods.items():
+        setattr(MultiRedBlackTree, name, method)
+    return methods is not PURE_PYTHON_METHODS
+
+
+use_accelerator()
@@ -4,32 +4,167 @@ Multiset implementation of an unbalanced tree.
 Author: Andrei Lupasco
 """
 
+from itertools import groupby, islice
+from operator import le
+
 
 class MultiUnbalancedTree:
     # internal node class
     class Node:
-        def __init__(self, value, count=1, left=None, right=None):
+        __slots__ = ("value", "count", "left", "right", "key")
+
+        def __init__(self, value, count=1, left=None, right=None, key=None):
             self.value = value
             self.count = count
             self.left = left
             self.right = right
+            self.key = value if key is None else key  # the value the node is ordered by
 
-    def __init__(self, elems=[]):
+    def __init__(self, elems=[], key=None):
         """
         Creates a new empty tree.
         If an iterable is passed, the tree is initialized with its values.
         Parameters:
             elems: The iterable to initialize the tree with. Defaults to an empty tree.
+            key: A function of one argument, like the key of sorted(). The tree is ordered by the keys
+                of the values, which are computed once per value and stored on the nodes.
+                Values with equal keys are kept in insertion order. Defaults to ordering by the values.
         """
         self._root = None
+        self._key = key
         self._size = 0  # number of distinct elements
         self._length = 0  # number of elements
         self._min_element = None
         self._max_element = None
 
         # add the elements to the tree
-        for elem in elems:
-            self.add(elem)
+        self._initialize(elems)
+
+    @classmethod
+    def from_sorted(cls, iterable, key=None):
+        """
+        Creates a new tree from an iterable sorted in ascending order in O(n).
+        Equal values are collapsed into the counter of a single node.
+        Raises ValueError if the iterable is not sorted.
+        Parameters:
+            iterable: The sorted iterable to initialize the tree with.
+            key: The key function of the tree, the iterable must be sorted by it. Defaults to the values.
+        Returns:
+            The new tree.
+        """
+        tree = cls(key=key)
+        values = list(iterable)
+        if not cls._is_sorted(tree._keys(values)):
+            raise ValueError("Values are not sorted.")
+
+        tree._build_from_sorted(values)
+        return tree
+
+    @staticmethod
+    def _is_sorted(values):
+        """
+        Checks if a list is sorted in ascending order.
+        Parameters:
+            values: The list to check.
+        """
+        return all(map(le, values, islice(values, 1, None)))
+
+    def _key_of(self, value):
+        """
+        Returns the key the tree orders a value by.
+        Parameters:
+            value: The value.
+        """
+        return value if self._key is None else self._key(value)
+
+    def _keys(self, values):
+        """
+        Returns the keys of a list of values, or the list itself if the tree has no key function.
+        Parameters:
+            values: The list of values.
+        """
+        return values if self._key is None else list(map(self._key, values))
+
+    def _initialize(self, elems):
+        """
+        Adds the elements of an iterable to the empty tree.
+        If the elements are already sorted, the tree is built in O(n).
+        Parameters:
+            elems: The iterable to initialize the tree with.
+        """
+        values = list(elems)
+        if self._is_sorted(self._keys(values)):
+            self._build_from_sorted(values)
+        else:
+            for value in values:
+                self.add(value)
+
+    def _sorted_runs(self, values):
+        """
+        Yields (value, count) pairs for the equal values in a list sorted by key.
+        With a key function, the distinct values of a run of equal keys are yielded
+        in the order of their first occurrence.
+        Parameters:
+            values: The sorted list.
+        """
+        if self._key is None:
+            for value, run in groupby(values):
+                yield value, sum(1 for _ in run)
+            return
+
+        for _, run in groupby(values, self._key):
+            run = list(run)
+            counts = {}
+            try:
+                for value in run:
+                    counts[value] = counts.get(value, 0) + 1
+            except TypeError:
+                # unhashable values are compared with each distinct value of the run found so far
+                yield from self._count_unhashable(run)
+            else:
+                yield from counts.items()
+
+    @staticmethod
+    def _count_unhashable(run):
+        """
+        Returns the (value, count) pairs of the distinct values of a list, in the order of their first occurrence,
+        comparing the values with == only. Takes O(n * d) for d distinct values.
+        Parameters:
+            run: The list of values.
+        """
+        counted = []
+        for value in run:
+            for pair in counted:
+                if pair[0] == value:
+                    pair[1] += 1
+                    break
+            else:
+                counted.append([value, 1])
+        return [(value, count) for value, count in counted]
+
+    def _build_from_sorted(self, values):
+        """
+        Builds a balanced tree from a sorted list, replacing the contents of the empty tree.
+        Parameters:
+            values: The sorted list.
+        """
+        runs = list(self._sorted_runs(values))
+        if not runs:
+            return
+
+        def build(lo, hi):
+            # builds the subtree holding runs[lo:hi]
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            value, count = runs[mid]
+            return self.Node(value, count, build(lo, mid), build(mid + 1, hi), self._key_of(value))
+
+        self._root = build(0, len(runs))
+        self._size = len(runs)
+        self._length = sum(count for _, count in runs)
+        self._min_element = runs[0][0]
+        self._max_element = runs[-1][0]
 
     def _find(self, value, nil_node=None):
         """
@@ -41,14 +176,17 @@ class MultiUnbalancedTree:
             The node with the given value or None if not found.
         """
 
+        if self._key is not None:
+            return self._find_with_parent(value, nil_node)[0]
+
         node = self._root
         while node is not nil_node:
             # if the value is found, return the node
-            if node.value == value:
+            if node.key == value:
                 return node
 
             # otherwise, go left or right
-            if node.value > value:
+            if node.key > value:
                 node = node.left
             else:
                 node = node.right
@@ -56,30 +194,97 @@ class MultiUnbalancedTree:
         # default return value
         return None
 
+    def _nodes_with_key(self, key, nil_node=None):
+        """
+        Yields (node, parent) pairs for the nodes with the given key, in order.
+        Equal keys may be on both sides of a node, so the nodes are visited
+        by an in-order traversal starting at the first one.
+        Parameters:
+            key: The key to search for.
+            nil_node: The leaf sentinel of the tree.
+        """
+        stack = []
+        node, parent = self._root, nil_node
+        while node is not nil_node:
+            if node.key < key:
+                parent, node = node, node.right
+            else:
+                stack.append((node, parent))
+                parent, node = node, node.left
+
+        while stack:
+            node, parent = stack.pop()
+            if key < node.key:
+                return
+            yield node, parent
+            parent, node = node, node.right
+            while node is not nil_node:
+                stack.append((node, parent))
+                parent, node = node, node.left
+
+    def _find_in_run(self, value, key, nil_node=None):
+        """
+        Returns the node with the given value among the nodes with its key and its parent,
+        or (None, None) if not found.
+        Parameters:
+            value: The value to search for.
+            key: The key of the value.
+            nil_node: The leaf sentinel of the tree.
+        """
+        for node, parent in self._nodes_with_key(key, nil_node):
+            if node.value == value:
+                return node, parent
+        return None, None
+
+    def _find_with_parent(self, value, nil_node=None):
+        """
+        Returns the node with the given value and its parent, or (None, None) if not found.
+        Parameters:
+            value: The value to search for.
+            nil_node: The leaf sentinel of the tree.
+        """
+        if self._key is not None:
+            return self._find_in_run(value, self._key(value), nil_node)
+
+        node = self._root
+        parent = nil_node
+        while node is not nil_node:
+            if node.key == value:
+                return node, parent
+            parent = node
+            if node.key > value:
+                node = node.left
+            else:
+                node = node.right
+        return None, None
+
     def _add(self, value):
         """
-        Adds a value to the tree.
-        If the value already exists, the counter is increased.
+        Adds a value to the tree in a single descent.
+        If the value already exists, the counter is increased through _add_count.
         Parameters:
             value: The value to add.
+        Returns:
+            True if a new node was created, False if the value was already in the tree.
         """
 
-        # update the size
-        self._length += 1
+        key = value
+        if self._key is not None:
+            # values with equal keys are separate nodes, look for the value among them first
+            key = self._key(value)
+            node, _ = self._find_in_run(value, key)
+            if node is not None:
+                self._add_count(node, 1)
+                return False
 
         # if the tree is empty, add the value as the root
         if self._root is None:
-            self._root = self.Node(value)
+            self._root = self.Node(value, key=key)
             self._min_element = value
             self._max_element = value
             self._size = 1
-            return
-
-        # update the min and max elements
-        if value < self._min_element:
-            self._min_element = value
-        if value > self._max_element:
-            self._max_element = value
+            self._length = 1
+            return True
 
         # look for the value in the tree
         # if found, increase the counter
@@ -87,28 +292,49 @@ class MultiUnbalancedTree:
 
         node = self._root
         parent = None
+        is_min = is_max = True
+        unique = self._key is None
 
         while node is not None:
             # if the value is found, increase the counter
-            if node.value == value:
-                node.count += 1
-                return
+            if unique and node.key == key:
+                self._add_count(node, 1)
+                return False
 
             # otherwise, go left or right
             parent = node
-            if node.value > value:
+            if node.key > key:
                 node = node.left
+                is_max = False
             else:
                 node = node.right
+                is_min = False
 
         # if the node is None, add the value
         else:
             self._size += 1
-            if parent.value > value:
-                parent.left = self.Node(value)
+            self._length += 1
+            if parent.key > key:
+                parent.left = self.Node(value, key=key)
             else:
-                parent.right = self.Node(value)
-            return
+                parent.right = self.Node(value, key=key)
+
+            # update the min and max elements
+            if is_min:
+                self._min_element = value
+            if is_max:
+                self._max_element = value
+            return True
+
+    def _add_count(self, node, count):
+        """
+        Increases the counter of an existing node.
+        Parameters:
+            node: The node holding the value.
+            count: The number of occurrences to add.
+        """
+        node.count += count
+        self._length += count
 
     def _remove_node(self, node, parent):
         """
@@ -158,6 +384,7 @@ class MultiUnbalancedTree:
 
         node.value = successor.value
         node.count = successor.count
+        node.key = successor.key
 
         if successor is successor_parent.left:
             successor_parent.left = successor.right
@@ -174,42 +401,30 @@ class MultiUnbalancedTree:
             value: The value to remove.
         """
 
-        node = self._root
-        parent = None
-
-        while node is not None:
-            # if the value is found, decrease the counter
-            if node.value == value:
-                self._length -= 1
-                if node.count > 1:
-                    node.count -= 1
-                else:
-                    self._remove_node(node, parent)
-                    # update the min and max elements
-                    if self._length == 0:
-                        self._min_element = None
-                        self._max_element = None
-                    elif value == self._min_element:
-                        node = self._root
-                        while node.left is not None:
-                            node = node.left
-                        self._min_element = node.value
-                    elif value == self._max_element:
-                        node = self._root
-                        while node.right is not None:
-                            node = node.right
-                        self._max_element = node.value
-
-                return
+        node, parent = self._find_with_parent(value)
+        if node is None:
+            raise ValueError("Value not found.")
 
-            # otherwise, go left or right
-            parent = node
-            if node.value > value:
-                node = node.left
-            else:
-                node = node.right
+        # decrease the counter
+        self._length -= 1
+        if node.count > 1:
+            node.count -= 1
         else:
-            raise ValueError("Value not found.")
+            self._remove_node(node, parent)
+            # update the min and max elements
+            if self._length == 0:
+                self._min_element = None
+                self._max_element = None
+            elif value == self._min_element:
+                node = self._root
+                while node.left is not None:
+                    node = node.left
+                self._min_element = node.value
+            elif value == self._max_element:
+                node = self._root
+                while node.right is not None:
+                    node = node.right
+                self._max_element = node.value
 
     def __contains__(self, value):
         """
@@ -298,18 +513,60 @@ class MultiUnbalancedTree:
     def __iter__(self, nil_node=None):
         """
         Returns a generator that yields the elements of the tree.
+        The traversal keeps the path to the current node on an explicit stack,
+        so it does not recurse.
         """
 
         def inorder(node):
-            if node is nil_node:
-                return
-            yield from inorder(node.left)
-            for _ in range(node.count):
-                yield node.value
-            yield from inorder(node.right)
+            stack = []
+            while stack or node is not nil_node:
+                if node is not nil_node:
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = stack.pop()
+                    for _ in range(node.count):
+                        yield node.value
+                    node = node.right
 
         return inorder(self._root)
 
+    def __reversed__(self, nil_node=None):
+        """
+        Returns a generator that yields the elements of the tree in descending order.
+        """
+
+        def reverse_inorder(node):
+            stack = []
+            while stack or node is not nil_node:
+                if node is not nil_node:
+                    stack.append(node)
+                    node = node.right
+                else:
+                    node = stack.pop()
+                    for _ in range(node.count):
+                        yield node.value
+                    node = node.left
+
+        return reverse_inorder(self._root)
+
+    def export(self, file, format="dot", max_depth=None, around=None, radius=3):
+        """
+        Writes the shape of the tree to a DOT or JSON file without recursion or a viewer,
+        streaming the nodes so that trees of any size can be inspected offline.
+        Parameters:
+            file: A path, or a text file object to write to.
+            format: "dot" for a graphviz digraph, or "json" for a list of nodes in preorder.
+            max_depth: The depth below which nodes are not exported. Defaults to no cap.
+            around: If not None, only the part of the tree around this key is exported.
+            radius: The number of levels above the key where the export starts. Defaults to 3.
+        Returns:
+            The number of nodes written.
+        """
+        from .export import export_tree
+
+        return export_tree(self, file, format, max_depth, around, radius)
+
     def __str__(self):
         """
         Returns a string representation of the tree.
@@ -324,38 +581,36 @@ class MultiUnbalancedTree:
 
         return str(list(self))
 
-    def _lower_bound(self, value, nil_node):
+    def _lower_bound(self, key, nil_node):
         """
-        Returns the smallest value that is greater than or equal to value.
+        Returns the first value whose key is greater than or equal to key.
         Parameters:
-            value: The value to check.
+            key: The key to check.
         Returns:
-            The lower bound of the value.
+            The lower bound of the key.
         """
         node = self._root
         result = None
         while node is not nil_node:
-            if node.value == value:
-                return node.value
-            elif node.value < value:
+            if node.key < key:
                 node = node.right
             else:
                 result = node.value
                 node = node.left
         return result
 
-    def _upper_bound(self, value, nil_node):
+    def _upper_bound(self, key, nil_node):
         """
-        Returns the smallest value that is greater than value.
+        Returns the first value whose key is greater than key.
         Parameters:
-            value: The value to check.
+            key: The key to check.
         Returns:
-            The upper bound of the value.
+            The upper bound of the key.
         """
         node = self._root
         result = None
         while node is not nil_node:
-            if node.value <= value:
+            if node.key <= key:
                 node = node.right
             else:
                 result = node.value
@@ -365,19 +620,41 @@ class MultiUnbalancedTree:
     def lower_bound(self, value):
         """
         Returns the smallest value that is greater than or equal to value.
+        With a key function, the values are compared by their keys.
         Parameters:
             value: The value to check.
         Returns:
             The lower bound of the value.
         """
-        return self._lower_bound(value, None)
+        return self._lower_bound(self._key_of(value), None)
 
     def upper_bound(self, value):
         """
         Returns the smallest value that is greater than value.
+        With a key function, the values are compared by their keys.
         Parameters:
             value: The value to check.
         Returns:
             The upper bound of the value.
         """
-        return self._upper_bound(value, None)
+        return self._upper_bound(self._key_of(value), None)
+
+    def lower_bound_key(self, key):
+        """
+        Returns the first value whose key is greater than or equal to key.
+        Parameters:
+            key: The key to check.
+        Returns:
+            The lower bound of the key.
+        """
+        return self._lower_bound(key, None)
+
+    def upper_bound_key(self, key):
+        """
+        Returns the first value whose key is greater than key.
+        Parameters:
+            key: The key to check.
+        Returns:
+            The upper bound of the key.
+        """
+        return self._upper_bound(key, None)
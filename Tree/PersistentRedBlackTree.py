@@ -0,0 +1,410 @@
+"""
+Persistent (immutable) multiset implementation of a red-black tree.
+add and remove never change a tree, they return a new version of it. Only the nodes on the path
+from the root to the changed node are copied, all other nodes are shared between the versions.
+Taking a snapshot is therefore O(1): any version can simply be kept, and versions that are
+no longer referenced are garbage collected.
+The balancing follows the left-leaning red-black trees of Sedgewick, 'Left-leaning Red-Black Trees' (2008),
+whose recursive formulation suits path copying.
+"""
+
+from .MultiRedBlackTree import RED, BLACK
+
+
+class PersistentRedBlackTree:
+    # internal node class, never modified once it is part of a tree
+    class Node:
+        __slots__ = ("value", "count", "color", "left", "right")
+
+        def __init__(self, value, count, color, left=None, right=None):
+            self.value = value
+            self.count = count
+            self.color = color
+            self.left = left
+            self.right = right
+
+    def __init__(self, elems=[]):
+        """
+        Creates a new tree.
+        If an iterable is passed, the tree is initialized with its values.
+        Parameters:
+            elems: An iterable. Defaults to an empty tree.
+        """
+        self._root = None
+        self._size = 0  # number of distinct elements
+        self._length = 0  # number of elements
+
+        for elem in elems:
+            self._root, is_new = self._insert(self._root, elem)
+            self._root.color = BLACK
+            self._size += is_new
+            self._length += 1
+
+    @classmethod
+    def _from_root(cls, root, size, length):
+        """
+        Creates a tree version around an existing root.
+        Parameters:
+            root: The root node, shared with other versions.
+            size: The number of distinct elements.
+            length: The number of elements.
+        """
+        tree = cls.__new__(cls)
+        tree._root = root
+        tree._size = size
+        tree._length = length
+        return tree
+
+    # helpers working on nodes owned by the current operation,
+    # any node taken from a tree has to be copied before it is changed
+
+    def _copy(self, node):
+        """
+        Returns a copy of node that the current operation may change.
+        """
+        return self.Node(node.value, node.count, node.color, node.left, node.right)
+
+    @staticmethod
+    def _is_red(node):
+        """
+        Checks if a node is red, None leaves are black.
+        """
+        return node is not None and node.color is RED
+
+    def _rotate_left(self, node):
+        """
+        Rotates the owned node to the left and returns the new subtree root.
+        """
+        right = self._copy(node.right)
+        node.right = right.left
+        right.left = node
+        right.color = node.color
+        node.color = RED
+        return right
+
+    def _rotate_right(self, node):
+        """
+        Rotates the owned node to the right and returns the new subtree root.
+        """
+        left = self._copy(node.left)
+        node.left = left.right
+        left.right = node
+        left.color = node.color
+        node.color = RED
+        return left
+
+    def _flip_colors(self, node):
+        """
+        Flips the colors of the owned node and of its two children.
+        """
+        node.color = not node.color
+        node.left = self._copy(node.left)
+        node.left.color = not node.left.color
+        node.right = self._copy(node.right)
+        node.right.color = not node.right.color
+
+    def _balance(self, node):
+        """
+        Restores the left-leaning red-black properties at the owned node and returns the new subtree root.
+        """
+        if self._is_red(node.right) and not self._is_red(node.left):
+            node = self._rotate_left(node)
+        if self._is_red(node.left) and self._is_red(node.left.left):
+            node = self._rotate_right(node)
+        if self._is_red(node.left) and self._is_red(node.right):
+            self._flip_colors(node)
+        return node
+
+    def _move_red_left(self, node):
+        """
+        Makes the left child of the owned node or one of its children red.
+        """
+        self._flip_colors(node)
+        if self._is_red(node.right.left):
+            node.right = self._rotate_right(node.right)
+            node = self._rotate_left(node)
+            self._flip_colors(node)
+        return node
+
+    def _move_red_right(self, node):
+        """
+        Makes the right child of the owned node or one of its children red.
+        """
+        self._flip_colors(node)
+        if self._is_red(node.left.left):
+            node = self._rotate_right(node)
+            self._flip_colors(node)
+        return node
+
+    def _insert(self, node, value):
+        """
+        Adds value to the subtree rooted at node, copying the nodes on the path.
+        Returns:
+            The new subtree root and whether a new node was created.
+        """
+        if node is None:
+            return self.Node(value, 1, RED), True
+
+        node = self._copy(node)
+        if node.value == value:
+            node.count += 1
+            return node, False
+
+        if value < node.value:
+            node.left, is_new = self._insert(node.left, value)
+        else:
+            node.right, is_new = self._insert(node.right, value)
+        return self._balance(node), is_new
+
+    def _decrement(self, node, value):
+        """
+        Decreases the counter of value in the subtree rooted at node, copying the nodes on the path.
+        The value must be in the subtree.
+        """
+        node = self._copy(node)
+        if node.value == value:
+            node.count -= 1
+        elif value < node.value:
+            node.left = self._decrement(node.left, value)
+        else:
+            node.right = self._decrement(node.right, value)
+        return node
+
+    def _delete_min(self, node):
+        """
+        Removes the minimum node of the subtree rooted at node and returns the new subtree root.
+        """
+        node = self._copy(node)
+        if node.left is None:
+            return None
+        if not self._is_red(node.left) and not self._is_red(node.left.left):
+            node = self._move_red_left(node)
+        node.left = self._delete_min(node.left)
+        return self._balance(node)
+
+    def _delete(self, node, value):
+        """
+        Removes the node holding value from the subtree rooted at node and returns the new subtree root.
+        The value must be in the subtree.
+        """
+        node = self._copy(node)
+        if value < node.value:
+            if not self._is_red(node.left) and not self._is_red(node.left.left):
+                node = self._move_red_left(node)
+            node.left = self._delete(node.left, value)
+        else:
+            if self._is_red(node.left):
+                node = self._rotate_right(node)
+            if node.value == value and node.right is None:
+                return None
+            if not self._is_red(node.right) and not self._is_red(node.right.left):
+                node = self._move_red_right(node)
+            if node.value == value:
+                # replace the value by its successor and remove the successor instead
+                successor = node.right
+                while successor.left is not None:
+                    successor = successor.left
+                node.value = successor.value
+                node.count = successor.count
+                node.right = self._delete_min(node.right)
+            else:
+                node.right = self._delete(node.right, value)
+        return self._balance(node)
+
+    def _find(self, value):
+        """
+        Returns the node with the given value or None if not found.
+        Parameters:
+            value: The value to search for.
+        """
+        node = self._root
+        while node is not None:
+            if node.value == value:
+                return node
+            if node.value > value:
+                node = node.left
+            else:
+                node = node.right
+        return None
+
+    def add(self, value):
+        """
+        Returns a new version of the tree with value added. The tree itself is not changed.
+        Parameters:
+            value: The value to add.
+        """
+        root, is_new = self._insert(self._root, value)
+        root.color = BLACK
+        return self._from_root(root, self._size + is_new, self._length + 1)
+
+    def remove(self, value):
+        """
+        Returns a new version of the tree with one occurrence of value removed. The tree itself is not changed.
+        Raises ValueError if the value is not in the tree.
+        Parameters:
+            value: The value to remove.
+        """
+        node = self._find(value)
+        if node is None:
+            raise ValueError("Value not found in tree")
+
+        if node.count > 1:
+            return self._from_root(self._decrement(self._root, value), self._size, self._length - 1)
+
+        root = self._root
+        if not self._is_red(root.left) and not self._is_red(root.right):
+            root = self._copy(root)
+            root.color = RED
+        root = self._delete(root, value)
+        if root is not None:
+            root.color = BLACK
+        return self._from_root(root, self._size - 1, self._length - 1)
+
+    def snapshot(self):
+        """
+        Returns the tree itself, since a version never changes.
+        """
+        return self
+
+    def __contains__(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self._find(value) is not None
+
+    def contains(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self._find(value) is not None
+
+    def count(self, value):
+        """
+        Returns the number of occurrences of a value in the tree.
+        Parameters:
+            value: The value to count.
+        """
+        node = self._find(value)
+        if node is None:
+            return 0
+        return node.count
+
+    def min(self):
+        """
+        Returns the minimum element in the tree, or None if the tree is empty.
+        """
+        node = self._root
+        if node is None:
+            return None
+        while node.left is not None:
+            node = node.left
+        return node.value
+
+    def max(self):
+        """
+        Returns the maximum element in the tree, or None if the tree is empty.
+        """
+        node = self._root
+        if node is None:
+            return None
+        while node.right is not None:
+            node = node.right
+        return node.value
+
+    def lower_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        node = self._root
+        result = None
+        while node is not None:
+            if node.value == value:
+                return node.value
+            elif node.value < value:
+                node = node.right
+            else:
+                result = node.value
+                node = node.left
+        return result
+
+    def upper_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        node = self._root
+        result = None
+        while node is not None:
+            if node.value <= value:
+                node = node.right
+            else:
+                result = node.value
+                node = node.left
+        return result
+
+    def __len__(self):
+        """
+        Returns the number of elements in the tree.
+        """
+        return self._length
+
+    def __iter__(self):
+        """
+        Returns a generator that yields the elements of the tree in order.
+        """
+
+        def inorder(node):
+            stack = []
+            while stack or node is not None:
+                if node is not None:
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = stack.pop()
+                    for _ in range(node.count):
+                        yield node.value
+                    node = node.right
+
+        return inorder(self._root)
+
+    def is_red_black(self):
+        """
+        Checks if the tree is a valid red-black tree.
+        Returns:
+            True if the tree is a valid red-black tree, False otherwise.
+        """
+
+        def black_height(node):
+            # returns the black height of the subtree, or -1 if it is invalid
+            if node is None:
+                return 0
+            if node.color is RED and (self._is_red(node.left) or self._is_red(node.right)):
+                return -1
+            left_height = black_height(node.left)
+            right_height = black_height(node.right)
+            if left_height == -1 or left_height != right_height:
+                return -1
+            return left_height + (1 if node.color is BLACK else 0)
+
+        return not self._is_red(self._root) and black_height(self._root) != -1
+
+    def __str__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(list(self))
+
+    def __repr__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(list(self))
@@ -1,30 +1,59 @@
 """
 Set implementation using a red-black tree.
-Internally its implemented as a MultiRedBlackTree with an overhead of checking
-for duplicates before adding a value.
+Internally its implemented as a MultiRedBlackTree whose nodes never count
+more than one occurrence, adding a value stops at an equal value in the same descent.
 """
 
-from MultiRedBlackTree import MultiRedBlackTree
+from .MultiRedBlackTree import MultiRedBlackTree
 
 
 class RedBlackTree(MultiRedBlackTree):
-    def __init__(self, elems=[]):
+    def __init__(self, elems=[], key=None):
         """
         Creates a new RedBlackTree.
         Parameters:
             elems: An iterable of elements to add to the tree. Defaults to an empty tree.
+            key: A function of one argument the values are ordered by. Defaults to the values themselves.
         """
-        super().__init__(elems)
+        super().__init__(elems, key)
 
     def add(self, value):
         """
         Adds a value to the tree.
         If the value is already in the tree, it is not added again.
+        The search for the value and for the place of the new node is the same descent.
         Parameters:
             value: The value to add.
+        Returns:
+            True if the value was added, False if it was already in the tree.
         """
-        if value not in self:
-            super().add(value)
+        return self._add(value)
+
+    def _add_count(self, node, count):
+        """
+        Does nothing, since a value already in the tree is not added again.
+        Parameters:
+            node: The node holding the value.
+            count: The number of occurrences to add.
+        """
+
+    def _sorted_runs(self, values):
+        """
+        Yields (value, 1) for each distinct value of a sorted list, since duplicates are not stored.
+        Parameters:
+            values: The sorted list.
+        """
+        for value, _ in super()._sorted_runs(values):
+            yield value, 1
+
+    def _union_count(self, count1, count2):
+        """
+        Returns 1, since a value in both trees is stored only once in their union.
+        Parameters:
+            count1: The counter of the value in the first tree, 0 if absent.
+            count2: The counter of the value in the second tree, 0 if absent.
+        """
+        return 1
 
     def _draw_node(self, node, graph):
         """
@@ -0,0 +1,351 @@
+"""
+Sorted map implementation using a red-black tree.
+Each key is a node of the tree and the value mapped to it is stored on the node,
+so every operation descends the tree only once.
+"""
+
+import collections.abc
+from itertools import islice
+from operator import lt
+from .RedBlackTree import RedBlackTree
+
+
+class RedBlackTreeMap(RedBlackTree, collections.abc.MutableMapping):
+    # internal node class, the mapped value is stored next to the key
+    class Node(RedBlackTree.Node):
+        __slots__ = ("payload",)
+
+        def __init__(self, value, color, count=1, key=None):
+            super().__init__(value, color, count, key)
+            self.payload = None
+
+    class ItemsView(collections.abc.ItemsView):
+        """
+        View of the (key, value) pairs of a map, in ascending order of keys.
+        """
+
+        def __iter__(self):
+            return self._mapping._items()
+
+    class ValuesView(collections.abc.ValuesView):
+        """
+        View of the values of a map, in ascending order of their keys.
+        """
+
+        def __iter__(self):
+            for _, value in self._mapping._items():
+                yield value
+
+    def __init__(self, items=(), **kwargs):
+        """
+        Creates a new map.
+        If a mapping or an iterable of (key, value) pairs is passed, the map is initialized with them,
+        in O(n) if the keys are sorted.
+        Parameters:
+            items: A mapping or an iterable of (key, value) pairs. Defaults to an empty map.
+            kwargs: More keys and values, like for dict.
+        """
+        super().__init__()
+
+        if hasattr(items, "keys"):
+            pairs = [(key, items[key]) for key in items.keys()]
+        else:
+            pairs = [tuple(pair) for pair in items]
+        keys = [key for key, _ in pairs]
+        if all(map(lt, keys, islice(keys, 1, None))):
+            self._build_from_runs([(key, 1) for key in keys])
+            self._assign_payloads(value for _, value in pairs)
+        else:
+            for key, value in pairs:
+                self[key] = value
+
+        for key, value in kwargs.items():
+            self[key] = value
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        """
+        Creates a new map with the keys of an iterable, all mapped to value.
+        Parameters:
+            iterable: The keys.
+            value: The value of all keys. Defaults to None.
+        """
+        tree = cls()
+        for key in iterable:
+            tree[key] = value
+        return tree
+
+    def _assign_payloads(self, values):
+        """
+        Stores values on the nodes in ascending order of keys.
+        Parameters:
+            values: An iterable with one value per node.
+        """
+        node = self._tree_minimum(self._root)
+        for value in values:
+            node.payload = value
+            node = self._successor(node)
+
+    def _items(self):
+        """
+        Yields the (key, value) pairs in ascending order of keys.
+        """
+        node = self._tree_minimum(self._root)
+        while node is not self.NIL:
+            yield node.value, node.payload
+            node = self._successor(node)
+
+    def _copy_node(self, node):
+        """
+        Returns an unlinked copy of a node, with its value.
+        Parameters:
+            node: The node to copy.
+        """
+        copy = super()._copy_node(node)
+        copy.payload = node.payload
+        return copy
+
+    def __getitem__(self, key):
+        """
+        Returns the value mapped to key.
+        Raises KeyError if the key is not in the map.
+        Parameters:
+            key: The key to look up.
+        """
+        node, _ = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            raise KeyError(key)
+        return node.payload
+
+    def __setitem__(self, key, value):
+        """
+        Maps key to value, replacing the previous value of the key.
+        Parameters:
+            key: The key.
+            value: The value.
+        """
+        node, parent = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            node = self._insert_node(parent, key, 1)
+        node.payload = value
+
+    def __delitem__(self, key):
+        """
+        Removes key and its value.
+        Raises KeyError if the key is not in the map.
+        Parameters:
+            key: The key to remove.
+        """
+        node, _ = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            raise KeyError(key)
+        self._length -= 1
+        self._remove_node(node)
+
+    def get(self, key, default=None):
+        """
+        Returns the value mapped to key, or default if the key is not in the map.
+        Parameters:
+            key: The key to look up.
+            default: The value to return for a missing key.
+        """
+        node, _ = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            return default
+        return node.payload
+
+    def setdefault(self, key, default=None):
+        """
+        Returns the value mapped to key. If the key is not in the map, maps it to default first.
+        Parameters:
+            key: The key to look up.
+            default: The value to map a missing key to.
+        """
+        node, parent = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            node = self._insert_node(parent, key, 1)
+            node.payload = default
+        return node.payload
+
+    def pop(self, key, *default):
+        """
+        Removes key and returns its value.
+        If the key is not in the map, returns default if given and raises KeyError otherwise.
+        Parameters:
+            key: The key to remove.
+            default: The value to return for a missing key.
+        """
+        node, _ = self._finger_search(self.NIL, key)
+        if node is self.NIL:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._length -= 1
+        self._remove_node(node)
+        return node.payload
+
+    def popitem(self):
+        """
+        Removes the item with the smallest key and returns it as a (key, value) pair.
+        Raises KeyError if the map is empty.
+        """
+        if self._root is self.NIL:
+            raise KeyError("popitem(): map is empty")
+        node = self._tree_minimum(self._root)
+        self._length -= 1
+        self._remove_node(node)
+        return node.value, node.payload
+
+    def _pop_extreme_item(self, node):
+        """
+        Removes the item of the node of the smallest or largest key and returns it as a (key, value) pair.
+        Raises KeyError if the map is empty.
+        Parameters:
+            node: The cached node of the extreme key.
+        """
+        if node is self.NIL:
+            raise KeyError("pop from an empty map")
+        self._length -= 1
+        self._remove_node(node)
+        return node.value, node.payload
+
+    def pop_min(self):
+        """
+        Removes the item with the smallest key and returns it as a (key, value) pair, without searching for it.
+        Raises KeyError if the map is empty.
+        """
+        return self._pop_extreme_item(self._min_node)
+
+    def pop_max(self):
+        """
+        Removes the item with the largest key and returns it as a (key, value) pair, without searching for it.
+        Raises KeyError if the map is empty.
+        """
+        return self._pop_extreme_item(self._max_node)
+
+    def peek_min(self):
+        """
+        Returns the item with the smallest key as a (key, value) pair in O(1), without removing it.
+        Raises KeyError if the map is empty.
+        """
+        if self._min_node is self.NIL:
+            raise KeyError("peek at an empty map")
+        return self._min_node.value, self._min_node.payload
+
+    def peek_max(self):
+        """
+        Returns the item with the largest key as a (key, value) pair in O(1), without removing it.
+        Raises KeyError if the map is empty.
+        """
+        if self._max_node is self.NIL:
+            raise KeyError("peek at an empty map")
+        return self._max_node.value, self._max_node.payload
+
+    def add(self, value):
+        """
+        Raises TypeError, since a key cannot be added without a value.
+        """
+        raise TypeError("add() is not supported on maps, use map[key] = value.")
+
+    def add_many(self, iterable):
+        """
+        Raises TypeError, since keys cannot be added without values.
+        """
+        raise TypeError("add_many() is not supported on maps, use update() to add items.")
+
+    def remove(self, value):
+        """
+        Raises TypeError, use del map[key] or pop(key) to remove a key and its value.
+        """
+        raise TypeError("remove() is not supported on maps, use del map[key] or pop(key).")
+
+    def remove_many(self, iterable):
+        """
+        Raises TypeError, use del map[key] or pop(key) to remove keys and their values.
+        """
+        raise TypeError("remove_many() is not supported on maps, use del map[key] or pop(key).")
+
+    def clear(self):
+        """
+        Removes all items from the map.
+        """
+        self._clear()
+
+    def update(self, other=(), **kwargs):
+        """
+        Maps the keys of a mapping or of an iterable of (key, value) pairs to their values.
+        Parameters:
+            other: A mapping or an iterable of (key, value) pairs.
+            kwargs: More keys and values, like for dict.
+        """
+        collections.abc.MutableMapping.update(self, other, **kwargs)
+
+    def items(self):
+        """
+        Returns a view of the (key, value) pairs, in ascending order of keys.
+        """
+        return self.ItemsView(self)
+
+    def values(self):
+        """
+        Returns a view of the values, in ascending order of their keys.
+        """
+        return self.ValuesView(self)
+
+    def floor_key(self, key):
+        """
+        Returns the largest key smaller than or equal to key, or None if there is none.
+        Parameters:
+            key: The key to compare to.
+        """
+        node = self._last_node(key)
+        return None if node is self.NIL else node.value
+
+    def ceiling_key(self, key):
+        """
+        Returns the smallest key greater than or equal to key, or None if there is none.
+        Parameters:
+            key: The key to compare to.
+        """
+        node = self._first_node(key)
+        return None if node is self.NIL else node.value
+
+    def _merge_update(self, other, combine, keep_self, keep_other):
+        """
+        Raises TypeError, since the values of common keys cannot be combined.
+        """
+        raise TypeError("Set operations are not supported on maps, use update() to merge maps.")
+
+    def __getstate__(self):
+        """
+        Returns the keys and the values in ascending order of keys.
+        """
+        keys = []
+        values = []
+        for key, value in self._items():
+            keys.append(key)
+            values.append(value)
+        return keys, values
+
+    def __setstate__(self, state):
+        """
+        Rebuilds the map from the state returned by __getstate__ in O(n).
+        Parameters:
+            state: The sorted keys and their values.
+        """
+        keys, values = state
+        self._clear()
+        self._build_from_runs([(key, 1) for key in keys])
+        self._assign_payloads(values)
+
+    def __repr__(self):
+        """
+        Returns a string representation of the map.
+        """
+        return "{" + ", ".join(f"{key!r}: {value!r}" for key, value in self._items()) + "}"
+
+    def __str__(self):
+        """
+        Returns a string representation of the map.
+        """
+        return self.__repr__()
@@ -0,0 +1,272 @@
+"""
+Multiset implementation with the interface of MultiRedBlackTree, stored as a list of sorted blocks.
+Each block is a short sorted Python list of distinct values with a parallel list of counters,
+and the largest value of every block is kept in a separate sorted list.
+An operation bisects the list of maxima to find the block and then bisects inside the block,
+so it touches two contiguous lists instead of following one node object per level of a tree.
+Inserting into a block shifts at most a few hundred pointers, which memmove does quickly.
+A block is split in two when it grows beyond twice the load and merged with a neighbor
+when it shrinks below half of it.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import groupby, islice
+from operator import le
+
+
+class SortedBlockTree:
+    DEFAULT_LOAD = 512
+
+    def __init__(self, elems=[], load=DEFAULT_LOAD):
+        """
+        Creates a new tree.
+        If an iterable is passed, the tree is initialized with its values.
+        Parameters:
+            elems: An iterable. Defaults to an empty tree.
+            load: The typical number of distinct values in a block. Defaults to 512.
+        """
+        self._load = load
+        self._blocks = []  # sorted lists of distinct values
+        self._counts = []  # counters of the values, parallel to _blocks
+        self._maxes = []  # the last value of each block
+        self._size = 0  # number of distinct elements
+        self._length = 0  # number of elements
+
+        self._build_from_sorted(sorted(elems))
+
+    @classmethod
+    def from_sorted(cls, iterable, load=DEFAULT_LOAD):
+        """
+        Creates a new tree from an iterable sorted in ascending order in O(n).
+        Raises ValueError if the iterable is not sorted.
+        Parameters:
+            iterable: The sorted iterable to initialize the tree with.
+            load: The typical number of distinct values in a block. Defaults to 512.
+        """
+        values = list(iterable)
+        if not all(map(le, values, islice(values, 1, None))):
+            raise ValueError("Values are not sorted.")
+
+        tree = cls(load=load)
+        tree._build_from_sorted(values)
+        return tree
+
+    def _build_from_sorted(self, values):
+        """
+        Fills the empty tree with the values of a sorted list, in blocks of load values.
+        Parameters:
+            values: The sorted list.
+        """
+        distinct = []
+        counts = []
+        for value, run in groupby(values):
+            distinct.append(value)
+            counts.append(sum(1 for _ in run))
+
+        load = self._load
+        self._blocks = [distinct[i : i + load] for i in range(0, len(distinct), load)]
+        self._counts = [counts[i : i + load] for i in range(0, len(counts), load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._size = len(distinct)
+        self._length = len(values)
+
+    def _locate(self, value):
+        """
+        Returns the index of the block that value belongs to and its position in the block.
+        Parameters:
+            value: The value to search for.
+        """
+        i = bisect_left(self._maxes, value)
+        if i == len(self._maxes):
+            # larger than all values, the place is at the end of the last block
+            i -= 1
+        return i, bisect_left(self._blocks[i], value)
+
+    def _split(self, i):
+        """
+        Splits block i in two halves.
+        """
+        block = self._blocks[i]
+        counts = self._counts[i]
+        half = len(block) // 2
+        self._blocks[i : i + 1] = [block[:half], block[half:]]
+        self._counts[i : i + 1] = [counts[:half], counts[half:]]
+        self._maxes.insert(i, block[half - 1])
+
+    def _merge(self, i):
+        """
+        Merges block i, which became too small, with a neighbor.
+        """
+        if len(self._blocks) == 1:
+            return
+        if i == len(self._blocks) - 1:
+            i -= 1
+        self._blocks[i] += self._blocks.pop(i + 1)
+        self._counts[i] += self._counts.pop(i + 1)
+        del self._maxes[i]
+        if len(self._blocks[i]) > 2 * self._load:
+            self._split(i)
+
+    def add(self, value):
+        """
+        Adds a value to the tree.
+        If the value already exists, the counter is increased.
+        Parameters:
+            value: The value to add.
+        """
+        self._length += 1
+        if not self._maxes:
+            self._blocks.append([value])
+            self._counts.append([1])
+            self._maxes.append(value)
+            self._size = 1
+            return
+
+        i, j = self._locate(value)
+        block = self._blocks[i]
+        if j < len(block) and block[j] == value:
+            self._counts[i][j] += 1
+            return
+
+        self._size += 1
+        block.insert(j, value)
+        self._counts[i].insert(j, 1)
+        if j == len(block) - 1:
+            self._maxes[i] = value
+        if len(block) > 2 * self._load:
+            self._split(i)
+
+    def remove(self, value):
+        """
+        Removes a value from the tree.
+        If the value has a counter greater than 1, the counter is decreased.
+        Raises ValueError if the value is not in the tree.
+        Parameters:
+            value: The value to remove.
+        """
+        i, j = self._locate(value) if self._maxes else (0, 0)
+        if not self._maxes or j == len(self._blocks[i]) or self._blocks[i][j] != value:
+            raise ValueError("Value not found in tree")
+
+        self._length -= 1
+        counts = self._counts[i]
+        if counts[j] > 1:
+            counts[j] -= 1
+            return
+
+        self._size -= 1
+        block = self._blocks[i]
+        del block[j]
+        del counts[j]
+        if not block:
+            del self._blocks[i]
+            del self._counts[i]
+            del self._maxes[i]
+            return
+        self._maxes[i] = block[-1]
+        if len(block) < self._load // 2:
+            self._merge(i)
+
+    def count(self, value):
+        """
+        Returns the number of occurrences of a value in the tree.
+        Parameters:
+            value: The value to count.
+        """
+        if not self._maxes:
+            return 0
+        i, j = self._locate(value)
+        block = self._blocks[i]
+        if j < len(block) and block[j] == value:
+            return self._counts[i][j]
+        return 0
+
+    def __contains__(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self.count(value) > 0
+
+    def contains(self, value):
+        """
+        Checks if the tree contains a value.
+        Parameters:
+            value: The value to check.
+        """
+        return self.count(value) > 0
+
+    def min(self):
+        """
+        Returns the minimum element in the tree, or None if the tree is empty.
+        """
+        return self._blocks[0][0] if self._blocks else None
+
+    def max(self):
+        """
+        Returns the maximum element in the tree, or None if the tree is empty.
+        """
+        return self._maxes[-1] if self._maxes else None
+
+    def lower_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than or equal to the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        i = bisect_left(self._maxes, value)
+        if i == len(self._maxes):
+            return None
+        block = self._blocks[i]
+        return block[bisect_left(block, value)]
+
+    def upper_bound(self, value):
+        """
+        Returns the smallest value in the tree that is greater than the given value.
+        If no such value exists, returns None.
+        Parameters:
+            value: The value to compare to.
+        """
+        i = bisect_right(self._maxes, value)
+        if i == len(self._maxes):
+            return None
+        block = self._blocks[i]
+        return block[bisect_right(block, value)]
+
+    def __len__(self):
+        """
+        Returns the number of elements in the tree.
+        """
+        return self._length
+
+    def __iter__(self):
+        """
+        Returns a generator that yields the elements of the tree in order.
+        """
+        for block, counts in zip(self._blocks, self._counts):
+            for value, count in zip(block, counts):
+                for _ in range(count):
+                    yield value
+
+    def __reversed__(self):
+        """
+        Returns a generator that yields the elements of the tree in descending order.
+        """
+        for block, counts in zip(reversed(self._blocks), reversed(self._counts)):
+            for value, count in zip(reversed(block), reversed(counts)):
+                for _ in range(count):
+                    yield value
+
+    def __str__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(list(self))
+
+    def __repr__(self):
+        """
+        Returns a string representation of the tree.
+        """
+        return str(list(self))
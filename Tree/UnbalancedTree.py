@@ -1,27 +1,47 @@
 """
 Set implementation using an unbalanced binary tree.
-Internally its implemented as a MultiUnbalancedTree with an overhead of checking
-for duplicates before adding a value.
+Internally its implemented as a MultiUnbalancedTree whose nodes never count
+more than one occurrence, adding a value stops at an equal value in the same descent.
 """
 
-from MultiUnbalancedTree import MultiUnbalancedTree
+from .MultiUnbalancedTree import MultiUnbalancedTree
 
 
 class UnbalancedTree(MultiUnbalancedTree):
-    def __init__(self, elems=[]):
+    def __init__(self, elems=[], key=None):
         """
         Create a new UnbalancedTree.
         Parameters:
             elems: An iterable of elements to add to the tree.
+            key: A function of one argument the values are ordered by. Defaults to the values themselves.
         """
-        super().__init__(elems)
+        super().__init__(elems, key)
 
     def add(self, value):
         """
         Add a value to the tree.
         If the value is already in the tree, it is not added again.
+        The search for the value and for the place of the new node is the same descent.
         Parameters:
             value: The value to add.
+        Returns:
+            True if the value was added, False if it was already in the tree.
         """
-        if value not in self:
-            super().add(value)
+        return self._add(value)
+
+    def _add_count(self, node, count):
+        """
+        Does nothing, since a value already in the tree is not added again.
+        Parameters:
+            node: The node holding the value.
+            count: The number of occurrences to add.
+        """
+
+    def _sorted_runs(self, values):
+        """
+        Yields (value, 1) for each distinct value of a sorted list, since duplicates are not stored.
+        Parameters:
+            values: The sorted list.
+        """
+        for value, _ in super()._sorted_runs(values):
+            yield value, 1
@@ -0,0 +1,6 @@
+"""
+Sorted sets, multisets and maps on balanced and unbalanced binary trees.
+Each tree is in the module of the same name, for example:
+    from Tree.MultiRedBlackTree import MultiRedBlackTree
+Importing a tree only imports the standard library, drawing a tree imports graphviz on first use.
+"""
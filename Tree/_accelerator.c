@@ -0,0 +1,1186 @@
+/*
+ * Optional C implementation of the red-black core of MultiRedBlackTree.
+ *
+ * The functions work on the same Python Node objects as the pure Python methods and follow
+ * them statement by statement, so both implementations can be mixed on one tree. The node
+ * slots are read and written directly at the offsets of the member descriptors of the Node
+ * class, so every method first checks that the Node class of the tree has that layout and
+ * calls the Python method it replaces otherwise. Values are compared with the rich comparison
+ * of their Python objects, exactly like the Python code does.
+ *
+ * The offsets, the NIL sentinel and the Python methods are kept in the module state, so that
+ * each interpreter importing the module has its own.
+ *
+ * Build with: python setup.py build_ext --inplace
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+
+/* the state of the module: the layout of the nodes it was installed for, the NIL sentinel of MultiRedBlackTree,
+   the Python methods it falls back to and the interned attribute names */
+typedef struct {
+    PyTypeObject *node_type;
+    Py_ssize_t off_value, off_key, off_count, off_color, off_left, off_right, off_parent, off_size, off_distinct;
+    PyObject *nil;
+    PyObject *python_methods;
+    PyObject *node_layouts; /* node class -> whether check_node_type accepted it */
+    PyObject *str_root, *str_size, *str_length, *str_min_element, *str_max_element, *str_min_node, *str_max_node,
+        *str_key, *str_node, *str_nil, *str_add_count;
+} module_state;
+
+static inline module_state *
+get_state(PyObject *module)
+{
+    return (module_state *)PyModule_GetState(module);
+}
+
+/* node colors, RED is False and BLACK is True */
+#define RED Py_False
+#define BLACK Py_True
+
+/* the accessors read the offsets from the module state st of the calling function */
+#define GET(node, off) (*(PyObject **)((char *)(node) + (off)))
+#define VALUE(node) GET(node, st->off_value)
+#define KEY(node) GET(node, st->off_key)
+#define COUNT(node) GET(node, st->off_count)
+#define COLOR(node) GET(node, st->off_color)
+#define LEFT(node) GET(node, st->off_left)
+#define RIGHT(node) GET(node, st->off_right)
+#define PARENT(node) GET(node, st->off_parent)
+
+static inline void
+set_slot(PyObject *node, Py_ssize_t off, PyObject *value)
+{
+    PyObject *old = GET(node, off);
+    Py_INCREF(value);
+    GET(node, off) = value;
+    Py_XDECREF(old);
+}
+
+#define SET_LEFT(node, value) set_slot(node, st->off_left, value)
+#define SET_RIGHT(node, value) set_slot(node, st->off_right, value)
+#define SET_PARENT(node, value) set_slot(node, st->off_parent, value)
+#define SET_COLOR(node, value) set_slot(node, st->off_color, value)
+
+/* Returns 1 if a op b is true, 0 if false and -1 on error. */
+static inline int
+compare(PyObject *a, PyObject *b, int op)
+{
+    PyObject *result = PyObject_RichCompare(a, b, op);
+    if (result == NULL) {
+        return -1;
+    }
+    int truth = PyObject_IsTrue(result);
+    Py_DECREF(result);
+    return truth;
+}
+
+/* Adds delta to an int slot of a node, or an int attribute of the tree. */
+static int
+add_to_slot(PyObject *node, Py_ssize_t off, Py_ssize_t delta)
+{
+    Py_ssize_t value = PyLong_AsSsize_t(GET(node, off));
+    if (value == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    PyObject *result = PyLong_FromSsize_t(value + delta);
+    if (result == NULL) {
+        return -1;
+    }
+    set_slot(node, off, result);
+    Py_DECREF(result);
+    return 0;
+}
+
+static int
+add_to_attribute(PyObject *tree, PyObject *name, Py_ssize_t delta)
+{
+    PyObject *value = PyObject_GetAttr(tree, name);
+    if (value == NULL) {
+        return -1;
+    }
+    Py_ssize_t number = PyLong_AsSsize_t(value);
+    Py_DECREF(value);
+    if (number == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    value = PyLong_FromSsize_t(number + delta);
+    if (value == NULL) {
+        return -1;
+    }
+    int status = PyObject_SetAttr(tree, name, value);
+    Py_DECREF(value);
+    return status;
+}
+
+/* node.size = node.left.size + node.right.size + node.count, and the same for distinct */
+static int
+recompute_sizes(module_state *st, PyObject *node)
+{
+    Py_ssize_t size = PyLong_AsSsize_t(GET(LEFT(node), st->off_size)) + PyLong_AsSsize_t(GET(RIGHT(node), st->off_size)) +
+                      PyLong_AsSsize_t(COUNT(node));
+    Py_ssize_t distinct =
+        PyLong_AsSsize_t(GET(LEFT(node), st->off_distinct)) + PyLong_AsSsize_t(GET(RIGHT(node), st->off_distinct)) + 1;
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+    PyObject *size_object = PyLong_FromSsize_t(size);
+    PyObject *distinct_object = PyLong_FromSsize_t(distinct);
+    if (size_object == NULL || distinct_object == NULL) {
+        Py_XDECREF(size_object);
+        Py_XDECREF(distinct_object);
+        return -1;
+    }
+    set_slot(node, st->off_size, size_object);
+    set_slot(node, st->off_distinct, distinct_object);
+    Py_DECREF(size_object);
+    Py_DECREF(distinct_object);
+    return 0;
+}
+
+static int
+update_sizes(module_state *st, PyObject *node, Py_ssize_t count, Py_ssize_t distinct)
+{
+    while (node != st->nil) {
+        if (add_to_slot(node, st->off_size, count) < 0 || add_to_slot(node, st->off_distinct, distinct) < 0) {
+            return -1;
+        }
+        node = PARENT(node);
+    }
+    return 0;
+}
+
+static PyObject *
+tree_minimum(module_state *st, PyObject *node)
+{
+    while (LEFT(node) != st->nil) {
+        node = LEFT(node);
+    }
+    return node;
+}
+
+static PyObject *
+tree_maximum(module_state *st, PyObject *node)
+{
+    while (RIGHT(node) != st->nil) {
+        node = RIGHT(node);
+    }
+    return node;
+}
+
+/* Returns the node following node in order, or NIL, see MultiRedBlackTree._successor. */
+static PyObject *
+next_node(module_state *st, PyObject *node)
+{
+    if (RIGHT(node) != st->nil) {
+        return tree_minimum(st, RIGHT(node));
+    }
+    PyObject *parent = PARENT(node);
+    while (parent != st->nil && node == RIGHT(parent)) {
+        node = parent;
+        parent = PARENT(parent);
+    }
+    return parent;
+}
+
+/* Returns the node preceding node in order, or NIL, see MultiRedBlackTree._predecessor. */
+static PyObject *
+previous_node(module_state *st, PyObject *node)
+{
+    if (LEFT(node) != st->nil) {
+        return tree_maximum(st, LEFT(node));
+    }
+    PyObject *parent = PARENT(node);
+    while (parent != st->nil && node == LEFT(parent)) {
+        node = parent;
+        parent = PARENT(parent);
+    }
+    return parent;
+}
+
+/* Returns 1 if node is the cached minimum (or maximum) node of the tree, 0 if not and -1 on error. */
+static int
+is_extreme(module_state *st, PyObject *tree, int maximum, PyObject *node)
+{
+    PyObject *extreme = PyObject_GetAttr(tree, maximum ? st->str_max_node : st->str_min_node);
+    if (extreme == NULL) {
+        return -1;
+    }
+    Py_DECREF(extreme);
+    return extreme == node;
+}
+
+/* Caches node as the minimum (or maximum) node of the tree and its value, see MultiRedBlackTree._set_extremes. */
+static int
+set_extreme(module_state *st, PyObject *tree, int maximum, PyObject *node)
+{
+    if (PyObject_SetAttr(tree, maximum ? st->str_max_node : st->str_min_node, node) < 0) {
+        return -1;
+    }
+    return PyObject_SetAttr(tree, maximum ? st->str_max_element : st->str_min_element, VALUE(node));
+}
+
+/* Replaces the child of node's parent (or the root) by child. */
+static int
+replace_child(module_state *st, PyObject *tree, PyObject *node, PyObject *child)
+{
+    PyObject *parent = PARENT(node);
+    if (parent == st->nil) {
+        return PyObject_SetAttr(tree, st->str_root, child);
+    }
+    if (node == LEFT(parent)) {
+        SET_LEFT(parent, child);
+    }
+    else {
+        SET_RIGHT(parent, child);
+    }
+    return 0;
+}
+
+static int
+left_rotate(module_state *st, PyObject *tree, PyObject *node)
+{
+    if (node == st->nil) {
+        return 0;
+    }
+    PyObject *right = RIGHT(node);
+    /* both nodes are briefly referenced only by the local variables */
+    Py_INCREF(node);
+    Py_INCREF(right);
+
+    SET_RIGHT(node, LEFT(right));
+    if (LEFT(right) != st->nil) {
+        SET_PARENT(LEFT(right), node);
+    }
+    SET_PARENT(right, PARENT(node));
+    int status = replace_child(st, tree, node, right);
+    if (status == 0) {
+        SET_LEFT(right, node);
+        SET_PARENT(node, right);
+        set_slot(right, st->off_size, GET(node, st->off_size));
+        set_slot(right, st->off_distinct, GET(node, st->off_distinct));
+        status = recompute_sizes(st, node);
+    }
+
+    Py_DECREF(right);
+    Py_DECREF(node);
+    return status;
+}
+
+static int
+right_rotate(module_state *st, PyObject *tree, PyObject *node)
+{
+    if (node == st->nil) {
+        return 0;
+    }
+    PyObject *left = LEFT(node);
+    Py_INCREF(node);
+    Py_INCREF(left);
+
+    SET_LEFT(node, RIGHT(left));
+    if (RIGHT(left) != st->nil) {
+        SET_PARENT(RIGHT(left), node);
+    }
+    SET_PARENT(left, PARENT(node));
+    int status = replace_child(st, tree, node, left);
+    if (status == 0) {
+        SET_RIGHT(left, node);
+        SET_PARENT(node, left);
+        set_slot(left, st->off_size, GET(node, st->off_size));
+        set_slot(left, st->off_distinct, GET(node, st->off_distinct));
+        status = recompute_sizes(st, node);
+    }
+
+    Py_DECREF(left);
+    Py_DECREF(node);
+    return status;
+}
+
+/* Returns 1 if the black height of the tree grew, 0 if not and -1 on error. */
+static int
+insert_fixup(module_state *st, PyObject *tree, PyObject *node)
+{
+    while (COLOR(PARENT(node)) == RED) {
+        PyObject *parent = PARENT(node);
+        PyObject *grandparent = PARENT(parent);
+        if (parent == LEFT(grandparent)) {
+            PyObject *uncle = RIGHT(grandparent);
+            if (uncle != st->nil && COLOR(uncle) == RED) {
+                /* case 1: uncle is red */
+                SET_COLOR(parent, BLACK);
+                SET_COLOR(uncle, BLACK);
+                SET_COLOR(grandparent, RED);
+                node = grandparent;
+            }
+            else {
+                if (node == RIGHT(parent)) {
+                    /* case 2: uncle is black and node is a right child */
+                    node = parent;
+                    if (left_rotate(st, tree, node) < 0) {
+                        return -1;
+                    }
+                }
+                /* case 3: uncle is black and node is a left child */
+                SET_COLOR(PARENT(node), BLACK);
+                SET_COLOR(PARENT(PARENT(node)), RED);
+                if (right_rotate(st, tree, PARENT(PARENT(node))) < 0) {
+                    return -1;
+                }
+            }
+        }
+        else {
+            PyObject *uncle = LEFT(grandparent);
+            if (uncle != st->nil && COLOR(uncle) == RED) {
+                SET_COLOR(parent, BLACK);
+                SET_COLOR(uncle, BLACK);
+                SET_COLOR(grandparent, RED);
+                node = grandparent;
+            }
+            else {
+                if (node == LEFT(parent)) {
+                    node = parent;
+                    if (right_rotate(st, tree, node) < 0) {
+                        return -1;
+                    }
+                }
+                SET_COLOR(PARENT(node), BLACK);
+                SET_COLOR(PARENT(PARENT(node)), RED);
+                if (left_rotate(st, tree, PARENT(PARENT(node))) < 0) {
+                    return -1;
+                }
+            }
+        }
+    }
+
+    PyObject *root = PyObject_GetAttr(tree, st->str_root);
+    if (root == NULL) {
+        return -1;
+    }
+    int grew = COLOR(root) == RED;
+    if (root != st->nil) {
+        SET_COLOR(root, BLACK);
+    }
+    Py_DECREF(root);
+    return grew;
+}
+
+/* Returns a borrowed reference to the root, the tree keeps it alive. */
+static PyObject *
+get_root(module_state *st, PyObject *tree)
+{
+    PyObject *root = PyObject_GetAttr(tree, st->str_root);
+    Py_XDECREF(root);
+    return root;
+}
+
+static int
+delete_fixup(module_state *st, PyObject *tree, PyObject *node, PyObject *parent)
+{
+    PyObject *root;
+    while ((root = get_root(st, tree)) != NULL && node != root && COLOR(node) == BLACK) {
+        if (node == LEFT(parent)) {
+            PyObject *sibling = RIGHT(parent);
+            if (COLOR(sibling) == RED) {
+                /* case 1: sibling is red */
+                SET_COLOR(sibling, BLACK);
+                SET_COLOR(parent, RED);
+                if (left_rotate(st, tree, parent) < 0) {
+                    return -1;
+                }
+                sibling = RIGHT(parent);
+            }
+            if (COLOR(LEFT(sibling)) == BLACK && COLOR(RIGHT(sibling)) == BLACK) {
+                /* case 2: sibling is black and both its children are black */
+                SET_COLOR(sibling, RED);
+                node = parent;
+                parent = PARENT(node);
+            }
+            else {
+                if (COLOR(RIGHT(sibling)) == BLACK) {
+                    /* case 3: sibling is black, its left child is red and its right child is black */
+                    SET_COLOR(LEFT(sibling), BLACK);
+                    SET_COLOR(sibling, RED);
+                    if (right_rotate(st, tree, sibling) < 0) {
+                        return -1;
+                    }
+                    sibling = RIGHT(parent);
+                }
+                /* case 4: sibling is black and its right child is red */
+                SET_COLOR(sibling, COLOR(parent));
+                SET_COLOR(parent, BLACK);
+                SET_COLOR(RIGHT(sibling), BLACK);
+                if (left_rotate(st, tree, parent) < 0) {
+                    return -1;
+                }
+                node = get_root(st, tree);
+                if (node == NULL) {
+                    return -1;
+                }
+            }
+        }
+        else {
+            PyObject *sibling = LEFT(parent);
+            if (COLOR(sibling) == RED) {
+                SET_COLOR(sibling, BLACK);
+                SET_COLOR(parent, RED);
+                if (right_rotate(st, tree, parent) < 0) {
+                    return -1;
+                }
+                sibling = LEFT(parent);
+            }
+            if (COLOR(RIGHT(sibling)) == BLACK && COLOR(LEFT(sibling)) == BLACK) {
+                SET_COLOR(sibling, RED);
+                node = parent;
+                parent = PARENT(node);
+            }
+            else {
+                if (COLOR(LEFT(sibling)) == BLACK) {
+                    SET_COLOR(RIGHT(sibling), BLACK);
+                    SET_COLOR(sibling, RED);
+                    if (left_rotate(st, tree, sibling) < 0) {
+                        return -1;
+                    }
+                    sibling = LEFT(parent);
+                }
+                SET_COLOR(sibling, COLOR(parent));
+                SET_COLOR(parent, BLACK);
+                SET_COLOR(LEFT(sibling), BLACK);
+                if (right_rotate(st, tree, parent) < 0) {
+                    return -1;
+                }
+                node = get_root(st, tree);
+                if (node == NULL) {
+                    return -1;
+                }
+            }
+        }
+    }
+    if (root == NULL) {
+        return -1;
+    }
+
+    if (node != st->nil) {
+        SET_COLOR(node, BLACK);
+    }
+    return 0;
+}
+
+/* Returns a new reference to the inserted node, see MultiRedBlackTree._insert_node. */
+static PyObject *
+insert_node(module_state *st, PyObject *tree, PyObject *parent, PyObject *value, PyObject *count, PyObject *key)
+{
+    Py_ssize_t count_value = PyLong_AsSsize_t(count);
+    if (count_value == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (add_to_attribute(tree, st->str_size, 1) < 0 || add_to_attribute(tree, st->str_length, count_value) < 0) {
+        return NULL;
+    }
+
+    PyObject *node_class = PyObject_GetAttr(tree, st->str_node);
+    if (node_class == NULL) {
+        return NULL;
+    }
+    PyObject *node = PyObject_CallFunctionObjArgs(node_class, value, RED, count, key, NULL);
+    Py_DECREF(node_class);
+    if (node == NULL) {
+        return NULL;
+    }
+    SET_PARENT(node, parent);
+
+    /* a new leaf is the minimum (maximum) exactly if its parent was */
+    if (parent == st->nil) {
+        if (PyObject_SetAttr(tree, st->str_root, node) < 0 || set_extreme(st, tree, 0, node) < 0 ||
+            set_extreme(st, tree, 1, node) < 0) {
+            goto error;
+        }
+    }
+    else {
+        int smaller = compare(KEY(node), KEY(parent), Py_LT);
+        if (smaller < 0) {
+            goto error;
+        }
+        if (smaller) {
+            SET_LEFT(parent, node);
+        }
+        else {
+            SET_RIGHT(parent, node);
+        }
+        int extreme = is_extreme(st, tree, !smaller, parent);
+        if (extreme < 0 || (extreme && set_extreme(st, tree, !smaller, node) < 0)) {
+            goto error;
+        }
+    }
+
+    SET_LEFT(node, st->nil);
+    SET_RIGHT(node, st->nil);
+    if (update_sizes(st, parent, count_value, 1) < 0 || insert_fixup(st, tree, node) < 0) {
+        goto error;
+    }
+    return node;
+
+error:
+    Py_DECREF(node);
+    return NULL;
+}
+
+static int
+remove_node(module_state *st, PyObject *tree, PyObject *node_to_delete)
+{
+    int status = -1;
+    PyObject *successor = NULL;
+    Py_INCREF(node_to_delete);
+
+    /* the extreme nodes have at most one child and are unlinked, not moved,
+       so their neighbours found now in O(1) are still the extremes afterwards */
+    for (int maximum = 0; maximum < 2; maximum++) {
+        int extreme = is_extreme(st, tree, maximum, node_to_delete);
+        if (extreme < 0) {
+            goto done;
+        }
+        if (extreme &&
+            set_extreme(st, tree, maximum, maximum ? previous_node(st, node_to_delete) : next_node(st, node_to_delete)) < 0) {
+            goto done;
+        }
+    }
+
+    if (add_to_attribute(tree, st->str_size, -1) < 0) {
+        goto done;
+    }
+    PyObject *size = PyObject_GetAttr(tree, st->str_size);
+    if (size == NULL) {
+        goto done;
+    }
+    Py_ssize_t remaining = PyLong_AsSsize_t(size);
+    Py_DECREF(size);
+    if (remaining == -1 && PyErr_Occurred()) {
+        goto done;
+    }
+    if (remaining == 0) {
+        status = PyObject_SetAttr(tree, st->str_root, st->nil);
+        goto done;
+    }
+
+    PyObject *original_color = COLOR(node_to_delete);
+    PyObject *child, *child_parent;
+    if (LEFT(node_to_delete) == st->nil) {
+        /* node has no left child */
+        child = RIGHT(node_to_delete);
+        child_parent = PARENT(node_to_delete);
+        if (replace_child(st, tree, node_to_delete, child) < 0) {
+            goto done;
+        }
+        if (child != st->nil) {
+            SET_PARENT(child, PARENT(node_to_delete));
+        }
+    }
+    else if (RIGHT(node_to_delete) == st->nil) {
+        /* node has no right child */
+        child = LEFT(node_to_delete);
+        child_parent = PARENT(node_to_delete);
+        if (replace_child(st, tree, node_to_delete, child) < 0) {
+            goto done;
+        }
+        if (child != st->nil) {
+            SET_PARENT(child, PARENT(node_to_delete));
+        }
+    }
+    else {
+        /* node has two children */
+        successor = tree_minimum(st, RIGHT(node_to_delete));
+        Py_INCREF(successor);
+        original_color = COLOR(successor);
+        child = RIGHT(successor);
+        if (PARENT(successor) == node_to_delete) {
+            child_parent = successor;
+        }
+        else {
+            child_parent = PARENT(successor);
+            if (replace_child(st, tree, successor, child) < 0) {
+                goto done;
+            }
+            if (child != st->nil) {
+                SET_PARENT(child, PARENT(successor));
+            }
+            SET_RIGHT(successor, RIGHT(node_to_delete));
+            SET_PARENT(RIGHT(successor), successor);
+        }
+        if (replace_child(st, tree, node_to_delete, successor) < 0) {
+            goto done;
+        }
+        SET_PARENT(successor, PARENT(node_to_delete));
+        SET_LEFT(successor, LEFT(node_to_delete));
+        SET_PARENT(LEFT(successor), successor);
+        SET_COLOR(successor, COLOR(node_to_delete));
+    }
+
+    /* recompute the subtree sizes on the path from the lowest changed node */
+    for (PyObject *node = child_parent; node != st->nil; node = PARENT(node)) {
+        if (recompute_sizes(st, node) < 0) {
+            goto done;
+        }
+    }
+
+    if (original_color == BLACK && delete_fixup(st, tree, child, child_parent) < 0) {
+        goto done;
+    }
+
+    status = 0;
+
+done:
+    Py_XDECREF(successor);
+    Py_DECREF(node_to_delete);
+    return status;
+}
+
+/* Returns a borrowed reference to the node holding value, NULL with no error if not found. */
+static PyObject *
+find_node(module_state *st, PyObject *tree, PyObject *value)
+{
+    PyObject *root = PyObject_GetAttr(tree, st->str_root);
+    if (root == NULL) {
+        return NULL;
+    }
+    Py_DECREF(root);
+
+    PyObject *node = root;
+    while (node != st->nil) {
+        int equal = compare(KEY(node), value, Py_EQ);
+        if (equal < 0) {
+            return NULL;
+        }
+        if (equal) {
+            return node;
+        }
+        int greater = compare(KEY(node), value, Py_GT);
+        if (greater < 0) {
+            return NULL;
+        }
+        node = greater ? LEFT(node) : RIGHT(node);
+    }
+    return NULL;
+}
+
+/* Removes one occurrence of the value of a node, see MultiRedBlackTree.remove. */
+static int
+remove_one(module_state *st, PyObject *tree, PyObject *node)
+{
+    if (add_to_attribute(tree, st->str_length, -1) < 0) {
+        return -1;
+    }
+    Py_ssize_t count = PyLong_AsSsize_t(COUNT(node));
+    if (count == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    if (count > 1) {
+        return add_to_slot(node, st->off_count, -1) < 0 || update_sizes(st, node, -1, 0) < 0 ? -1 : 0;
+    }
+    return remove_node(st, tree, node);
+}
+
+/* Returns a new reference to the removed minimum (or maximum), see MultiRedBlackTree.pop_min. */
+static PyObject *
+pop_extreme(module_state *st, PyObject *tree, int maximum)
+{
+    PyObject *node = PyObject_GetAttr(tree, maximum ? st->str_max_node : st->str_min_node);
+    if (node == NULL) {
+        return NULL;
+    }
+    if (node == st->nil) {
+        Py_DECREF(node);
+        PyErr_SetString(PyExc_IndexError, "pop from an empty tree");
+        return NULL;
+    }
+    PyObject *value = Py_NewRef(VALUE(node));
+    int status = remove_one(st, tree, node);
+    Py_DECREF(node);
+    if (status < 0) {
+        Py_DECREF(value);
+        return NULL;
+    }
+    return value;
+}
+
+/* Returns 1 if the tree has a key function, 0 if not and -1 on error. */
+static int
+has_key_function(module_state *st, PyObject *tree)
+{
+    PyObject *key = PyObject_GetAttr(tree, st->str_key);
+    if (key == NULL) {
+        return -1;
+    }
+    int result = key != Py_None;
+    Py_DECREF(key);
+    return result;
+}
+
+static int
+slot_offset(PyObject *node_class, const char *name, Py_ssize_t *offset)
+{
+    PyObject *descriptor = PyObject_GetAttrString(node_class, name);
+    if (descriptor == NULL) {
+        return -1;
+    }
+    if (!Py_IS_TYPE(descriptor, &PyMemberDescr_Type) ||
+        ((PyMemberDescrObject *)descriptor)->d_member->type != T_OBJECT_EX) {
+        Py_DECREF(descriptor);
+        PyErr_Format(PyExc_TypeError, "Node.%s is not a slot", name);
+        return -1;
+    }
+    *offset = ((PyMemberDescrObject *)descriptor)->d_member->offset;
+    Py_DECREF(descriptor);
+    return 0;
+}
+
+/* Returns 1 if a node class has the slots at the offsets the accelerator was installed for, 0 if not and -1 on
+   error. The class must be the Node class of MultiRedBlackTree or a subclass of it not redefining its slots,
+   since CPython sorts the slots of a class and a Node with a different set of slots has a different layout. */
+static int
+check_node_type(module_state *st, PyObject *node_class)
+{
+    if (node_class == (PyObject *)st->node_type) {
+        return 1;
+    }
+    if (!PyType_Check(node_class)) {
+        return 0;
+    }
+    PyObject *known = PyDict_GetItemWithError(st->node_layouts, node_class);
+    if (known != NULL) {
+        return known == Py_True;
+    }
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+
+    int matches = PyType_IsSubtype((PyTypeObject *)node_class, st->node_type);
+    if (matches) {
+        const char *names[] = {"value", "key", "count", "color", "left", "right", "parent", "size", "distinct"};
+        Py_ssize_t offsets[] = {st->off_value, st->off_key,    st->off_count, st->off_color,   st->off_left,
+                                st->off_right, st->off_parent, st->off_size,  st->off_distinct};
+        for (size_t i = 0; matches && i < sizeof(names) / sizeof(names[0]); i++) {
+            Py_ssize_t offset;
+            if (slot_offset(node_class, names[i], &offset) < 0) {
+                if (!PyErr_ExceptionMatches(PyExc_TypeError) && !PyErr_ExceptionMatches(PyExc_AttributeError)) {
+                    return -1;
+                }
+                PyErr_Clear();
+                offset = -1;
+            }
+            matches = offset == offsets[i];
+        }
+    }
+    if (PyDict_SetItem(st->node_layouts, node_class, matches ? Py_True : Py_False) < 0) {
+        return -1;
+    }
+    return matches;
+}
+
+/* Returns 1 if the accelerator can work on the nodes of a tree, 0 if the Python methods must be used instead
+   and -1 on error: the nodes of the tree must have the layout checked by check_node_type, with the NIL sentinel
+   of MultiRedBlackTree. */
+static int
+native_tree(module_state *st, PyObject *tree)
+{
+    PyObject *nil = PyObject_GetAttr(tree, st->str_nil);
+    if (nil == NULL) {
+        return -1;
+    }
+    Py_DECREF(nil);
+    if (nil != st->nil) {
+        return 0;
+    }
+    PyObject *node_class = PyObject_GetAttr(tree, st->str_node);
+    if (node_class == NULL) {
+        return -1;
+    }
+    int native = check_node_type(st, node_class);
+    Py_DECREF(node_class);
+    return native;
+}
+
+/* Calls the Python method the accelerator replaces, with the arguments of the accelerated one. */
+static PyObject *
+call_python(module_state *st, const char *name, PyObject *const *args, Py_ssize_t nargs)
+{
+    PyObject *method = PyDict_GetItemString(st->python_methods, name);
+    if (method == NULL) {
+        PyErr_Format(PyExc_KeyError, "no Python method %s", name);
+        return NULL;
+    }
+    return PyObject_Vectorcall(method, args, nargs, NULL);
+}
+
+/* Returns 1 if a function got between min and max positional arguments, raises TypeError otherwise. */
+static int
+check_arguments(const char *name, Py_ssize_t nargs, Py_ssize_t min, Py_ssize_t max)
+{
+    if (nargs < min || nargs > max) {
+        PyErr_Format(PyExc_TypeError, "%s() takes from %zd to %zd positional arguments but %zd were given", name,
+                     min, max, nargs);
+        return 0;
+    }
+    return 1;
+}
+
+/* Checks the arguments of a method and falls back to its Python version for trees the accelerator cannot work
+   on, returning from the calling function. st and native are declared by the macro. */
+#define ENTER(name, min, max)                                                                                         \
+    if (!check_arguments(name, nargs, min, max)) {                                                                    \
+        return NULL;                                                                                                  \
+    }                                                                                                                 \
+    module_state *st = get_state(module);                                                                             \
+    int native = native_tree(st, args[0]);                                                                            \
+    if (native <= 0) {                                                                                                \
+        return native < 0 ? NULL : call_python(st, name, args, nargs);                                                \
+    }
+
+/* methods, installed on MultiRedBlackTree */
+
+static PyObject *
+tree_find(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_find", 2, 2);
+    int keyed = has_key_function(st, args[0]);
+    if (keyed < 0) {
+        return NULL;
+    }
+    if (keyed) {
+        return call_python(st, "_find", args, nargs);
+    }
+    PyObject *node = find_node(st, args[0], args[1]);
+    if (node == NULL) {
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+        Py_RETURN_NONE;
+    }
+    return Py_NewRef(node);
+}
+
+static PyObject *
+tree_add(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_add", 2, 2);
+    PyObject *tree = args[0], *value = args[1];
+    int keyed = has_key_function(st, tree);
+    if (keyed < 0) {
+        return NULL;
+    }
+    if (keyed) {
+        return call_python(st, "_add", args, nargs);
+    }
+
+    PyObject *root = PyObject_GetAttr(tree, st->str_root);
+    if (root == NULL) {
+        return NULL;
+    }
+    Py_DECREF(root);
+
+    /* find the place to insert the new node */
+    PyObject *node = root, *parent = st->nil;
+    while (node != st->nil) {
+        parent = node;
+        int equal = compare(KEY(node), value, Py_EQ);
+        if (equal < 0) {
+            return NULL;
+        }
+        if (equal) {
+            PyObject *one = PyLong_FromLong(1);
+            PyObject *result = PyObject_CallMethodObjArgs(tree, st->str_add_count, node, one, NULL);
+            Py_DECREF(one);
+            if (result == NULL) {
+                return NULL;
+            }
+            Py_DECREF(result);
+            Py_RETURN_FALSE;
+        }
+        int greater = compare(KEY(node), value, Py_GT);
+        if (greater < 0) {
+            return NULL;
+        }
+        node = greater ? LEFT(node) : RIGHT(node);
+    }
+
+    PyObject *one = PyLong_FromLong(1);
+    PyObject *new_node = insert_node(st, tree, parent, value, one, value);
+    Py_DECREF(one);
+    if (new_node == NULL) {
+        return NULL;
+    }
+    Py_DECREF(new_node);
+    Py_RETURN_TRUE;
+}
+
+static PyObject *
+tree_insert_node(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_insert_node", 4, 5);
+    return insert_node(st, args[0], args[1], args[2], args[3], nargs == 5 ? args[4] : Py_None);
+}
+
+static PyObject *
+tree_remove(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("remove", 2, 2);
+    PyObject *tree = args[0];
+    int keyed = has_key_function(st, tree);
+    if (keyed < 0) {
+        return NULL;
+    }
+
+    PyObject *node;
+    if (keyed) {
+        node = call_python(st, "_find", args, nargs);
+        if (node == NULL) {
+            return NULL;
+        }
+        Py_DECREF(node); /* the tree keeps it alive */
+        if (node == Py_None) {
+            node = NULL;
+        }
+    }
+    else {
+        node = find_node(st, tree, args[1]);
+        if (node == NULL && PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    if (node == NULL) {
+        PyErr_SetString(PyExc_ValueError, "Value not found in tree");
+        return NULL;
+    }
+    if (remove_one(st, tree, node) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+tree_pop_min(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("pop_min", 1, 1);
+    return pop_extreme(st, args[0], 0);
+}
+
+static PyObject *
+tree_pop_max(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("pop_max", 1, 1);
+    return pop_extreme(st, args[0], 1);
+}
+
+static PyObject *
+tree_remove_node(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_remove_node", 2, 2);
+    if (remove_node(st, args[0], args[1]) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+tree_insert_fixup(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_rb_insert_fixup", 2, 2);
+    int grew = insert_fixup(st, args[0], args[1]);
+    if (grew < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(grew);
+}
+
+static PyObject *
+tree_delete_fixup(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ENTER("_rb_delete_fixup", 3, 3);
+    if (delete_fixup(st, args[0], args[1], args[2]) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef tree_methods[] = {
+    {"_find", (PyCFunction)(void (*)(void))tree_find, METH_FASTCALL, NULL},
+    {"_add", (PyCFunction)(void (*)(void))tree_add, METH_FASTCALL, NULL},
+    {"_insert_node", (PyCFunction)(void (*)(void))tree_insert_node, METH_FASTCALL, NULL},
+    {"remove", (PyCFunction)(void (*)(void))tree_remove, METH_FASTCALL, NULL},
+    {"_remove_node", (PyCFunction)(void (*)(void))tree_remove_node, METH_FASTCALL, NULL},
+    {"pop_min", (PyCFunction)(void (*)(void))tree_pop_min, METH_FASTCALL, NULL},
+    {"pop_max", (PyCFunction)(void (*)(void))tree_pop_max, METH_FASTCALL, NULL},
+    {"_rb_insert_fixup", (PyCFunction)(void (*)(void))tree_insert_fixup, METH_FASTCALL, NULL},
+    {"_rb_delete_fixup", (PyCFunction)(void (*)(void))tree_delete_fixup, METH_FASTCALL, NULL},
+    {NULL, NULL, 0, NULL},
+};
+
+static PyObject *
+install(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (!check_arguments("install", nargs, 2, 2)) {
+        return NULL;
+    }
+    PyObject *tree_class = args[0], *python_methods = args[1];
+    module_state *st = get_state(module);
+
+    for (PyMethodDef *def = tree_methods; def->ml_name != NULL; def++) {
+        PyObject *method = PyMapping_GetItemString(python_methods, def->ml_name);
+        if (method == NULL) {
+            return NULL;
+        }
+        Py_DECREF(method);
+    }
+    PyObject *node_class = PyObject_GetAttrString(tree_class, "Node");
+    if (node_class == NULL) {
+        return NULL;
+    }
+    if (!PyType_Check(node_class)) {
+        Py_DECREF(node_class);
+        PyErr_SetString(PyExc_TypeError, "Node is not a class");
+        return NULL;
+    }
+    int status = slot_offset(node_class, "value", &st->off_value) | slot_offset(node_class, "key", &st->off_key) |
+                 slot_offset(node_class, "count", &st->off_count) |
+                 slot_offset(node_class, "color", &st->off_color) | slot_offset(node_class, "left", &st->off_left) |
+                 slot_offset(node_class, "right", &st->off_right) |
+                 slot_offset(node_class, "parent", &st->off_parent) |
+                 slot_offset(node_class, "size", &st->off_size) |
+                 slot_offset(node_class, "distinct", &st->off_distinct);
+    if (status < 0 || PyErr_Occurred()) {
+        Py_DECREF(node_class);
+        return NULL;
+    }
+    Py_XSETREF(st->node_type, (PyTypeObject *)node_class);
+    PyDict_Clear(st->node_layouts);
+
+    Py_XSETREF(st->nil, PyObject_GetAttrString(tree_class, "NIL"));
+    if (st->nil == NULL) {
+        return NULL;
+    }
+    Py_XSETREF(st->python_methods, PyDict_New());
+    if (st->python_methods == NULL || PyDict_Update(st->python_methods, python_methods) < 0) {
+        return NULL;
+    }
+
+    /* wrap the functions so that they bind to the tree like methods defined in Python */
+    PyObject *methods = PyDict_New();
+    if (methods == NULL) {
+        return NULL;
+    }
+    for (PyMethodDef *def = tree_methods; def->ml_name != NULL; def++) {
+        PyObject *function = PyCFunction_New(def, module);
+        PyObject *method = function == NULL ? NULL : PyInstanceMethod_New(function);
+        Py_XDECREF(function);
+        if (method == NULL || PyDict_SetItemString(methods, def->ml_name, method) < 0) {
+            Py_XDECREF(method);
+            Py_DECREF(methods);
+            return NULL;
+        }
+        Py_DECREF(method);
+    }
+    return methods;
+}
+
+static PyMethodDef module_methods[] = {
+    {"install", (PyCFunction)(void (*)(void))install, METH_FASTCALL,
+     "install(tree_class, python_methods)\n--\n\n"
+     "Prepares the accelerator for the nodes of tree_class and returns its methods by name.\n"
+     "python_methods maps the name of each method to the Python method it replaces, which is called instead\n"
+     "for trees with a key function or with nodes of another layout."},
+    {NULL, NULL, 0, NULL},
+};
+
+static int
+module_exec(PyObject *module)
+{
+    module_state *st = get_state(module);
+    st->node_layouts = PyDict_New();
+    st->str_root = PyUnicode_InternFromString("_root");
+    st->str_size = PyUnicode_InternFromString("_size");
+    st->str_length = PyUnicode_InternFromString("_length");
+    st->str_min_element = PyUnicode_InternFromString("_min_element");
+    st->str_max_element = PyUnicode_InternFromString("_max_element");
+    st->str_min_node = PyUnicode_InternFromString("_min_node");
+    st->str_max_node = PyUnicode_InternFromString("_max_node");
+    st->str_key = PyUnicode_InternFromString("_key");
+    st->str_node = PyUnicode_InternFromString("Node");
+    st->str_nil = PyUnicode_InternFromString("NIL");
+    st->str_add_count = PyUnicode_InternFromString("_add_count");
+    if (st->node_layouts == NULL || st->str_root == NULL || st->str_size == NULL || st->str_length == NULL ||
+        st->str_min_element == NULL || st->str_max_element == NULL || st->str_min_node == NULL ||
+        st->str_max_node == NULL || st->str_key == NULL || st->str_node == NULL || st->str_nil == NULL ||
+        st->str_add_count == NULL) {
+        return -1;
+    }
+    return 0;
+}
+
+static int
+module_traverse(PyObject *module, visitproc visit, void *arg)
+{
+    module_state *st = get_state(module);
+    Py_VISIT(st->node_type);
+    Py_VISIT(st->nil);
+    Py_VISIT(st->python_methods);
+    Py_VISIT(st->node_layouts);
+    return 0;
+}
+
+static int
+module_clear(PyObject *module)
+{
+    module_state *st = get_state(module);
+    Py_CLEAR(st->node_type);
+    Py_CLEAR(st->nil);
+    Py_CLEAR(st->python_methods);
+    Py_CLEAR(st->node_layouts);
+    Py_CLEAR(st->str_root);
+    Py_CLEAR(st->str_size);
+    Py_CLEAR(st->str_length);
+    Py_CLEAR(st->str_min_element);
+    Py_CLEAR(st->str_max_element);
+    Py_CLEAR(st->str_min_node);
+    Py_CLEAR(st->str_max_node);
+    Py_CLEAR(st->str_key);
+    Py_CLEAR(st->str_node);
+    Py_CLEAR(st->str_nil);
+    Py_CLEAR(st->str_add_count);
+    return 0;
+}
+
+static void
+module_free(void *module)
+{
+    module_clear((PyObject *)module);
+}
+
+static PyModuleDef_Slot module_slots[] = {
+    {Py_mod_exec, module_exec},
+#if PY_VERSION_HEX >= 0x030C0000
+    {Py_mod_multiple_interpreters, Py_MOD_PER_INTERPRETER_GIL_SUPPORTED},
+#endif
+#if PY_VERSION_HEX >= 0x030D0000
+    /* the trees are walked through borrowed references without locking, see MultiRedBlackTree.FREE_THREADED */
+    {Py_mod_gil, Py_MOD_GIL_USED},
+#endif
+    {0, NULL},
+};
+
+static struct PyModuleDef module_definition = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "Tree._accelerator",
+    .m_doc = "C implementation of the red-black core of MultiRedBlackTree.",
+    .m_size = sizeof(module_state),
+    .m_methods = module_methods,
+    .m_slots = module_slots,
+    .m_traverse = module_traverse,
+    .m_clear = module_clear,
+    .m_free = module_free,
+};
+
+PyMODINIT_FUNC
+PyInit__accelerator(void)
+{
+    return PyModuleDef_Init(&module_definition);
+}
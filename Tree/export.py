@@ -0,0 +1,198 @@
+"""
+Export of the shape of a tree to a DOT or JSON file, for inspecting large trees offline.
+The nodes are visited with an explicit stack and written one at a time, so neither the recursion limit
+nor the memory of an in-memory graph bounds the size of the tree, and no viewer is ever opened.
+Only the standard library is needed, the DOT file can be rendered later with graphviz.
+"""
+
+import json
+
+FORMATS = ("dot", "json")
+
+
+class NodeAccess:
+    """
+    Reads the nodes of a tree of node objects with value, count, key, left and right attributes.
+    Trees whose nodes are not objects provide their own accessor with the same methods from _node_access(),
+    like ArrayRedBlackTree whose nodes are indices into arrays.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.nil = getattr(tree, "NIL", None)
+
+    def root(self):
+        return self.tree._root
+
+    def left(self, node):
+        return node.left
+
+    def right(self, node):
+        return node.right
+
+    def key(self, node):
+        return node.key
+
+    def value(self, node):
+        return node.value
+
+    def count(self, node):
+        return node.count
+
+    def color(self, node):
+        """
+        Returns "red", "black", or None for trees without colors.
+        """
+        color = getattr(node, "color", None)
+        if color is None:
+            return None
+        return "black" if color else "red"
+
+    def below(self, node):
+        """
+        Returns the number of nodes below a node, or None if the nodes do not keep it.
+        """
+        distinct = getattr(node, "distinct", None)
+        return None if distinct is None else distinct - 1
+
+
+def _walk(tree, access, max_depth, around, radius):
+    """
+    Yields (node, id, parent id, side, depth, hidden) for the exported nodes in preorder.
+    side is "left", "right" or None for the root of the export, depth is relative to it,
+    and hidden is True for a node at the depth cap whose children are not exported.
+    Parameters:
+        tree: The tree.
+        access: The NodeAccess reading its nodes.
+        max_depth: The depth of the deepest exported nodes, or None for no cap.
+        around: If not None, only the part of the tree around the node with this key is exported.
+        radius: The number of levels above the node with the key where the export starts.
+    """
+    nil = access.nil
+    left, right = access.left, access.right
+    root = access.root()
+    if root is nil:
+        return
+
+    if around is not None:
+        # the search path of the key, the export starts radius levels above its last node
+        path = []
+        node = root
+        while node is not nil:
+            path.append(node)
+            key = access.key(node)
+            if key == around:
+                break
+            node = left(node) if around < key else right(node)
+        root = path[max(0, len(path) - 1 - radius)]
+
+    next_id = 0
+    stack = [(root, None, None, 0)]
+    while stack:
+        node, parent_id, side, depth = stack.pop()
+        node_id = next_id
+        next_id += 1
+        left_child, right_child = left(node), right(node)
+        hidden = max_depth is not None and depth >= max_depth and (left_child is not nil or right_child is not nil)
+        yield node, node_id, parent_id, side, depth, hidden
+        if hidden:
+            continue
+        # the right child is pushed first so that the left subtree is written first
+        if right_child is not nil:
+            stack.append((right_child, node_id, "right", depth + 1))
+        if left_child is not nil:
+            stack.append((left_child, node_id, "left", depth + 1))
+
+
+def _dot_string(text):
+    """
+    Returns text as a quoted DOT string.
+    """
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def _write_dot(tree, access, file, nodes):
+    """
+    Writes the nodes as a DOT digraph, one statement per line.
+    """
+    file.write(f"digraph {type(tree).__name__} {{\n")
+    file.write("  node [shape=circle, fontsize=10];\n")
+    count = 0
+    for node, node_id, parent_id, side, depth, hidden in nodes:
+        value, node_count = access.value(node), access.count(node)
+        label = f"{value}\n{node_count}" if node_count != 1 else str(value)
+        color = access.color(node)
+        attributes = f"label={_dot_string(label)}" + (f", color={color}" if color else "")
+        file.write(f"  n{node_id} [{attributes}];\n")
+        if parent_id is not None:
+            file.write(f"  n{parent_id} -> n{node_id};\n")
+        if hidden:
+            below = access.below(node)
+            text = "..." if below is None else f"+{below}"
+            file.write(f"  h{node_id} [label={_dot_string(text)}, shape=plaintext];\n")
+            file.write(f"  n{node_id} -> h{node_id} [style=dashed];\n")
+        count += 1
+    file.write("}\n")
+    return count
+
+
+def _json_value(value):
+    """
+    Returns value if JSON can represent it, and its repr otherwise.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def _write_json(tree, access, file, nodes):
+    """
+    Writes the nodes as a JSON object with a list of nodes in preorder, one node per line.
+    Each node is a list: [id, parent id, side, depth, value, count, color, hidden nodes].
+    hidden nodes is 0 if all children were exported, the number of nodes not exported below it,
+    or null if the nodes do not keep the size of their subtree.
+    """
+    fields = ["id", "parent", "side", "depth", "value", "count", "color", "hidden"]
+    file.write('{"tree": ' + json.dumps(type(tree).__name__) + ', "fields": ' + json.dumps(fields))
+    file.write(', "nodes": [')
+    count = 0
+    for node, node_id, parent_id, side, depth, hidden in nodes:
+        row = [node_id, parent_id, side, depth, _json_value(access.value(node)), access.count(node), access.color(node)]
+        row.append(access.below(node) if hidden else 0)
+        file.write(("\n" if count == 0 else ",\n") + json.dumps(row))
+        count += 1
+    file.write("\n]}\n")
+    return count
+
+
+def export_tree(tree, file, format="dot", max_depth=None, around=None, radius=3):
+    """
+    Writes the shape of a tree to a file, visiting the nodes iteratively.
+    Parameters:
+        tree: A MultiRedBlackTree or MultiUnbalancedTree, or one of their subclasses.
+            If it has a _node_access() method, its nodes are read through the accessor it returns.
+        file: A path, or a text file object to write to.
+        format: "dot" for a graphviz digraph, or "json" for a list of nodes in preorder.
+        max_depth: The depth below which nodes are not exported, relative to the first exported node.
+            The nodes at that depth are marked with the number of nodes left out below them. Defaults to no cap.
+        around: If not None, only the part of the tree around this key is exported: the subtree of the node
+            radius levels above the node with the key, or above the node where the search for the key ends.
+            Defaults to the whole tree.
+        radius: The number of levels above the key where the export starts. Defaults to 3.
+            When around is given and max_depth is not, max_depth defaults to 2 * radius.
+    Returns:
+        The number of nodes written.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {', '.join(FORMATS)}")
+    if around is not None and max_depth is None:
+        max_depth = 2 * radius
+
+    node_access = getattr(tree, "_node_access", None)
+    access = NodeAccess(tree) if node_access is None else node_access()
+    write = _write_dot if format == "dot" else _write_json
+    nodes = _walk(tree, access, max_depth, around, radius)
+    if hasattr(file, "write"):
+        return write(tree, access, file, nodes)
+    with open(file, "w") as handle:
+        return write(tree, access, handle, nodes)
@@ -0,0 +1,30 @@
+import pytest
+from Tree import MultiRedBlackTree
+
+
+IMPLEMENTATIONS = ["python", "accelerated"]
+
+
+def pytest_generate_tests(metafunc):
+    """
+    Runs every test function with the pure Python methods and again with the C accelerator.
+    unittest classes cannot be parametrized, they run with the default implementation.
+    """
+    if "implementation" in metafunc.fixturenames:
+        metafunc.parametrize("implementation", IMPLEMENTATIONS, indirect=True)
+
+
+@pytest.fixture(autouse=True)
+def implementation(request):
+    """
+    Selects the implementation of the red-black core for a test, skipping it if the C accelerator is not built.
+    """
+    default = "python" if MultiRedBlackTree._accelerator is None else "accelerated"
+    accelerated = getattr(request, "param", default) == "accelerated"
+    if accelerated and MultiRedBlackTree._accelerator is None:
+        if MultiRedBlackTree.FREE_THREADED:
+            pytest.skip("the C accelerator is not loaded on free-threaded builds")
+        pytest.skip("the C accelerator is not built, run: python setup.py build_ext --inplace")
+    MultiRedBlackTree.use_accelerator(accelerated)
+    yield "accelerated" if accelerated else "python"
+    MultiRedBlackTree.use_accelerator()
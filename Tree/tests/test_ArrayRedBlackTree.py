@@ -0,0 +1,58 @@
+import io
+import json
+import pytest
+from Tree.ArrayRedBlackTree import ArrayRedBlackTree
+
+# the multiset API shared with MultiRedBlackTree is tested in test_MultiRedBlackTree.py, on both trees
+
+
+@pytest.fixture
+def filled_tree():
+    return ArrayRedBlackTree([5, 3, 7, 2, 4, 6, 8])
+
+
+def test_float_values():
+    tree = ArrayRedBlackTree([2.5, 0.5, 1.5, 0.5], typecode="d")
+    assert list(tree) == [0.5, 0.5, 1.5, 2.5]
+    assert tree.lower_bound(1.0) == 1.5
+    assert tree.count(0.5) == 2
+    assert tree.is_red_black()
+
+
+def test_free_slots_are_reused(filled_tree):
+    slots = len(filled_tree._colors)
+    filled_tree.remove(3)
+    filled_tree.remove(7)
+    filled_tree.add(10)
+    filled_tree.add(11)
+    assert len(filled_tree._colors) == slots
+    assert list(filled_tree) == [2, 4, 5, 6, 8, 10, 11]
+    assert filled_tree.is_red_black()
+
+
+def test_value_of_wrong_type(filled_tree):
+    with pytest.raises(TypeError):
+        filled_tree.add(1.5)
+    assert len(filled_tree) == 7
+    assert list(filled_tree) == [2, 3, 4, 5, 6, 7, 8]
+
+
+def test_add_returns_whether_a_node_was_created(filled_tree):
+    assert filled_tree._add(1) is True
+    assert filled_tree._add(1) is False
+    assert filled_tree.count(1) == 2
+
+
+def test_export(filled_tree):
+    file = io.StringIO()
+    assert filled_tree.export(file, format="json", max_depth=1) == 3
+    nodes = json.loads(file.getvalue())["nodes"]
+    assert [node[4] for node in nodes] == [filled_tree._values[filled_tree._root], 3, 7]
+    assert all(node[6] == "black" for node in nodes)
+    assert nodes[1][7] is None  # the number of nodes left out is unknown
+
+    file = io.StringIO()
+    assert 2 <= filled_tree.export(file, around=8, radius=1) < 7
+    assert file.getvalue().startswith("digraph ArrayRedBlackTree {")
+    assert 'label="8"' in file.getvalue()
+    assert ArrayRedBlackTree().export(io.StringIO()) == 0
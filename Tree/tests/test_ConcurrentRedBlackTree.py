@@ -0,0 +1,158 @@
+import pytest
+import random
+import threading
+from Tree.ConcurrentRedBlackTree import ConcurrentRedBlackTree, ReadWriteLock
+
+
+def run_threads(targets):
+    """
+    Runs the targets in threads and re-raises the first exception of a thread in the calling thread,
+    since an exception in a thread would only be printed.
+    """
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except BaseException as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_single_thread():
+    tree = ConcurrentRedBlackTree([5, 3, 7])
+    tree.add(4)
+    tree.add_many([1, 4])
+    tree.remove(7)
+    assert list(tree) == [1, 3, 4, 4, 5]
+    assert 4 in tree
+    assert tree.contains(5)
+    assert tree.count(4) == 2
+    assert tree.lower_bound(2) == 3
+    assert tree.upper_bound(4) == 5
+    assert tree.min() == 1
+    assert tree.max() == 5
+    assert tree.rank(4) == 2
+    assert tree.select(-1) == 5
+    assert tree.count_range(3, 5) == 3
+    assert tree.snapshot(3, 5) == [3, 4, 4]
+    assert len(tree) == 5
+    with pytest.raises(ValueError):
+        tree.remove(10)
+    assert tree.peek_min() == 1
+    assert tree.peek_max() == 5
+    assert tree.pop_min() == 1
+    assert tree.pop_max() == 5
+    assert list(tree) == [3, 4, 4]
+
+
+def test_concurrent_writers_and_readers():
+    tree = ConcurrentRedBlackTree()
+    snapshots = []
+
+    def writer(offset):
+        values = list(range(offset, 2000, 4))
+        random.shuffle(values)
+        for value in values[:200]:
+            tree.add(value)
+        tree.add_many(values[200:])
+        tree.remove_many(values[::2])
+
+    def reader():
+        for _ in range(200):
+            snapshots.append(list(tree))
+
+    run_threads([lambda offset=offset: writer(offset) for offset in range(4)] + [reader] * 4)
+
+    assert tree.is_red_black()
+    assert len(tree) == 1000
+    assert len(snapshots) == 800
+    assert all(snapshot == sorted(snapshot) and len(snapshot) <= 2000 for snapshot in snapshots)
+
+
+def test_batch_is_atomic():
+    tree = ConcurrentRedBlackTree(range(100))
+
+    def mover():
+        for _ in range(200):
+            with tree.batch() as inner:
+                value = inner.min()
+                inner.remove(value)
+                inner.add(value + 100)
+
+    lengths = []
+
+    def reader():
+        for _ in range(200):
+            lengths.append(len(tree.snapshot()))
+
+    run_threads([mover, mover, reader, reader])
+    assert lengths == [100] * 400
+    assert len(tree) == 100
+    assert tree.is_red_black()
+
+
+def test_tree_methods_inside_batch():
+    tree = ConcurrentRedBlackTree([1, 2, 3])
+    results = []
+
+    def mutate():
+        with tree.batch() as inner:
+            tree.add(4)
+            inner.add(5)
+            tree.remove(1)
+            tree.add_many([6, 7])
+            results.append((tree.pop_min(), len(tree), 5 in tree, tree.snapshot()))
+
+    # the write lock is reentrant for the thread running the batch, a deadlock would keep the thread alive
+    thread = threading.Thread(target=mutate, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert results == [(2, 5, True, [3, 4, 5, 6, 7])]
+    tree.add(8)
+    assert list(tree) == [3, 4, 5, 6, 7, 8]
+
+
+def test_write_lock_is_reentrant():
+    lock = ReadWriteLock()
+    lock.acquire_write()
+    lock.acquire_write()
+    lock.release_write()
+    acquired = threading.Event()
+
+    def reader():
+        with lock.read():
+            acquired.set()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    # still held once
+    assert not acquired.wait(0.1)
+    lock.release_write()
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_write_lock_excludes_readers():
+    lock = ReadWriteLock()
+    lock.acquire_write()
+    acquired = threading.Event()
+
+    def reader():
+        with lock.read():
+            acquired.set()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    assert not acquired.wait(0.1)
+    lock.release_write()
+    assert acquired.wait(5)
+    thread.join()
@@ -0,0 +1,144 @@
+import copy
+import json
+import pickle
+import random
+import pytest
+from Tree.ArrayRedBlackTree import ArrayRedBlackTree
+from Tree.InstrumentedTree import InstrumentedMultiRedBlackTree, InstrumentedMultiUnbalancedTree, instrumented
+from Tree.MultiRedBlackTree import MultiRedBlackTree
+from Tree.MultiUnbalancedTree import MultiUnbalancedTree
+from Tree.RedBlackTree import RedBlackTree
+from Tree.RedBlackTreeMap import RedBlackTreeMap
+
+
+def run_random_operations(tree, reference, n=2000):
+    for _ in range(n):
+        value = random.randint(0, 300)
+        if random.random() < 0.6 or not reference:
+            tree.add(value)
+            reference.append(value)
+        elif value in tree:
+            tree.remove(value)
+            reference.remove(value)
+    reference.sort()
+
+
+@pytest.mark.parametrize("tree_class", [InstrumentedMultiRedBlackTree, InstrumentedMultiUnbalancedTree])
+def test_same_values_as_the_plain_tree(tree_class):
+    tree = tree_class()
+    reference = []
+    run_random_operations(tree, reference)
+    assert list(tree) == reference
+    assert len(tree) == len(reference)
+    stats = tree.stats()
+    assert stats["comparisons"] > 0
+    assert stats["operations"]["add"]["calls"] > 0
+    assert stats["operations"]["add"]["comparisons_per_call"] > 0
+    assert stats["operations"]["remove"]["max_depth"] >= stats["operations"]["remove"]["mean_depth"] >= 1
+    assert json.loads(json.dumps(stats)) == stats
+
+
+def test_red_black_counters():
+    tree = InstrumentedMultiRedBlackTree()
+    for value in range(1000):
+        tree.add(value)
+    tree.validate()
+    stats = tree.stats()
+    # increasing values only ever rotate left, and every new node gets its own allocation
+    assert stats["rotations"]["left"] > 0
+    assert stats["rotations"]["right"] == 0
+    assert stats["allocations"] == 1000
+    assert stats["insert_fixup"]["iterations"] > 0
+    assert stats["insert_fixup"]["case_2"] == 0
+    assert stats["insert_fixup"]["case_3"] == stats["rotations"]["left"]
+    assert stats["operations"]["add"]["max_depth"] <= 2 * 10
+
+    tree.reset_stats()
+    for value in range(1000):
+        tree.remove(value)
+    stats = tree.stats()
+    assert stats["allocations"] == 0
+    assert stats["delete_fixup"]["iterations"] > 0
+    assert sum(stats["rotations"].values()) > 0
+    assert not tree
+
+
+def test_runs_the_python_methods(implementation):
+    # the accelerator would rotate without calling the counting methods
+    tree = InstrumentedMultiRedBlackTree(random.sample(range(500), 500))
+    tree.add(1000)
+    tree.add(1001)
+    tree.add(1002)
+    assert tree.stats()["rotations"]["left"] > 0
+
+
+def test_unbalanced_depth():
+    tree = InstrumentedMultiUnbalancedTree()
+    for value in range(100):
+        tree.add(value)
+    stats = tree.stats()
+    # the last value descends past the 99 values added before it
+    assert stats["operations"]["add"]["max_depth"] == 99
+    assert stats["allocations"] == 100
+    assert stats["rotations"] == {"left": 0, "right": 0}
+
+
+def test_add_depth_is_measured_before_rebalancing():
+    tree = InstrumentedMultiRedBlackTree()
+    for value in range(4):
+        tree.add(value)
+    # 2 descends past 0 and 1 before the rotation making 1 the root, and 3 past 1 and 2
+    assert tree.stats()["operations"]["add"]["max_depth"] == 2
+
+
+def test_nodes_from_a_plain_tree():
+    tree = InstrumentedMultiRedBlackTree([1, 2, 3])
+    tree.join(MultiRedBlackTree(range(10, 15)))
+    tree.add(13)
+    tree.remove(11)
+    assert 12 in tree
+    assert list(tree) == [1, 2, 3, 10, 12, 13, 13, 14]
+    assert tree.stats()["operations"]["add"]["calls"] == 1
+
+
+def test_constructor_values_are_not_counted():
+    tree = InstrumentedMultiRedBlackTree([3, 1, 2])
+    assert tree.stats()["comparisons"] == 0
+    assert 2 in tree
+    assert tree.stats()["operations"]["contains"]["calls"] == 1
+
+
+def test_subclasses():
+    tree = instrumented(RedBlackTree)([1, 2, 2, 3])
+    tree.add(3)
+    assert list(tree) == [1, 2, 3]
+    tree_map = instrumented(RedBlackTreeMap)({1: "a"})
+    tree_map[2] = "b"
+    assert dict(tree_map) == {1: "a", 2: "b"}
+    assert tree_map.stats()["comparisons"] > 0
+    with pytest.raises(TypeError):
+        instrumented(dict)
+    with pytest.raises(TypeError):
+        instrumented(ArrayRedBlackTree)
+
+
+@pytest.mark.parametrize("tree_class", [InstrumentedMultiRedBlackTree, InstrumentedMultiUnbalancedTree])
+def test_pickles_as_the_plain_tree(tree_class):
+    tree = tree_class([5, 1, 3, 3])
+    for copied in (pickle.loads(pickle.dumps(tree)), copy.deepcopy(tree)):
+        assert type(copied) is tree_class._instrumented_class
+        assert list(copied) == [1, 3, 3, 5]
+        assert type(copied._root.key) is int
+
+
+def test_node_class_is_shared():
+    first, second = InstrumentedMultiRedBlackTree([1]), InstrumentedMultiRedBlackTree([2])
+    assert type(first._root) is type(second._root) is InstrumentedMultiRedBlackTree.Node
+    first.add(3)
+    assert first.stats()["allocations"] == 1
+    assert second.stats()["allocations"] == 0
+
+
+def test_plain_trees_are_not_instrumented():
+    assert not hasattr(MultiRedBlackTree(), "stats")
+    assert not hasattr(MultiUnbalancedTree(), "stats")
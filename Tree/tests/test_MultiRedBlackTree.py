@@ -1,27 +1,32 @@
-import sys
-import os
-
-# Get the current script's directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Get the parent directory by going one level up
-parent_dir = os.path.dirname(current_dir)
-# Add the parent directory to sys.path
-sys.path.append(parent_dir)
-
-
 import pytest
+import copy
+import io
+import json
+import pickle
 import random
-from MultiRedBlackTree import MultiRedBlackTree
+from collections import Counter
+from operator import itemgetter
+from Tree.ArrayRedBlackTree import ArrayRedBlackTree
+from Tree.MultiRedBlackTree import InvariantError, MultiRedBlackTree
+from Tree.RedBlackTree import RedBlackTree
+
+
+@pytest.fixture(params=[MultiRedBlackTree, ArrayRedBlackTree])
+def tree_class(request):
+    """
+    The multiset implementations sharing the tests of the common API.
+    """
+    return request.param
 
 
 @pytest.fixture
-def empty_tree():
-    return MultiRedBlackTree()
+def empty_tree(tree_class):
+    return tree_class()
 
 
 @pytest.fixture
-def filled_tree():
-    tree = MultiRedBlackTree()
+def filled_tree(tree_class):
+    tree = tree_class()
     for value in [5, 3, 7, 2, 4, 6, 8]:
         tree.add(value)
     return tree
@@ -112,8 +117,8 @@ def test_remove_duplicate(filled_tree):
     assert 3 in filled_tree
 
 
-def test_random_add_remove():
-    tree = MultiRedBlackTree()
+def test_random_add_remove(tree_class):
+    tree = tree_class()
     list_representation = []
     for _ in range(100):
         value = random.randint(0, 100)
@@ -130,13 +135,13 @@ def test_random_add_remove():
         assert tree._min_element == (min(list_representation) if list_representation else None)
         assert tree._max_element == (max(list_representation) if list_representation else None)
         assert list(tree) == sorted(list_representation)
-        assert list(MultiRedBlackTree(tree)) == sorted(list_representation)
-        assert list(MultiRedBlackTree(list_representation)) == sorted(list_representation)
+        assert list(tree_class(tree)) == sorted(list_representation)
+        assert list(tree_class(list_representation)) == sorted(list_representation)
 
 
-def test_random_add_remove_multiple():
+def test_random_add_remove_multiple(tree_class):
     for _ in range(100):
-        test_random_add_remove()
+        test_random_add_remove(tree_class)
 
 
 def test_lower_bound(filled_tree):
@@ -163,3 +168,723 @@ def test_upper_bound(filled_tree):
     assert filled_tree.upper_bound(8) is None
     assert filled_tree.upper_bound(9) is None
     assert filled_tree.upper_bound(10) is None
+
+
+def test_bound_keys(filled_tree):
+    # without a key function, the keys are the values
+    for value in range(1, 11):
+        assert filled_tree.lower_bound_key(value) == filled_tree.lower_bound(value)
+        assert filled_tree.upper_bound_key(value) == filled_tree.upper_bound(value)
+    assert filled_tree.lower_bound_key(3) == 3
+    assert filled_tree.upper_bound_key(8) is None
+
+
+def test_from_sorted(tree_class):
+    for n in range(50):
+        values = sorted(random.randint(0, n) for _ in range(n))
+        tree = tree_class.from_sorted(values)
+        assert tree.is_red_black()
+        assert list(tree) == values
+        assert tree._length == len(values)
+        assert tree._size == len(set(values))
+        assert tree._count_size(tree._root) == len(values)
+        assert tree._min_element == (values[0] if values else None)
+        assert tree._max_element == (values[-1] if values else None)
+        for value in values[::2]:
+            tree.remove(value)
+        assert tree.is_red_black()
+
+
+def test_from_sorted_collapses_runs():
+    tree = MultiRedBlackTree.from_sorted([1, 1, 1, 2, 3, 3])
+    assert tree._size == 3
+    assert tree.count(1) == 3
+    assert tree.count(3) == 2
+    tree.add(1)
+    tree.remove(3)
+    assert list(tree) == [1, 1, 1, 1, 2, 3]
+    assert tree.is_red_black()
+
+
+def test_from_sorted_unsorted():
+    with pytest.raises(ValueError):
+        MultiRedBlackTree.from_sorted([1, 3, 2])
+
+
+def test_init_sorted_then_modify():
+    tree = MultiRedBlackTree(range(100))
+    assert tree.is_red_black()
+    for value in range(0, 100, 3):
+        tree.remove(value)
+        assert tree.is_red_black()
+    assert list(tree) == [value for value in range(100) if value % 3]
+
+
+def test_add_many():
+    for size, batch_size in [(0, 10), (100, 10), (100, 1000), (1000, 100)]:
+        values = [random.randint(0, size) for _ in range(size)]
+        batch = [random.randint(0, size) for _ in range(batch_size)]
+        tree = MultiRedBlackTree(values)
+        tree.add_many(batch)
+        assert tree.is_red_black()
+        assert list(tree) == sorted(values + batch)
+        assert tree._size == len(set(values + batch))
+        assert tree._min_element == min(values + batch)
+        assert tree._max_element == max(values + batch)
+
+
+def test_remove_many():
+    values = [random.randint(0, 200) for _ in range(1000)]
+    tree = MultiRedBlackTree(values)
+    batch = random.sample(values, 600)
+    tree.remove_many(batch)
+    for value in batch:
+        values.remove(value)
+    assert tree.is_red_black()
+    assert list(tree) == sorted(values)
+    assert tree._length == len(values)
+    assert tree._size == len(set(values))
+    assert tree._min_element == min(values)
+    assert tree._max_element == max(values)
+
+
+@pytest.mark.parametrize("tree_class", [MultiRedBlackTree])
+def test_remove_many_missing(filled_tree):
+    with pytest.raises(ValueError):
+        filled_tree.remove_many([3, 3])
+    with pytest.raises(ValueError):
+        filled_tree.remove_many([1])
+
+
+def check_sizes(tree, node):
+    if node is tree.NIL:
+        return 0
+    size = node.count + check_sizes(tree, node.left) + check_sizes(tree, node.right)
+    assert node.size == size
+    assert node.distinct == node.left.distinct + node.right.distinct + 1
+    return size
+
+
+def test_order_statistics():
+    tree = MultiRedBlackTree()
+    values = []
+    for _ in range(1000):
+        value = random.randint(0, 50)
+        if random.random() < 0.6 or value not in values:
+            tree.add(value)
+            values.append(value)
+        else:
+            tree.remove(value)
+            values.remove(value)
+    tree.add_many([random.randint(0, 50) for _ in range(20)] + values[:10])
+    tree.remove_many(values[:15])
+    values = list(tree)
+
+    check_sizes(tree, tree._root)
+    assert tree._count_size(tree._root) == len(values)
+    for index, value in enumerate(values):
+        assert tree.select(index) == value
+        assert tree.select(index - len(values)) == value
+    for value in range(-1, 53):
+        assert tree.rank(value) == sum(1 for x in values if x < value)
+        assert tree.count_range(value, value + 10) == sum(1 for x in values if value <= x < value + 10)
+    assert tree.count_range(10, 5) == 0
+
+
+@pytest.mark.parametrize("tree_class", [MultiRedBlackTree])
+def test_select_out_of_range(filled_tree):
+    with pytest.raises(IndexError):
+        filled_tree.select(7)
+    with pytest.raises(IndexError):
+        filled_tree.select(-8)
+    with pytest.raises(IndexError):
+        MultiRedBlackTree().select(0)
+
+
+def test_reversed(tree_class, filled_tree):
+    assert list(reversed(tree_class())) == []
+    filled_tree.add(5)
+    filled_tree.add(8)
+    assert list(reversed(filled_tree)) == [8, 8, 7, 6, 5, 5, 4, 3, 2]
+
+
+def test_irange():
+    values = sorted(random.randint(0, 30) for _ in range(100))
+    tree = MultiRedBlackTree(values)
+    bounds = [None] + list(range(-1, 32))
+    for lo in bounds:
+        for hi in bounds:
+            for inclusive in [(True, False), (True, True), (False, False), (False, True)]:
+                expected = [
+                    x
+                    for x in values
+                    if (lo is None or x > lo or (inclusive[0] and x == lo))
+                    and (hi is None or x < hi or (inclusive[1] and x == hi))
+                ]
+                assert list(tree.irange(lo, hi, inclusive)) == expected
+                assert list(tree.irange(lo, hi, inclusive, reverse=True)) == expected[::-1]
+
+
+@pytest.mark.parametrize("tree_class", [MultiRedBlackTree])
+def test_slice(filled_tree):
+    assert list(filled_tree[3:6]) == [3, 4, 5]
+    assert list(filled_tree[:4]) == [2, 3]
+    assert list(filled_tree[7:]) == [7, 8]
+    assert list(filled_tree[:]) == [2, 3, 4, 5, 6, 7, 8]
+    assert list(MultiRedBlackTree()[1:2]) == []
+    with pytest.raises(TypeError):
+        filled_tree[3]
+    with pytest.raises(ValueError):
+        filled_tree[1:5:2]
+
+
+@pytest.mark.parametrize("tree_class", [MultiRedBlackTree])
+def test_cursor_navigation(filled_tree):
+    cursor = filled_tree.find(5)
+    assert cursor.value == 5
+    assert cursor.count == 1
+    assert cursor.next().value == 6
+    assert cursor.prev().prev().value == 4
+    assert filled_tree.find(1) is None
+    assert filled_tree.find_lower_bound(1).value == 2
+    assert filled_tree.find_upper_bound(2).value == 3
+    assert filled_tree.find_upper_bound(8) is None
+
+    cursor = filled_tree.find(7)
+    cursor.next().next()
+    assert not cursor
+    assert cursor.value is None
+    assert cursor.count == 0
+    assert not cursor.next()
+
+
+def test_cursor_remove():
+    values = [random.randint(0, 50) for _ in range(300)]
+    tree = MultiRedBlackTree(values)
+    cursor = tree.find_lower_bound(10)
+    while cursor and cursor.value < 40:
+        cursor.remove()
+        assert tree.is_red_black()
+    remaining = [x for x in values if not 10 <= x < 40]
+    assert list(tree) == sorted(remaining)
+    assert tree._length == len(remaining)
+    assert tree._size == len(set(remaining))
+    assert tree._count_size(tree._root) == len(remaining)
+
+    cursor = tree.find_lower_bound(100)
+    assert cursor is None
+    cursor = tree.find(max(remaining))
+    cursor.next()
+    with pytest.raises(ValueError):
+        cursor.remove()
+
+
+def check_tree(tree, counter):
+    assert list(tree) == sorted(counter.elements())
+    assert tree.is_red_black()
+    check_sizes(tree, tree._root)
+    assert tree._size == len(counter)
+    assert len(tree) == sum(counter.values())
+    assert tree.min() == (min(counter) if counter else None)
+    assert tree.max() == (max(counter) if counter else None)
+    assert tree._root.parent is tree.NIL
+
+
+def test_set_algebra():
+    for _ in range(200):
+        values1 = [random.randint(0, 60) for _ in range(random.randint(0, 80))]
+        values2 = [random.randint(0, 60) for _ in range(random.randint(0, 80))]
+        tree1, tree2 = MultiRedBlackTree(values1), MultiRedBlackTree(values2)
+        counter1, counter2 = Counter(values1), Counter(values2)
+
+        check_tree(tree1 | tree2, counter1 + counter2)
+        check_tree(tree1 & tree2, counter1 & counter2)
+        check_tree(tree1 - tree2, counter1 - counter2)
+        check_tree(tree1 ^ tree2, (counter1 - counter2) + (counter2 - counter1))
+        # the operands are not changed
+        check_tree(tree1, counter1)
+        check_tree(tree2, counter2)
+
+    assert MultiRedBlackTree.NIL.size == 0 and MultiRedBlackTree.NIL.distinct == 0
+    assert MultiRedBlackTree.NIL.count == 0
+
+
+def test_set_algebra_in_place():
+    tree = MultiRedBlackTree([1, 2, 2, 3])
+    tree |= MultiRedBlackTree([2, 4])
+    assert list(tree) == [1, 2, 2, 2, 3, 4]
+    tree.difference_update([2, 2, 5])
+    assert list(tree) == [1, 2, 3, 4]
+    tree.intersection_update(range(3))
+    assert list(tree) == [1, 2]
+    tree ^= MultiRedBlackTree([2, 3])
+    assert list(tree) == [1, 3]
+    assert list(tree.union([0])) == [0, 1, 3]
+    with pytest.raises(TypeError):
+        tree | [1]
+
+
+def test_copy():
+    tree = MultiRedBlackTree([3, 1, 2, 2])
+    copy = tree.copy()
+    copy.add(5)
+    tree.remove(2)
+    assert list(copy) == [1, 2, 2, 3, 5]
+    assert list(tree) == [1, 2, 3]
+    check_tree(copy, Counter([1, 2, 2, 3, 5]))
+
+
+def test_join_and_split():
+    for n in range(0, 60):
+        values = sorted(random.randint(0, 40) for _ in range(n))
+        tree = MultiRedBlackTree(values)
+        pivot = random.randint(-1, 41)
+        right = tree.split(pivot)
+        check_tree(tree, Counter(value for value in values if value < pivot))
+        check_tree(right, Counter(value for value in values if value >= pivot))
+
+        tree.join(right)
+        check_tree(tree, Counter(values))
+        check_tree(right, Counter())
+
+    tree = MultiRedBlackTree([1, 5])
+    with pytest.raises(ValueError):
+        tree.join(MultiRedBlackTree([5, 6]))
+
+
+def test_set_union_keeps_values_once():
+    tree = RedBlackTree([1, 2, 3]) | RedBlackTree([2, 3, 4])
+    assert list(tree) == [1, 2, 3, 4]
+    assert len(tree) == 4
+
+
+def test_save_and_load(tmp_path):
+    values = [random.randint(-1000, 1000) for _ in range(2000)]
+    tree = MultiRedBlackTree(values)
+    tree.save(tmp_path / "tree.rbt")
+
+    loaded = MultiRedBlackTree.load(tmp_path / "tree.rbt")
+    check_tree(loaded, Counter(values))
+
+    tree = MultiRedBlackTree()
+    tree.save(tmp_path / "empty.rbt")
+    check_tree(MultiRedBlackTree.load(tmp_path / "empty.rbt"), Counter())
+
+    tree = MultiRedBlackTree([0.5, 1, 1, -2.25])
+    tree.save(tmp_path / "floats.rbt")
+    assert list(MultiRedBlackTree.load(tmp_path / "floats.rbt")) == [-2.25, 0.5, 1, 1]
+
+    with pytest.raises(TypeError):
+        MultiRedBlackTree(["a"]).save(tmp_path / "strings.rbt")
+    (tmp_path / "other").write_bytes(b"not a tree file at all")
+    with pytest.raises(ValueError):
+        MultiRedBlackTree.load(tmp_path / "other")
+
+
+def test_load_mmap(tmp_path):
+    values = [random.randint(0, 500) for _ in range(1000)]
+    MultiRedBlackTree(values).save(tmp_path / "tree.rbt")
+    counter = Counter(values)
+
+    with MultiRedBlackTree.load(tmp_path / "tree.rbt", mmap=True) as mapped:
+        assert len(mapped) == len(values)
+        assert list(mapped) == sorted(values)
+        assert mapped.min() == min(values)
+        assert mapped.max() == max(values)
+        for value in range(-1, 502):
+            assert (value in mapped) == (value in counter)
+            assert mapped.count(value) == counter[value]
+            assert mapped.lower_bound(value) == min((v for v in counter if v >= value), default=None)
+            assert mapped.upper_bound(value) == min((v for v in counter if v > value), default=None)
+        tree = mapped.materialize()
+    check_tree(tree, counter)
+
+
+def test_load_mmap_truncated(tmp_path):
+    path = tmp_path / "tree.rbt"
+    MultiRedBlackTree(range(100)).save(path)
+    data = path.read_bytes()
+    for end in (len(data) - 1, len(data) // 2, 40):
+        path.write_bytes(data[:end])
+        with pytest.raises(ValueError):
+            MultiRedBlackTree.load(path, mmap=True)
+
+
+def test_pickle_and_copy():
+    values = [random.randint(0, 3000) for _ in range(5000)]
+    for tree_class in (MultiRedBlackTree, RedBlackTree):
+        tree = tree_class(values)
+        counter = Counter(tree)
+        for restored in (pickle.loads(pickle.dumps(tree)), copy.copy(tree), copy.deepcopy(tree)):
+            assert type(restored) is tree_class
+            check_tree(restored, counter)
+            assert restored._root is not tree._root
+
+    # large trees are pickled as flat lists
+    tree = MultiRedBlackTree.from_sorted(range(200000))
+    assert list(pickle.loads(pickle.dumps(tree))) == list(range(200000))
+
+    nested = MultiRedBlackTree([[1], [2]])
+    deep = copy.deepcopy(nested)
+    assert list(deep) == [[1], [2]]
+    assert deep.min() is not nested.min()
+    assert copy.copy(nested).min() is nested.min()
+
+
+class KeyModel:
+    # nodes in tree order: [value, count], a new value goes after all values with an equal key
+    def __init__(self, key):
+        self.key = key
+        self.nodes = []
+
+    def add(self, value):
+        for node in self.nodes:
+            if node[0] == value:
+                node[1] += 1
+                return
+        index = sum(1 for node in self.nodes if self.key(node[0]) <= self.key(value))
+        self.nodes.insert(index, [value, 1])
+
+    def remove(self, value):
+        for index, node in enumerate(self.nodes):
+            if node[0] == value:
+                node[1] -= 1
+                if node[1] == 0:
+                    del self.nodes[index]
+                return
+
+    def elements(self):
+        return [value for value, count in self.nodes for _ in range(count)]
+
+
+def test_key_function():
+    key = itemgetter(1)
+    for tree_class in (MultiRedBlackTree, RedBlackTree):
+        tree = tree_class(key=key)
+        model = KeyModel(key)
+        for _ in range(3000):
+            value = (random.choice("abc"), random.randint(0, 30))
+            if value in tree and random.random() < 0.5:
+                tree.remove(value)
+                model.remove(value)
+            elif tree_class is MultiRedBlackTree or value not in tree:
+                tree.add(value)
+                model.add(value)
+            assert tree.min() == (model.nodes[0][0] if model.nodes else None)
+            assert tree.max() == (model.nodes[-1][0] if model.nodes else None)
+
+        elements = model.elements()
+        assert list(tree) == elements
+        assert tree.is_red_black()
+        check_sizes(tree, tree._root)
+        for value in [("a", 5), ("b", 17), ("c", 31)]:
+            assert tree.count(value) == elements.count(value)
+            assert tree.lower_bound(value) == next((x for x in elements if x[1] >= value[1]), None)
+            assert tree.upper_bound_key(value[1]) == next((x for x in elements if x[1] > value[1]), None)
+            assert tree.rank(value) == sum(1 for x in elements if x[1] < value[1])
+            assert list(tree.irange_key(3, value[1])) == [x for x in elements if 3 <= x[1] < value[1]]
+        assert tree.find(("z", 1)) is None
+
+
+def test_key_function_construction():
+    key = itemgetter(1)
+    values = [(random.choice("ab"), random.randint(0, 20)) for _ in range(300)]
+    model = KeyModel(key)
+    for value in sorted(values, key=key):
+        model.add(value)
+
+    for tree in (
+        MultiRedBlackTree(sorted(values, key=key), key=key),
+        MultiRedBlackTree.from_sorted(sorted(values, key=key), key=key),
+        pickle.loads(pickle.dumps(MultiRedBlackTree(sorted(values, key=key), key=key))),
+    ):
+        assert list(tree) == model.elements()
+        assert tree._size == len(model.nodes)
+        check_sizes(tree, tree._root)
+        tree.add(("c", 10))
+        assert tree.count(("c", 10)) == 1
+        assert tree.copy()._key is tree._key
+
+    tree = MultiRedBlackTree(values, key=key)
+    tree.add_many(values)
+    tree.remove_many(values)
+    assert sorted(tree, key=key) == list(tree)
+    assert len(tree) == len(values)
+    with pytest.raises(ValueError):
+        MultiRedBlackTree.from_sorted([("a", 2), ("a", 1)], key=key)
+    with pytest.raises(TypeError):
+        tree | tree
+
+
+def test_set_add_returns_whether_added():
+    tree = RedBlackTree()
+    values = [random.randint(0, 100) for _ in range(500)]
+    seen = set()
+    for value in values:
+        assert tree.add(value) is (value not in seen)
+        seen.add(value)
+    assert list(tree) == sorted(seen)
+    assert len(tree) == len(seen)
+    assert tree.is_red_black()
+    check_sizes(tree, tree._root)
+
+
+def test_switching_implementations():
+    from Tree import MultiRedBlackTree as module
+
+    tree = MultiRedBlackTree()
+    counter = Counter()
+    try:
+        for round in range(6):
+            # both implementations work on the same nodes, so a tree survives every switch
+            module.use_accelerator(round % 2 == 0)
+            for _ in range(300):
+                value = random.randint(0, 100)
+                if random.random() < 0.6 or not counter[value]:
+                    tree.add(value)
+                    counter[value] += 1
+                else:
+                    tree.remove(value)
+                    counter[value] -= 1
+            check_tree(tree, +counter)
+    finally:
+        module.use_accelerator()
+
+
+class RelaidTree(MultiRedBlackTree):
+    """
+    A tree whose Node has one more slot, which CPython sorts before the others and so moves all their offsets.
+    """
+
+    class Node:
+        __slots__ = ("aaa", "value", "count", "color", "left", "right", "parent", "size", "distinct", "key")
+
+        def __init__(self, value, color, count=1, key=None):
+            MultiRedBlackTree.Node.__init__(self, value, color, count, key)
+            self.aaa = None
+
+    NIL = Node(None, True, 0)
+
+
+@pytest.mark.parametrize("shared_nil", [False, True])
+def test_node_with_another_layout(shared_nil):
+    # the accelerator must fall back to the Python methods instead of reading the slots at the wrong offsets
+    tree_class = type("Tree", (RelaidTree,), {"NIL": MultiRedBlackTree.NIL} if shared_nil else {})
+    values = random.sample(range(500), 500)
+    tree = tree_class(values)
+    counter = Counter(values)
+    for value in values[::2]:
+        tree.add(value)
+        counter[value] += 1
+    for value in values[::3]:
+        tree.remove(value)
+        counter[value] -= 1
+    assert tree.pop_min() == min(+counter)
+    assert tree.pop_max() == max(+counter)
+    counter[min(+counter)] -= 1
+    counter[max(+counter)] -= 1
+    assert list(tree) == sorted((+counter).elements())
+    tree.validate()
+    assert type(tree._root) is RelaidTree.Node
+
+
+def test_pop_min_and_max():
+    tree = MultiRedBlackTree()
+    counter = Counter()
+    for _ in range(3000):
+        operation = random.random()
+        if operation < 0.5 or not counter:
+            value = random.randint(0, 200)
+            tree.add(value)
+            counter[value] += 1
+        elif operation < 0.7:
+            assert tree.peek_min() == min(counter)
+            value = tree.pop_min()
+            assert value == min(counter)
+            counter[value] -= 1
+        elif operation < 0.9:
+            assert tree.peek_max() == max(counter)
+            value = tree.pop_max()
+            assert value == max(counter)
+            counter[value] -= 1
+        else:
+            value = random.choice(list(counter))
+            tree.remove(value)
+            counter[value] -= 1
+        counter = +counter
+    check_tree(tree, counter)
+    tree.validate()
+
+    while tree:
+        tree.pop_max()
+    tree.validate()
+    for method in (tree.pop_min, tree.pop_max, tree.peek_min, tree.peek_max):
+        with pytest.raises(IndexError):
+            method()
+
+
+def test_pop_min_equal_keys():
+    tree = MultiRedBlackTree(key=itemgetter(0))
+    for i in range(20):
+        tree.add((i % 3, i))
+    assert [tree.pop_min() for _ in range(7)] == [(0, i) for i in range(0, 20, 3)]
+    assert tree.pop_max() == (2, 17)
+    tree.validate()
+
+
+def test_extreme_nodes_after_bulk_changes():
+    tree = MultiRedBlackTree(range(0, 100, 2))
+    tree.validate()
+    right = tree.split(50)
+    tree.validate()
+    right.validate()
+    tree |= MultiRedBlackTree(range(1, 200, 3))
+    tree.validate()
+    assert tree.pop_max() == 199
+    assert right.copy().pop_min() == 50
+    assert pickle.loads(pickle.dumps(right)).peek_max() == 98
+    tree.remove_many(list(tree))
+    tree.validate()
+
+
+def test_comparison_errors():
+    tree = MultiRedBlackTree([1, 2, 3])
+    with pytest.raises(TypeError):
+        tree.add("a")
+    with pytest.raises(TypeError):
+        tree.remove("a")
+    check_tree(tree, Counter([1, 2, 3]))
+
+
+def test_export_dot(tmp_path):
+    tree = MultiRedBlackTree([random.randint(0, 500) for _ in range(1000)])
+    path = tmp_path / "tree.dot"
+    assert tree.export(path) == tree._size
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith("digraph") and lines[-1] == "}"
+    # one edge per node except the root
+    assert sum("->" in line for line in lines) == tree._size - 1
+
+
+def test_export_json_depth_cap():
+    tree = MultiRedBlackTree(range(1000))
+    file = io.StringIO()
+    tree.export(file, "json", max_depth=2)
+    export = json.loads(file.getvalue())
+    rows = [dict(zip(export["fields"], row)) for row in export["nodes"]]
+    assert len(rows) == 7
+    assert max(row["depth"] for row in rows) == 2
+    # the nodes at the cap count the nodes left out below them
+    assert sum(row["hidden"] for row in rows) == 1000 - 7
+
+
+def test_export_around_key():
+    tree = MultiRedBlackTree(range(10000))
+    file = io.StringIO()
+    tree.export(file, "json", around=1234, radius=2)
+    rows = json.loads(file.getvalue())["nodes"]
+    values = [row[4] for row in rows]
+    assert 1234 in values
+    assert len(rows) < 32
+    assert max(row[3] for row in rows) <= 4
+
+
+def test_export_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        MultiRedBlackTree([1]).export(io.StringIO(), "svg")
+
+
+def broken_trees():
+    """
+    Yields (tree, invariant) pairs of trees with one invariant broken.
+    """
+    tree = MultiRedBlackTree(range(100))
+    node = tree._root.left
+    node.color = not node.color
+    yield tree, "black height"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._root.left.left.value = tree._root.left.left.key = 1000
+    yield tree, "keys are in order"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._root.right.parent = tree._root.left
+    yield tree, "parent"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._root.left.size += 1
+    yield tree, "size"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._length += 1
+    yield tree, "_length"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._min_element = 5
+    yield tree, "_min_element"
+
+    tree = MultiRedBlackTree(range(100))
+    tree._max_node = tree._root
+    yield tree, "_max_node"
+
+
+def test_validate_reports_the_broken_invariant():
+    for tree, invariant in broken_trees():
+        with pytest.raises(InvariantError, match=invariant):
+            tree.validate()
+        assert not tree.is_red_black()
+
+
+def test_validate_names_the_node():
+    tree = MultiRedBlackTree(range(100))
+    node = tree._root.right.right
+    node.count = 0
+    with pytest.raises(InvariantError) as error:
+        tree.validate()
+    assert error.value.node is node
+    assert error.value.invariant == "the counter is positive"
+
+
+def test_validate_key_tree():
+    tree = MultiRedBlackTree([(i % 7, i) for i in range(200)], key=itemgetter(0))
+    tree.validate()
+
+
+def test_validate_every():
+    tree = MultiRedBlackTree(range(50))
+    tree.validate_every(10)
+    for value in range(50, 100):
+        tree.add(value)
+    tree.remove(75)
+    assert type(tree).__name__ == "ValidatingMultiRedBlackTree"
+    assert pickle.loads(pickle.dumps(tree)).__class__ is MultiRedBlackTree
+
+    tree._root.size += 1
+    with pytest.raises(InvariantError):
+        for value in range(10):
+            tree.add(value)
+
+    tree.validate_every(0)
+    assert type(tree) is MultiRedBlackTree
+    tree.add(5)
+
+
+@pytest.mark.parametrize("pop", ["pop_min", "pop_max"])
+def test_validate_every_pop(pop):
+    tree = MultiRedBlackTree(range(50))
+    tree.validate_every(1)
+    getattr(tree, pop)()
+    tree._length += 1
+    with pytest.raises(InvariantError):
+        getattr(tree, pop)()
+
+
+def test_validate_every_cursor_remove():
+    tree = MultiRedBlackTree([1, 2, 2, 3])
+    assert type(tree.find(2)) is MultiRedBlackTree.Cursor
+    tree.validate_every(1)
+    cursor = tree.find(2)
+    cursor.remove()
+    tree._length += 1
+    with pytest.raises(InvariantError):
+        cursor.remove()
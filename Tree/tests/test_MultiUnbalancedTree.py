@@ -1,17 +1,9 @@
-import sys
-import os
-
-# Get the current script's directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Get the parent directory by going one level up
-parent_dir = os.path.dirname(current_dir)
-# Add the parent directory to sys.path
-sys.path.append(parent_dir)
-
-
 import pytest
+import io
 import random
-from MultiUnbalancedTree import MultiUnbalancedTree
+import sys
+from Tree.MultiUnbalancedTree import MultiUnbalancedTree
+from Tree.UnbalancedTree import UnbalancedTree
 
 
 @pytest.fixture
@@ -173,3 +165,133 @@ def test_upper_bound(filled_tree):
     assert filled_tree.upper_bound(8) is None
     assert filled_tree.upper_bound(9) is None
     assert filled_tree.upper_bound(10) is None
+
+
+def height(node):
+    if node is None:
+        return 0
+    return 1 + max(height(node.left), height(node.right))
+
+
+def test_from_sorted():
+    for n in range(50):
+        values = sorted(random.randint(0, n) for _ in range(n))
+        tree = MultiUnbalancedTree.from_sorted(values)
+        assert list(tree) == values
+        assert tree._length == len(values)
+        assert tree._size == len(set(values))
+        assert height(tree._root) == tree._size.bit_length()
+
+
+def test_from_sorted_unsorted():
+    with pytest.raises(ValueError):
+        MultiUnbalancedTree.from_sorted([1, 3, 2])
+
+
+def test_init_sorted_is_balanced():
+    tree = MultiUnbalancedTree(range(1000))
+    assert height(tree._root) == 10
+    tree.remove(500)
+    assert list(tree) == [value for value in range(1000) if value != 500]
+
+
+def test_reversed(filled_tree):
+    assert list(reversed(MultiUnbalancedTree())) == []
+    filled_tree.add(5)
+    filled_tree.add(8)
+    assert list(reversed(filled_tree)) == [8, 8, 7, 6, 5, 5, 4, 3, 2]
+
+
+def test_iter_deep_tree():
+    tree = MultiUnbalancedTree()
+    for value in range(5000):
+        tree.add(value)
+    assert list(tree) == list(range(5000))
+    assert list(reversed(tree)) == list(range(4999, -1, -1))
+
+
+def test_key_function():
+    tree = MultiUnbalancedTree(key=len)
+    words = ["ccc", "a", "bb", "dd", "e", "bb", "fff", "dd"]
+    for word in words:
+        tree.add(word)
+    assert list(tree) == ["a", "e", "bb", "bb", "dd", "dd", "ccc", "fff"]
+    assert tree.min() == "a"
+    assert tree.max() == "fff"
+    assert tree.count("dd") == 2
+    assert "gg" not in tree
+    assert tree.lower_bound("xx") == "bb"
+    assert tree.upper_bound("xx") == "ccc"
+    assert tree.lower_bound_key(3) == "ccc"
+    assert tree.upper_bound_key(3) is None
+
+    tree.remove("bb")
+    tree.remove("ccc")
+    tree.remove("a")
+    assert list(tree) == ["e", "bb", "dd", "dd", "fff"]
+    assert tree.min() == "e"
+    with pytest.raises(ValueError):
+        tree.remove("gg")
+
+    tree = MultiUnbalancedTree(sorted(words, key=len), key=len)
+    assert list(tree) == ["a", "e", "bb", "bb", "dd", "dd", "ccc", "fff"]
+    assert tree._size == 6
+    for word in words:
+        tree.remove(word)
+    assert list(tree) == []
+
+
+class Compared:
+    """
+    A value counting how often it is compared for equality.
+    """
+
+    comparisons = 0
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        Compared.comparisons += 1
+        return self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+def test_large_run_of_equal_keys():
+    # the distinct values of a run are counted with a dict, not by comparing each with all the others
+    values = [Compared(value) for value in range(10000)] + [Compared(5)]
+    Compared.comparisons = 0
+    tree = MultiUnbalancedTree.from_sorted(values, key=lambda value: 0)
+    assert Compared.comparisons <= 10
+    assert tree._size == 10000
+    assert len(tree) == 10001
+    assert [value.value for value in tree][4:7] == [4, 5, 5]
+
+
+def test_run_of_unhashable_values():
+    tree = MultiUnbalancedTree.from_sorted([[2], [1], [2], [3, 4]], key=len)
+    assert tree._size == 3
+    assert list(tree) == [[2], [2], [1], [3, 4]]
+
+
+def test_set_add_returns_whether_added():
+    tree = UnbalancedTree()
+    assert tree.add(5) is True
+    assert tree.add(3) is True
+    assert tree.add(5) is False
+    assert list(tree) == [3, 5]
+    assert len(tree) == 2
+    assert tree.count(5) == 1
+
+
+def test_export_deeper_than_recursion_limit():
+    # an unbalanced tree of sorted values is a path longer than the recursion limit
+    n = sys.getrecursionlimit() + 100
+    tree = MultiUnbalancedTree()
+    for value in range(n):
+        tree.add(value)
+    file = io.StringIO()
+    assert tree.export(file) == n
+    assert file.getvalue().count("->") == n - 1
@@ -0,0 +1,82 @@
+import pytest
+import random
+from Tree.PersistentRedBlackTree import PersistentRedBlackTree
+
+
+@pytest.fixture
+def filled_tree():
+    return PersistentRedBlackTree([5, 3, 7, 2, 4, 6, 8])
+
+
+def nodes(tree):
+    stack = [tree._root]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            yield node
+            stack.append(node.left)
+            stack.append(node.right)
+
+
+def test_add_returns_new_version(filled_tree):
+    new_tree = filled_tree.add(1)
+    assert list(filled_tree) == [2, 3, 4, 5, 6, 7, 8]
+    assert list(new_tree) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert len(filled_tree) == 7
+    assert len(new_tree) == 8
+    assert 1 not in filled_tree
+    assert 1 in new_tree
+
+
+def test_remove_returns_new_version(filled_tree):
+    new_tree = filled_tree.add(5).remove(5).remove(5)
+    assert list(filled_tree) == [2, 3, 4, 5, 6, 7, 8]
+    assert list(new_tree) == [2, 3, 4, 6, 7, 8]
+    assert new_tree.is_red_black()
+    with pytest.raises(ValueError):
+        new_tree.remove(5)
+
+
+def test_queries(filled_tree):
+    tree = filled_tree.add(4)
+    assert tree.count(4) == 2
+    assert tree.count(1) == 0
+    assert tree.contains(8)
+    assert tree.min() == 2
+    assert tree.max() == 8
+    assert tree.lower_bound(1) == 2
+    assert tree.lower_bound(4) == 4
+    assert tree.upper_bound(4) == 5
+    assert tree.upper_bound(8) is None
+    assert tree.snapshot() is tree
+    assert PersistentRedBlackTree().min() is None
+
+
+def test_structure_sharing():
+    tree = PersistentRedBlackTree(range(1000))
+    new_tree = tree.add(500)
+    old_nodes = set(map(id, nodes(tree)))
+    copied = [node for node in nodes(new_tree) if id(node) not in old_nodes]
+    assert len(copied) <= 2 * 20
+
+
+def test_random_versions():
+    versions = [(PersistentRedBlackTree(), [])]
+    for _ in range(2000):
+        tree, values = random.choice(versions[-20:])
+        value = random.randint(0, 100)
+        if value in values and random.random() < 0.5:
+            tree = tree.remove(value)
+            values = values.copy()
+            values.remove(value)
+        else:
+            tree = tree.add(value)
+            values = values + [value]
+        assert tree.is_red_black()
+        versions.append((tree, values))
+
+    for tree, values in versions:
+        assert list(tree) == sorted(values)
+        assert len(tree) == len(values)
+        assert tree._size == len(set(values))
+        assert tree.is_red_black()
@@ -0,0 +1,107 @@
+import copy
+import pickle
+import pytest
+import random
+from Tree.RedBlackTreeMap import RedBlackTreeMap
+
+try:
+    from test import mapping_tests
+except ImportError:  # the test package of CPython is not always installed
+    mapping_tests = None
+
+
+if mapping_tests is not None:
+
+    class TestMappingProtocol(mapping_tests.TestMappingProtocol):
+        type2test = RedBlackTreeMap
+
+
+def test_random_operations():
+    tree = RedBlackTreeMap()
+    reference = {}
+    for _ in range(3000):
+        key = random.randint(0, 200)
+        operation = random.random()
+        if operation < 0.5:
+            tree[key] = reference[key] = random.random()
+        elif operation < 0.7:
+            assert tree.pop(key, None) == reference.pop(key, None)
+        elif operation < 0.8:
+            assert tree.setdefault(key, key) == reference.setdefault(key, key)
+        else:
+            assert tree.get(key) == reference.get(key)
+        assert len(tree) == len(reference)
+
+    assert tree.is_red_black()
+    assert list(tree) == sorted(reference)
+    assert list(tree.items()) == sorted(reference.items())
+    assert list(tree.values()) == [reference[key] for key in sorted(reference)]
+    assert tree == reference
+
+
+def test_sorted_construction():
+    items = [(key, str(key)) for key in range(0, 100, 3)]
+    tree = RedBlackTreeMap(items)
+    assert tree.is_red_black()
+    assert list(tree.items()) == items
+    assert RedBlackTreeMap({"a": 1}, b=2) == {"a": 1, "b": 2}
+    assert RedBlackTreeMap([(2, "a"), (1, "b"), (2, "c")]) == {1: "b", 2: "c"}
+
+
+def test_floor_and_ceiling():
+    tree = RedBlackTreeMap({10: "a", 20: "b", 30: "c"})
+    assert tree.floor_key(25) == 20
+    assert tree.floor_key(20) == 20
+    assert tree.floor_key(5) is None
+    assert tree.ceiling_key(25) == 30
+    assert tree.ceiling_key(10) == 10
+    assert tree.ceiling_key(35) is None
+
+
+def test_errors():
+    tree = RedBlackTreeMap({1: "a"})
+    with pytest.raises(KeyError):
+        tree[2]
+    with pytest.raises(KeyError):
+        del tree[2]
+    with pytest.raises(KeyError):
+        tree.pop(2)
+    assert tree.popitem() == (1, "a")
+    with pytest.raises(KeyError):
+        tree.popitem()
+    with pytest.raises(TypeError):
+        tree & RedBlackTreeMap()
+
+
+def test_multiset_methods():
+    tree = RedBlackTreeMap({2: "b", 1: "a", 3: "c"})
+    # the keys cannot be added or removed without their values
+    for method, argument in [("add", 4), ("add_many", [4]), ("remove", 1), ("remove_many", [1])]:
+        with pytest.raises(TypeError):
+            getattr(tree, method)(argument)
+    assert dict(tree) == {1: "a", 2: "b", 3: "c"}
+
+    assert tree.peek_min() == (1, "a")
+    assert tree.peek_max() == (3, "c")
+    assert tree.pop_min() == (1, "a")
+    assert tree.pop_max() == (3, "c")
+    assert tree.pop_max() == (2, "b")
+    assert len(tree) == 0
+    for method in ("pop_min", "pop_max", "peek_min", "peek_max"):
+        with pytest.raises(KeyError):
+            getattr(tree, method)()
+    tree[5] = "e"
+    assert tree.pop_min() == (5, "e")
+    tree.validate()
+
+
+def test_copy_and_pickle():
+    tree = RedBlackTreeMap((key, [key]) for key in range(1000))
+    for other in (tree.copy(), copy.copy(tree), copy.deepcopy(tree), pickle.loads(pickle.dumps(tree))):
+        assert type(other) is RedBlackTreeMap
+        assert other == tree
+        assert other.is_red_black()
+    assert copy.copy(tree)[5] is tree[5]
+    assert copy.deepcopy(tree)[5] is not tree[5]
+    assert repr(RedBlackTreeMap({2: "b", 1: "a"})) == "{1: 'a', 2: 'b'}"
+    assert dict(RedBlackTreeMap({2: "b"}) | RedBlackTreeMap({2: "c", 3: "d"})) == {2: "c", 3: "d"}
@@ -0,0 +1,68 @@
+import pytest
+import random
+from collections import Counter
+from Tree.SortedBlockTree import SortedBlockTree
+
+
+def check_blocks(tree):
+    assert all(tree._blocks)
+    assert tree._maxes == [block[-1] for block in tree._blocks]
+    assert all(len(block) == len(counts) for block, counts in zip(tree._blocks, tree._counts))
+    assert all(len(block) <= 2 * tree._load for block in tree._blocks)
+    values = [value for block in tree._blocks for value in block]
+    assert values == sorted(set(values))
+    assert tree._size == len(values)
+
+
+def test_empty_tree():
+    tree = SortedBlockTree()
+    assert list(tree) == []
+    assert len(tree) == 0
+    assert tree.min() is None
+    assert tree.max() is None
+    assert tree.lower_bound(1) is None
+    assert tree.upper_bound(1) is None
+    assert tree.count(1) == 0
+    assert 1 not in tree
+    with pytest.raises(ValueError):
+        tree.remove(1)
+
+
+def test_random_operations():
+    tree = SortedBlockTree(load=4)
+    counter = Counter()
+    for _ in range(5000):
+        value = random.randint(0, 300)
+        if counter[value] and random.random() < 0.45:
+            tree.remove(value)
+            counter[value] -= 1
+        else:
+            tree.add(value)
+            counter[value] += 1
+        counter += Counter()
+        assert len(tree) == sum(counter.values())
+
+    check_blocks(tree)
+    assert list(tree) == sorted(counter.elements())
+    assert list(reversed(tree)) == sorted(counter.elements(), reverse=True)
+    assert tree.min() == min(counter)
+    assert tree.max() == max(counter)
+    for value in range(-1, 302):
+        assert tree.count(value) == counter[value]
+        assert tree.contains(value) == (value in counter)
+        assert tree.lower_bound(value) == min((v for v in counter if v >= value), default=None)
+        assert tree.upper_bound(value) == min((v for v in counter if v > value), default=None)
+
+    for value in list(counter.elements()):
+        tree.remove(value)
+    assert list(tree) == []
+    assert tree._blocks == []
+
+
+def test_construction():
+    values = [random.randint(0, 100) for _ in range(1000)]
+    for tree in (SortedBlockTree(values, load=8), SortedBlockTree.from_sorted(sorted(values), load=8)):
+        check_blocks(tree)
+        assert list(tree) == sorted(values)
+    with pytest.raises(ValueError):
+        SortedBlockTree.from_sorted([2, 1])
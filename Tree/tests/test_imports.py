@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+# the child interpreter finds the Tree package in the working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# runs in a fresh interpreter, prints the top-level names of the modules imported by the trees
+PROBE = """
+import sys
+before = set(sys.modules)
+import Tree.ArrayRedBlackTree, Tree.ConcurrentRedBlackTree, Tree.InstrumentedTree, Tree.MappedTree, Tree.MultiRedBlackTree
+import Tree.MultiUnbalancedTree, Tree.PersistentRedBlackTree, Tree.RedBlackTree, Tree.RedBlackTreeMap
+import Tree.SortedBlockTree, Tree.UnbalancedTree
+print(" ".join(sorted({name.split(".")[0] for name in set(sys.modules) - before})))
+"""
+
+
+def test_trees_import_only_the_standard_library():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    # the build configuration read through sysconfig is part of the standard library, but not named in the list
+    imported = {name for name in output.split() if not name.startswith("_sysconfigdata_")}
+    assert "graphviz" not in imported
+    assert imported - set(sys.stdlib_module_names) == {"Tree"}
@@ -0,0 +1,38 @@
+"""
+Visualization of the trees with graphviz.
+The trees import this module on the first call of draw(), so only drawing needs graphviz installed.
+"""
+
+try:
+    from graphviz import Digraph
+except ImportError as error:
+    raise ImportError("Drawing a tree needs graphviz, install it with: pip install graphviz") from error
+
+
+def draw(tree, name="tree", view_nil=False):
+    """
+    Generates a pdf file with a visualization of a red-black tree and opens it.
+    Parameters:
+        tree: The tree to draw, its _draw_node method styles the nodes.
+        name: The name of the pdf file.
+        view_nil: Whether to draw the NIL leaves.
+    """
+    graph = Digraph()
+
+    def draw_node(node):
+        tree._draw_node(node, graph)
+        if node.left is not tree.NIL:
+            draw_node(node.left)
+            graph.edge(str(node.value), str(node.left.value))
+        elif view_nil:
+            graph.node(str(node.value) + "l", "NIL", color="black")
+            graph.edge(str(node.value), str(node.value) + "l")
+        if node.right is not tree.NIL:
+            draw_node(node.right)
+            graph.edge(str(node.value), str(node.right.value))
+        elif view_nil:
+            graph.node(str(node.value) + "r", "NIL", color="black")
+            graph.edge(str(node.value), str(node.value) + "r")
+
+    draw_node(tree._root)
+    graph.render(name, view=True, cleanup=True)
@@ -0,0 +1,10 @@
+"""
+Builds the optional C accelerator of the red-black trees, the package metadata is in pyproject.toml.
+The trees work without it, in pure Python. Installing the package builds it if a compiler is available,
+to build it in place for a checkout run:
+    python setup.py build_ext --inplace
+"""
+
+from setuptools import Extension, setup
+
+setup(ext_modules=[Extension("Tree._accelerator", ["Tree/_accelerator.c"], optional=True)])